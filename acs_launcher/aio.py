@@ -0,0 +1,387 @@
+"""asyncio API for logons and launches.
+
+`run_logon` and `launch` here are coroutines built on
+asyncio.create_subprocess_exec, with the logon PTY read through
+loop.add_reader, so a script or service can drive many logons and launches
+concurrently in one event loop and bound them with asyncio.wait_for() or
+cancel them like any other task. The prompt handling and result parsing
+are launcher's, and launcher.run_logon / launcher.launch are thin blocking
+wrappers over these coroutines (run on a shared background loop, see
+run_sync), so both APIs behave identically.
+
+Concurrent run_logon calls for the same command and password, on the same
+loop, share one ACS logon. Cancelling one caller only stops its wait; the
+ACS child is killed once every caller waiting on it has been cancelled.
+"""
+import asyncio
+import concurrent.futures
+import os
+import tempfile
+import threading
+import weakref
+
+from acs_launcher import launcher, logging_setup
+
+log = logging_setup.get_logger()
+
+# loop -> {(command key, password): _Flight}
+_flights = weakref.WeakKeyDictionary()
+
+# Strong references to fire-and-forget tasks (reapers), which the loop
+# itself only holds weakly.
+_background = set()
+
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+async def run_logon(cmd, password=None, timeout=30):
+    """Run a logon command and return (success, message).
+
+    Same contract as launcher.run_logon: with `password` the command runs
+    on a PTY and the password is fed to the ACS prompt; without it the
+    password must already be embedded in `cmd`.
+    """
+    loop = asyncio.get_running_loop()
+    flights = _flights.setdefault(loop, {})
+    key = (launcher._cmd_key(cmd), password)
+    flight = flights.get(key)
+    if flight is None:
+        task = loop.create_task(_run_logon(cmd, password, timeout))
+        flight = flights[key] = _Flight(task)
+        task.add_done_callback(
+            lambda t: flights.pop(key) if flights.get(key) is flight else None
+        )
+    else:
+        log.info("run_logon: waiting for in-flight logon cmd=%s", launcher._display(cmd))
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.task.done():
+            flight.task.cancel()
+        raise
+    finally:
+        flight.waiters -= 1
+
+
+async def _run_logon(cmd, password, timeout):
+    logging_setup.add_secret(password)
+    log.info(
+        "run_logon: cmd=%s mode=%s", launcher._display(cmd), "pty" if password else "argv"
+    )
+    try:
+        if password is not None:
+            ok, msg = await _run_logon_pty(cmd, password, timeout)
+            log.info("run_logon: result ok=%s msg=%s", ok, msg)
+            return ok, msg
+        return await _run_logon_argv(cmd, timeout)
+    except asyncio.CancelledError:
+        log.info("run_logon: cancelled")
+        raise
+    finally:
+        logging_setup.remove_secret(password)
+
+
+async def _run_logon_argv(cmd, timeout):
+    proc = None
+    output_lines = []
+    failed = False
+    succeeded = False
+
+    async def read_output():
+        nonlocal failed, succeeded
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                break
+            line = line.decode("utf-8", errors="replace").strip()
+            if line:
+                output_lines.append(line)
+            if "Login failed" in line or "Signon to" in line:
+                failed = True
+                break
+            if "completed successfully" in line:
+                succeeded = True
+                break
+
+    try:
+        args = launcher._argv(cmd)
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env=launcher._english_env(),
+        )
+        await asyncio.wait_for(read_output(), timeout)
+
+        if failed:
+            proc.kill()
+            await proc.wait()
+            errors = [l for l in output_lines if l.startswith("MSG") or l.startswith("CPF")]
+            detail = "; ".join(errors) if errors else "; ".join(output_lines[:3])
+            log.info("run_logon: failed detail=%s", detail)
+            return False, f"Logon failed: {detail}"
+
+        if succeeded:
+            await asyncio.wait_for(proc.wait(), 5)
+            log.info("run_logon: succeeded")
+            return True, "Logon successful"
+
+        await asyncio.wait_for(proc.wait(), timeout)
+        if proc.returncode == 0:
+            log.info("run_logon: succeeded (rc=0, no completion line)")
+            return True, "Logon successful"
+        detail = "; ".join(output_lines[:3]) if output_lines else "no output"
+        log.info("run_logon: failed rc=%d detail=%s", proc.returncode, detail)
+        return False, f"Logon failed (rc={proc.returncode}): {detail}"
+
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        log.info("run_logon: timed out")
+        return False, "Logon timed out"
+    except asyncio.CancelledError:
+        if proc is not None and proc.returncode is None:
+            proc.kill()
+        raise
+    except Exception as e:
+        log.exception("run_logon: unexpected error")
+        return False, f"Logon error: {e}"
+
+
+def _read_master(master_fd):
+    """Non-blocking read: bytes, b"" at EOF/EIO, or None if nothing's ready."""
+    try:
+        return os.read(master_fd, 4096)
+    except BlockingIOError:
+        return None
+    except OSError:
+        return b""
+
+
+async def _run_logon_pty(cmd, password, timeout):
+    """Drive `acslaunch /plugin=logon` over a PTY, feeding the password
+    to the prompt instead of placing it on the command line."""
+    loop = asyncio.get_running_loop()
+    args = launcher._argv(cmd)
+    master_fd, slave_fd = launcher._open_logon_pty()
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=slave_fd,
+            stdout=slave_fd,
+            stderr=slave_fd,
+            env=launcher._english_env(),
+        )
+    except BaseException:
+        os.close(master_fd)
+        raise
+    finally:
+        os.close(slave_fd)
+    os.set_blocking(master_fd, False)
+
+    driver = launcher._LogonDriver(password)
+    stop = asyncio.Event()
+
+    def on_readable():
+        while True:
+            chunk = _read_master(master_fd)
+            if chunk is None:
+                return
+            if not chunk:
+                loop.remove_reader(master_fd)
+                stop.set()
+                return
+            if stop.is_set():
+                continue  # already decided; just keep the PTY drained
+            reply = driver.feed(chunk)
+            if reply:
+                os.write(master_fd, reply)
+            if driver.finished:
+                stop.set()
+
+    async def watch_exit():
+        await proc.wait()
+        stop.set()
+
+    loop.add_reader(master_fd, on_readable)
+    exit_watch = loop.create_task(watch_exit())
+    handed_off = False
+    try:
+        try:
+            await asyncio.wait_for(stop.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        if driver.succeeded:
+            # Return now and let the JVM exit in its own time; the reader
+            # stays registered so the PTY keeps being drained meanwhile.
+            _spawn_background(_reap(proc, master_fd, exit_watch))
+            handed_off = True
+            return driver.result(None)
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+        loop.remove_reader(master_fd)
+        while True:
+            chunk = _read_master(master_fd)
+            if not chunk:
+                break
+            driver.output.extend(chunk)
+        return driver.result(proc.returncode)
+    finally:
+        if not handed_off:
+            exit_watch.cancel()
+            loop.remove_reader(master_fd)
+            try:
+                os.close(master_fd)
+            except OSError:
+                pass
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+
+
+async def _reap(proc, master_fd, exit_watch):
+    """Wait for a logon child that has already reported success, keeping
+    its PTY open (and drained by the reader) until it exits: closing the
+    master early would hand the JVM EIO while it may still be flushing the
+    credentials it just stored."""
+    try:
+        await asyncio.wait_for(asyncio.shield(exit_watch), launcher._REAP_TIMEOUT)
+    except asyncio.TimeoutError:
+        log.warning("run_logon: logon child still running after success, killing")
+        proc.kill()
+        await proc.wait()
+    finally:
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(master_fd)
+        try:
+            os.close(master_fd)
+        except OSError:
+            pass
+
+
+def _spawn_background(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def launch(cmd, password=None):
+    """Launch a command (fire-and-forget, detached from this process).
+
+    Waits briefly to catch immediate failures (e.g. bad path, missing file).
+    Returns (success, message). Same contract as launcher.launch.
+    """
+    # Use temp files (not PIPEs) so the child can keep writing past the 2s
+    # window without us holding fds it would otherwise block on.
+    out_f = tempfile.TemporaryFile()
+    err_f = tempfile.TemporaryFile()
+    proc = None
+    logging_setup.add_secret(password)
+    try:
+        args = launcher._argv(cmd)
+        env = launcher._launch_env()
+        env_summary = {k: env.get(k, "") for k in launcher._LOGGED_ENV_KEYS}
+        log.info("launch: cmd=%s", launcher._display(cmd))
+        log.debug("launch: argv=%r env=%r", args, env_summary)
+        # ACS exits quietly (rc=0, no stderr) when handed a .hod session file
+        # that doesn't exist, which our "still running / rc=0" heuristics would
+        # otherwise report as a successful launch. Catch the missing file up
+        # front so the user gets a real error instead of a false success.
+        missing = launcher._missing_session_files(args)
+        if missing:
+            log.warning("launch: session file not found: %s", missing)
+            return False, f"Launch failed: file not found — {missing}"
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                start_new_session=True,
+                stdout=out_f,
+                stderr=err_f,
+                env=env,
+            )
+        except FileNotFoundError:
+            log.warning("launch: command not found: %s", args[0] if args else "")
+            return False, f"Launch error: command not found — {args[0] if args else ''}"
+
+        try:
+            await asyncio.wait_for(proc.wait(), 2)
+        except asyncio.TimeoutError:
+            log.info("launch: still running after 2s (treating as success)")
+            return True, "Launched successfully"
+        out_f.seek(0)
+        err_f.seek(0)
+        stdout = out_f.read().decode("utf-8", errors="replace").strip()
+        stderr = err_f.read().decode("utf-8", errors="replace").strip()
+        log.info(
+            "launch: exited within 2s rc=%d stdout_len=%d stderr_len=%d",
+            proc.returncode, len(stdout), len(stderr),
+        )
+        if stdout:
+            log.debug("launch: stdout=%s", stdout)
+        if stderr:
+            log.debug("launch: stderr=%s", stderr)
+        if proc.returncode != 0 and stderr:
+            return False, f"Launch failed (rc={proc.returncode}): {stderr[:200]}"
+        return True, "Launched successfully"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log.exception("launch: unexpected error")
+        return False, f"Launch error: {e}"
+    finally:
+        # Don't close the temp files if the child is still running — it
+        # still holds them via its inherited fds and will write to them
+        # until it exits. They'll be reclaimed when the child closes them.
+        if proc is None or proc.returncode is not None:
+            out_f.close()
+            err_f.close()
+        logging_setup.remove_secret(password)
+
+
+def _get_sync_loop():
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="acs-launcher-aio", daemon=True
+            ).start()
+            _sync_loop = loop
+        return _sync_loop
+
+
+def run_sync(coro, cancel=None):
+    """Run `coro` on a shared background event loop and block until done.
+
+    This is how the blocking launcher API reuses these coroutines from any
+    thread. The loop outlives each call, so background work such as
+    reaping a logon child carries on after the caller has its result.
+    `cancel`, a launcher.CancelEvent, cancels the coroutine when set; this
+    then raises concurrent.futures.CancelledError.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_sync_loop())
+    if cancel is None:
+        return future.result()
+    if isinstance(cancel, launcher.CancelEvent):
+        cancel.add_callback(future.cancel)
+        try:
+            return future.result()
+        finally:
+            cancel.remove_callback(future.cancel)
+    # A plain threading.Event can't wake us: look at it now and then.
+    while True:
+        try:
+            return future.result(timeout=0.2)
+        except concurrent.futures.TimeoutError:
+            if cancel.is_set():
+                future.cancel()
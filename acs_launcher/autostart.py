@@ -0,0 +1,75 @@
+"""XDG autostart entry for the resident (start-hidden-at-login) mode.
+
+With the entry in place the session starts `rm-acs-launcher --autostart`
+at login. That instance builds the window without showing it and keeps
+running, so opening the launcher later only has to present a window that
+already exists, with the config, icons and keyring connection warm.
+"""
+import os
+import re
+import shutil
+import sys
+
+APP_NAME = "rm-acs-launcher"
+
+AUTOSTART_DIR = os.path.join(
+    os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config"), "autostart"
+)
+AUTOSTART_FILE = os.path.join(AUTOSTART_DIR, f"{APP_NAME}.desktop")
+
+_MAIN_PY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def _quote(arg):
+    """Quote an argument for a desktop entry's Exec key: the Exec quoting
+    rule, then the general string escaping applied on top of it."""
+    if arg and not re.search(r'[\s"\'\\><~|&;$*?#()`]', arg):
+        return arg
+    quoted = '"' + re.sub(r'(["`$\\])', r"\\\1", arg) + '"'
+    return quoted.replace("\\", "\\\\")
+
+
+def _exec_command():
+    """The command line that starts this install, as installed by
+    install.sh if possible, else this checkout's main.py."""
+    installed = shutil.which(APP_NAME)
+    if installed:
+        argv = [installed]
+    else:
+        argv = [sys.executable, _MAIN_PY]
+    return " ".join(_quote(a) for a in argv) + " --autostart"
+
+
+def is_enabled():
+    return os.path.exists(AUTOSTART_FILE)
+
+
+def enable():
+    """Write the autostart entry (replacing any existing one)."""
+    os.makedirs(AUTOSTART_DIR, exist_ok=True)
+    with open(AUTOSTART_FILE, "w") as f:
+        f.write(
+            "[Desktop Entry]\n"
+            "Type=Application\n"
+            "Name=RM ACS Launcher\n"
+            "Comment=Keep RM ACS Launcher ready in the background\n"
+            f"Exec={_exec_command()}\n"
+            "Terminal=false\n"
+            "NoDisplay=true\n"
+            "X-GNOME-Autostart-enabled=true\n"
+        )
+
+
+def disable():
+    """Remove the autostart entry, if there is one."""
+    try:
+        os.unlink(AUTOSTART_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def set_enabled(enabled):
+    if enabled:
+        enable()
+    else:
+        disable()
@@ -0,0 +1,205 @@
+"""Command-line interface: launch a function without starting the GUI.
+
+    rm-acs-launcher launch --system PROD --user RICHARD --function rss
+    rm-acs-launcher serve                 # see service.py
+
+Uses the same config, keyring, logon cache and launcher code as the
+window, but never imports GTK, so it's quick enough for a terminal or a
+keybinding. The keyring (libsecret via PyGObject) is only imported when a
+password is actually needed.
+"""
+import argparse
+import getpass
+import sys
+
+from acs_launcher import __version__, config, launcher, logging_setup, sessions, state, templates
+
+log = logging_setup.get_logger()
+
+
+class CLIError(Exception):
+    """A launch request that can't be carried out; the message is for the user."""
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="rm-acs-launcher",
+        description="Launch IBM i Access Client Solutions functions.",
+    )
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    sub = parser.add_subparsers(dest="command", required=True)
+    launch = sub.add_parser("launch", help="launch a function for a system and user")
+    launch.add_argument("--system", "-s", required=True, help="system name (hostname)")
+    launch.add_argument(
+        "--user", "-u",
+        help="user profile (default: the system's only user, or the last one used)",
+    )
+    launch.add_argument("--function", "-f", required=True, help="function id, e.g. rss or 5250")
+    launch.set_defaults(handler=_cmd_launch)
+    serve = sub.add_parser(
+        "serve", help="serve launch/logon/status requests on a Unix socket"
+    )
+    serve.add_argument(
+        "--socket", metavar="PATH",
+        help="socket path (default: $XDG_RUNTIME_DIR/rm-acs-launcher.sock)",
+    )
+    serve.set_defaults(handler=_cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    """Run the CLI with `argv` (without the program name); return the exit code."""
+    args = build_parser().parse_args(argv)
+    cfg = config.load_config()
+    logging_setup.configure(cfg.get("enable_logging", True))
+    try:
+        return args.handler(cfg, args)
+    except CLIError as e:
+        print(f"rm-acs-launcher: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+
+
+def _cmd_launch(cfg, args):
+    ok, msg = launch(cfg, args.system, args.user, args.function)
+    print(msg, file=sys.stdout if ok else sys.stderr)
+    return 0 if ok else 1
+
+
+def _cmd_serve(cfg, args):
+    from acs_launcher import service
+
+    return service.run(args.socket)
+
+
+def parse_target(target):
+    """Split a "FUNCTION@SYSTEM" launch target (as given to the GUI's
+    --launch option) into (function_id, system_name)."""
+    function_id, sep, system_name = target.rpartition("@")
+    if not sep or not function_id or not system_name:
+        raise CLIError(f"expected FUNCTION@SYSTEM, got '{target}'")
+    return function_id, system_name
+
+
+def resolve(cfg, system_name, user, function_id):
+    """Look up and validate a launch request; return (system, user, fn).
+
+    `user` may be None to pick a default (see resolve_user).
+    Raises CLIError if the request can't be launched.
+    """
+    system = config.get_system(cfg, system_name)
+    if system is None:
+        raise CLIError(f"unknown system '{system_name}'")
+    fn = config.get_function(cfg, function_id)
+    if fn is None:
+        raise CLIError(f"unknown function '{function_id}'")
+    user = resolve_user(cfg, system, user)
+    if not config.system_has_required_fields(system, fn):
+        raise CLIError(
+            f"system '{system_name}' is missing required fields: "
+            f"{', '.join(fn.get('system_fields', []))}"
+        )
+    problem = config.template_problem(cfg, system, fn)
+    if problem:
+        raise CLIError(problem)
+    return system, user, fn
+
+
+def resolve_user(cfg, system, user):
+    """`user`, or if it's empty the system's only user, or else the last
+    user chosen in the GUI if that user belongs to the system."""
+    if user:
+        return user
+    users = system.get("users", [])
+    if len(users) == 1:
+        return users[0]
+    last_user = state.load()["last_user"]
+    if last_user in users:
+        return last_user
+    raise CLIError(f"--user is required for system '{system['name']}'")
+
+
+def launch(cfg, system_name, user, function_id, password=None):
+    """Log on if needed, then launch; return (success, message).
+
+    Same flow as the window's Launch button: a valid cached logon is
+    reused, a password the host just rejected fails fast, and the
+    password comes from the keyring or, on a terminal, a prompt.
+    Raises CLIError if the request can't be launched.
+    """
+    system, user, fn = resolve(cfg, system_name, user, function_id)
+    launch_template = templates.compile(fn["launch_cmd"])
+    needs_logon = fn.get("requires_logon", False) and not sessions.is_logged_on(system_name, user)
+    if password is None and (needs_logon or "password" in launch_template.fields):
+        password = _get_password(system_name, user)
+
+    if needs_logon:
+        ok, msg = _logon(cfg, system, user, password)
+        if not ok:
+            return False, msg
+
+    placeholders = launcher.build_placeholders(cfg, system, user, password)
+    return launcher.launch(launch_template.argv(placeholders), password=password)
+
+
+def _logon(cfg, system, user, password):
+    rejected = sessions.recent_failure(system["name"], user, password)
+    if rejected is not None:
+        return False, rejected
+    argv, pty_password = logon_command(cfg, system, user, password)
+    ok, msg = launcher.run_logon(argv, password=pty_password)
+    record_logon(cfg, system["name"], user, password, ok, msg)
+    return ok, msg
+
+
+def logon_command(cfg, system, user, password):
+    """Return (argv, pty_password) for the configured logon_cmd.
+
+    As in the window: a template embedding {password} runs the legacy
+    argv logon (pty_password is None), anything else has the password
+    fed over a PTY.
+    """
+    template = templates.compile(cfg.get("logon_cmd", ""))
+    argv = template.argv(launcher.build_placeholders(cfg, system, user, password))
+    if "password" in template.fields:
+        return argv, None
+    return argv, password
+
+
+def record_logon(cfg, system_name, user, password, ok, msg):
+    """Record a logon outcome in the session and failure caches."""
+    if ok:
+        sessions.mark_logged_on(
+            system_name, user,
+            cfg.get("logon_cache_ttl", config.DEFAULT_CONFIG["logon_cache_ttl"]),
+        )
+    elif launcher.is_credential_failure(msg):
+        sessions.record_failure(system_name, user, password, msg)
+
+
+def _get_password(system_name, user):
+    password = keyring_lookup(system_name, user)
+    if password is not None:
+        return password
+    if not sys.stdin.isatty():
+        raise CLIError(
+            f"no password stored for {user}@{system_name} and no terminal to prompt on"
+        )
+    password = getpass.getpass(f"Password for {user}@{system_name}: ")
+    if not password:
+        raise CLIError("launch cancelled - no password")
+    return password
+
+
+def keyring_lookup(system_name, user):
+    """The stored password for system/user, or None if there is none or
+    the keyring can't be reached."""
+    try:
+        from acs_launcher import passwords
+        return passwords.lookup(system_name, user)
+    except Exception:
+        # No PyGObject/libsecret, or no Secret Service on this session
+        # (e.g. over ssh): fall back to prompting.
+        log.warning("cli: keyring lookup failed", exc_info=True)
+        return None
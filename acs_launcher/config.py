@@ -1,9 +1,35 @@
+import atexit
+import collections
+import collections.abc
+import contextlib
+import fcntl
+import hashlib
 import json
+import marshal
 import os
 import copy
+import functools
+import sys
+import tempfile
+import threading
+import urllib.parse
+
+from acs_launcher import __version__, logging_setup, model, templates
 
 CONFIG_DIR = os.path.expanduser("~/.config/rm-acs-launcher")
 CONFIG_FILE = os.path.join(CONFIG_DIR, "config.json")
+# With this directory present, systems and functions live in a file each
+# under it (the config.d layout, below).
+CONFIG_D = os.path.join(CONFIG_DIR, "config.d")
+STATE_DIR = os.path.expanduser("~/.local/state/rm-acs-launcher")
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "rm-acs-launcher"
+)
+SNAPSHOT_FILE = os.path.join(CACHE_DIR, "config.snapshot")
+# Local copy of a symlinked (central) config.json, see load_cached.
+LOCAL_COPY_FILE = os.path.join(CACHE_DIR, "config.json")
+# The document last fetched from `config_url`, with its validators.
+REMOTE_CACHE_FILE = os.path.join(CACHE_DIR, "remote-config.json")
 ICONS_DIR = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
     "data", "icons",
@@ -125,58 +151,845 @@ DEFAULT_CONFIG = {
     "logon_cmd": "{acs_exe} /plugin=logon /system={system} /userid={user} /auth /gui=0",
     "systems": [],
     "functions": DEFAULT_FUNCTIONS,
-    "last_system": "",
-    "last_user": "",
-    "last_function": "",
     "enable_logging": True,
+    "logon_cache_ttl": 8 * 60 * 60,
+    # Keep a binary snapshot of the parsed config in CACHE_DIR, so a cold
+    # start can skip parsing a large (often NFS-hosted) config.json.
+    "config_snapshot": False,
+    # Fetch the shared config from this HTTP(S) URL; see _overlay_remote.
+    "config_url": "",
 }
 
+# Settings a config.json with a `config_url` keeps for itself: they are
+# per-machine, so the document's values for them are ignored. Everything
+# else comes from the URL, and only these are saved.
+LOCAL_KEYS = (
+    "config_url", "acs_exe_path", "acs_jar_path", "java_path", "java_opts",
+    "enable_logging", "logon_cache_ttl", "config_snapshot",
+)
+
+# Seconds to wait for the `config_url` server.
+REMOTE_TIMEOUT = 10
+
+# Bump when the snapshot layout changes; older snapshots are then ignored.
+_SNAPSHOT_FORMAT = 2
+
+# Seconds `refresh` waits for a central config.json before reporting that
+# it is slow (a hung NFS or SMB mount).
+REFRESH_TIMEOUT = 10
+
+# (file key, marshalled config, marshalled base) for the last config.json
+# parsed; the base is the file as read, which differs from the config if
+# it was migrated. Both are kept marshalled so every load_config() can
+# hand out its own copy cheaply.
+_cached = None
+_cache_lock = threading.Lock()
+
+
+def _file_key(st):
+    """What identifies one version of config.json: if none of these
+    changed, neither did the file."""
+    return (CONFIG_FILE, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+
+
+def _source_key(st):
+    """What identifies one version of the config: config.json's file key
+    and the version of the `config_url` document cached, if any."""
+    try:
+        remote = os.stat(REMOTE_CACHE_FILE)
+    except OSError:
+        return (_file_key(st), None)
+    return (_file_key(st), (remote.st_ino, remote.st_size, remote.st_mtime_ns))
+
 
 def load_config():
-    """Load config from disk, returning defaults for missing keys."""
+    """Load config from disk, returning defaults for missing keys.
+
+    The result is a `model.Config`. The parsed, migrated config is cached
+    for as long as the file's inode, size and mtime stay the same, so
+    repeated calls cost one stat. Every call returns a fresh copy that the
+    caller is free to modify.
+
+    If a symlinked config.json can't be read (its mount is gone), the
+    local copy of it is returned instead, if there is one.
+    """
+    try:
+        return _load()
+    except (ValueError, OSError) as e:
+        if os.path.islink(CONFIG_FILE):
+            local = _read_local_copy()
+            if local is not None:
+                logging_setup.get_logger().warning(
+                    "config: %s unreadable (%s), using the local copy", CONFIG_FILE, e
+                )
+                return local
+        return model.Config(copy.deepcopy(DEFAULT_CONFIG))
+
+
+def _load():
+    """load_config, raising OSError or ValueError if config.json can't be
+    read."""
+    global _cached
+    key = _source_key(os.stat(CONFIG_FILE))
+    with _cache_lock:
+        if _cached is not None and _cached[0] == key:
+            return _new_config(*_cached[1:])
+    blob, base = _read_snapshot(key) or (None, None)
+    if blob is None:
+        key, config, saved = _parse_config()
+        blob = marshal.dumps(config)
+        base = marshal.dumps(saved) if saved is not None else blob
+        if config.get("config_snapshot"):
+            _write_snapshot(key, blob, base)
+        else:
+            _remove_snapshot()
+        if os.path.islink(CONFIG_FILE):
+            _write_local_copy(config)
+    with _cache_lock:
+        _cached = (key, blob, base)
+    return _new_config(blob, base)
+
+
+def _new_config(blob, base):
+    """A Config of its own from the marshalled config `blob`, whose saves
+    merge against the marshalled `base`."""
+    config = marshal.loads(blob)
+    if _sharded(config):
+        # Shards config.json doesn't list yet are, to a save, added here.
+        _attach_shards(config)
+        _make_lazy(config)
+    return model.Config(config, base=base)
+
+
+# ---- config.d ----
+#
+# In the sharded layout config.json keeps the settings and an index of
+# the systems and functions, in order: just each one's name or id, its
+# label and, for a function, what the favourites bar and the prelogon
+# need (model.Function._INDEXED). The entries themselves are in config.d/systems/<name>.json and
+# config.d/functions/<id>.json, and are only read when used (see
+# model._Record.lazy). A save writes the index and only the files of the
+# entries that were loaded and changed since, merged three ways with the
+# file as it is now (so edits other machines made to other fields stay),
+# and removes those of entries removed since the config was loaded.
+#
+# A config.json that still holds full entries is split up by the first
+# save after config.d is created.
+
+_SHARDS = (("systems", "name", model.System), ("functions", "id", model.Function))
+
+# Shard path -> (stat key, text, marshalled content) as last read or written.
+_shard_cache = {}
+
+
+def _sharded(config):
+    return os.path.isdir(CONFIG_D) and not config.get("config_url")
+
+
+def _shard_path(kind, name):
+    return os.path.join(CONFIG_D, kind, urllib.parse.quote(str(name), safe="") + ".json")
+
+
+def _is_index_entry(item, cls):
+    # A record too: one built from an index (the local copy's, say) must
+    # never be written over its shard.
+    return isinstance(item, collections.abc.Mapping) and item.keys() <= set(cls._INDEXED)
+
+
+def _index_entry(item, cls):
+    """The fields of `item` kept in the index (see model._Record.lazy);
+    reading them doesn't load a lazy record."""
+    field = cls._INDEXED[0]
+    entry = {field: item.get(field)}
+    for name in cls._INDEXED[1:]:
+        if name in item:
+            entry[name] = item[name]
+    return entry
+
+
+def _attach_shards(config):
+    """Add index entries for shards that config.json doesn't list (files
+    dropped into config.d), after the listed ones. Those few are read
+    now for their index fields."""
+    for kind, field, cls in _SHARDS:
+        try:
+            files = sorted(os.listdir(os.path.join(CONFIG_D, kind)))
+        except OSError:
+            continue
+        items = config.setdefault(kind, [])
+        known = {item.get(field) for item in items}
+        for filename in files:
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            name = urllib.parse.unquote(filename[:-len(".json")])
+            if name not in known:
+                entry = _index_entry(_read_shard(_shard_path(kind, name)), cls)
+                entry[field] = name
+                items.append(entry)
+
+
+def _make_lazy(config):
+    """Turn the index entries in `config` into lazy records."""
+    for kind, field, cls in _SHARDS:
+        items = config.get(kind, [])
+        for i, item in enumerate(items):
+            if _is_index_entry(item, cls):
+                loader = functools.partial(_read_shard, _shard_path(kind, item.get(field)))
+                items[i] = cls.lazy(item, loader)
+
+
+def _shard_key(st):
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def _read_shard(path):
+    """The entry in shard `path`, or {} if it is missing or unreadable."""
+    try:
+        key = _shard_key(os.stat(path))
+    except FileNotFoundError:
+        return {}
+    except OSError as e:
+        logging_setup.get_logger().warning("config: can't read %s: %s", path, e)
+        return {}
+    with _cache_lock:
+        cached = _shard_cache.get(path)
+    if cached is not None and cached[0] == key:
+        return marshal.loads(cached[2])
+    try:
+        with open(path, "r") as f:
+            key = _shard_key(os.fstat(f.fileno()))
+            text = f.read()
+        entry = json.loads(text)
+    except (OSError, ValueError) as e:
+        logging_setup.get_logger().warning("config: can't read %s: %s", path, e)
+        return {}
+    if not isinstance(entry, dict):
+        logging_setup.get_logger().warning("config: %s is not a JSON object", path)
+        return {}
+    with _cache_lock:
+        _shard_cache[path] = (key, text, marshal.dumps(entry))
+    return entry
+
+
+def _split(config):
+    """The config.json text and the shard changes for saving `config` in
+    the sharded layout: {path: change}, where a change is the text to
+    write, (text, base) to merge the entry into the shard as it is now
+    (see `_write_shards`), or None to remove the shard.
+
+    A record read from its shard is only written if it was changed since
+    (compared with its `base`); an unchanged one is left alone, so edits
+    other machines made to its file meanwhile stay."""
+    base = getattr(config, "base", None)
+    before = _decode_base(base) if base is not None else {}
+    index = dict(config)
+    shards = {}
+    for kind, field, cls in _SHARDS:
+        entries = []
+        for item in config.get(kind, []):
+            if getattr(item, "loaded", True) and not _is_index_entry(item, cls):
+                record_base = getattr(item, "base", None)
+                if record_base is None:
+                    shards[_shard_path(kind, item[field])] = _serialize(item)
+                elif dict(item) != record_base:
+                    shards[_shard_path(kind, item[field])] = (_serialize(item), record_base)
+            entries.append(_index_entry(item, cls))
+        index[kind] = entries
+        # Entries gone since the config was loaded (or renamed) take their
+        # shard with them.
+        kept = {entry[field] for entry in entries}
+        for entry in before.get(kind, []):
+            if entry.get(field) not in kept:
+                shards.setdefault(_shard_path(kind, entry.get(field)), None)
+    return _serialize(index), shards
+
+
+def _write_shards(shards):
+    """Apply the shard changes from `_split`; called under the config lock."""
+    for path, text in shards.items():
+        if isinstance(text, tuple):
+            text, base = text
+            on_disk = _read_shard(path)
+            if on_disk:
+                text = _serialize(merge(base, json.loads(text), on_disk))
+        if text is None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+            with _cache_lock:
+                _shard_cache.pop(path, None)
+            continue
+        try:
+            key = _shard_key(os.stat(path))
+        except OSError:
+            key = None
+        with _cache_lock:
+            cached = _shard_cache.get(path)
+        if key is not None:
+            if cached is not None and cached[0] == key:
+                current = cached[1]
+            else:
+                try:
+                    with open(path, "r") as f:
+                        current = f.read()
+                except OSError:
+                    current = None
+            if current == text:
+                continue
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        _atomic_write(os.path.realpath(path), text)
+        with contextlib.suppress(OSError, ValueError):
+            with _cache_lock:
+                _shard_cache[path] = (
+                    _shard_key(os.stat(path)), text, marshal.dumps(json.loads(text))
+                )
+
+
+def shards_signature():
+    """Names, sizes and mtimes of the files in config.d, for noticing that
+    a shard changed; None without config.d."""
+    if not os.path.isdir(CONFIG_D):
+        return None
+    signature = []
+    for kind, _, _ in _SHARDS:
+        directory = os.path.join(CONFIG_D, kind)
+        with contextlib.suppress(OSError):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    with contextlib.suppress(OSError):
+                        st = entry.stat()
+                        signature.append((kind, entry.name, st.st_size, st.st_mtime_ns))
+    return sorted(signature)
+
+
+def load_cached():
+    """Load config without waiting for a central config.json.
+
+    Returns (config, current). When config.json is a symlink, usually to
+    a file on an NFS or SMB mount, this returns the local copy of it kept
+    in CACHE_DIR straight away, and `current` is False: the caller should
+    `refresh` to read the file itself. Otherwise (a local config.json, or
+    no copy yet) it is `load_config()`, and `current` is True.
+    """
+    if os.path.islink(CONFIG_FILE):
+        local = _read_local_copy()
+        if local is not None:
+            return local, False
+    return load_config(), True
+
+
+def refresh(on_done, on_timeout=None, timeout=REFRESH_TIMEOUT):
+    """Read config.json on a background thread, after `load_cached`
+    returned a local copy.
+
+    `on_done(config)` is called on that thread with the config as read,
+    or None if the file can't be read. If that hasn't happened within
+    `timeout` seconds, `on_timeout()` is called (on a timer thread);
+    `on_done` still follows if the read ever completes. Once it has,
+    `load_config` is served from memory.
+    """
+    timer = None
+    if on_timeout is not None:
+        timer = threading.Timer(timeout, on_timeout)
+        timer.daemon = True
+        timer.start()
+
+    def run():
+        try:
+            config = _load()
+        except (ValueError, OSError) as e:
+            logging_setup.get_logger().warning("config: %s unreadable: %s", CONFIG_FILE, e)
+            config = None
+        if timer is not None:
+            timer.cancel()
+        on_done(config)
+
+    thread = threading.Thread(target=run, name="config-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+def _parse_config():
+    """Read and migrate config.json. Returns (file key, config, saved),
+    with `saved` the config as read if migrations changed it, else None.
+
+    Loading never writes the file: a migrated config uses the file as read
+    as its base, so the next save (a change made in the GUI) merges the
+    migrations in along with it, keeping edits made elsewhere. Until then
+    they are redone on each parse, which is cheap.
+    """
+    with open(CONFIG_FILE, "r") as f:
+        # fstat the file actually read, in case it is replaced meanwhile.
+        st = os.fstat(f.fileno())
+        saved = json.load(f)
+    if not isinstance(saved, dict):
+        raise ValueError(f"{CONFIG_FILE} is not a JSON object")
+    if saved.get("config_url"):
+        saved = _overlay_remote(saved)
+    key = _source_key(st)
     config = copy.deepcopy(DEFAULT_CONFIG)
-    if os.path.exists(CONFIG_FILE):
+    # Settings this release doesn't know (a newer one wrote them) are kept.
+    config.update(copy.deepcopy(saved))
+    if _migrate(config):
+        return key, config, saved
+    return key, config, None
+
+
+def _overlay_remote(saved):
+    """config.json `saved` with the document from its `config_url` laid
+    over it, except for LOCAL_KEYS.
+
+    The cached document is used if there is one (see `poll_remote` for
+    revalidating it); otherwise it is fetched now. If it can't be, the
+    local file is all there is.
+    """
+    # Imported here: urllib.request is a noticeable part of startup, and
+    # only a config_url needs it.
+    from acs_launcher import config_remote
+
+    url = saved["config_url"]
+    shared = config_remote.read_cache(REMOTE_CACHE_FILE, url)
+    if shared is None:
         try:
-            with open(CONFIG_FILE, "r") as f:
-                saved = json.load(f)
-            for key in config:
-                if key in saved:
-                    config[key] = saved[key]
-            # Migrate the old logon_cmd default to the new PTY-friendly one.
-            # Custom user templates (anything that doesn't match the old
-            # default exactly) are left untouched.
-            if config.get("logon_cmd") == _LEGACY_LOGON_CMD:
-                config["logon_cmd"] = DEFAULT_CONFIG["logon_cmd"]
-            # Add any new default functions not present in the saved config
-            saved_ids = {fn["id"] for fn in config["functions"]}
-            for fn in DEFAULT_FUNCTIONS:
-                if fn["id"] not in saved_ids:
-                    config["functions"].append(copy.deepcopy(fn))
-            # Migrate the old default-icon filename
-            for fn in config["functions"]:
-                if fn.get("icon_path") == "acs-logo.png":
-                    fn["icon_path"] = "app-default.png"
-        except (json.JSONDecodeError, OSError):
-            pass
-    return config
+            config_remote.fetch(url, REMOTE_CACHE_FILE, REMOTE_TIMEOUT)
+        except (ValueError, OSError) as e:
+            logging_setup.get_logger().warning("config: can't fetch %s: %s", url, e)
+        shared = config_remote.read_cache(REMOTE_CACHE_FILE, url) or {}
+    return {**saved, **{k: v for k, v in shared.items() if k not in LOCAL_KEYS}}
+
+
+def poll_remote(timeout=REMOTE_TIMEOUT):
+    """Revalidate the `config_url` document with a conditional GET.
+    Returns True if it changed, so the next `load_config` returns the new
+    version; False if it didn't or there is no `config_url`. Raises
+    OSError or ValueError if the server can't be reached or answers
+    nonsense."""
+    url = load_config().get("config_url")
+    if not url:
+        return False
+    from acs_launcher import config_remote
+
+    return config_remote.fetch(url, REMOTE_CACHE_FILE, timeout)
+
+
+# Settings older releases kept in config.json that now live elsewhere.
+_RETIRED_KEYS = ("last_system", "last_user", "last_function")
+
+
+def _migrate(config):
+    """Bring a config saved by an older release up to date. Returns True
+    if anything changed."""
+    changed = False
+    # The last selections moved to the local state file (see state.py).
+    for name in _RETIRED_KEYS:
+        if name in config:
+            del config[name]
+            changed = True
+    # Migrate the old logon_cmd default to the new PTY-friendly one.
+    # Custom user templates (anything that doesn't match the old
+    # default exactly) are left untouched.
+    if config.get("logon_cmd") == _LEGACY_LOGON_CMD:
+        config["logon_cmd"] = DEFAULT_CONFIG["logon_cmd"]
+        changed = True
+    # Add any new default functions not present in the saved config
+    saved_ids = {fn["id"] for fn in config["functions"]}
+    for fn in DEFAULT_FUNCTIONS:
+        if fn["id"] not in saved_ids:
+            config["functions"].append(copy.deepcopy(fn))
+            changed = True
+    # Migrate the old default-icon filename
+    for fn in config["functions"]:
+        if fn.get("icon_path") == "acs-logo.png":
+            fn["icon_path"] = "app-default.png"
+            changed = True
+    return changed
+
+
+def _snapshot_header(key):
+    # marshal's format is only stable within one Python version, and what
+    # a file parses to depends on this release's defaults and migrations.
+    return (_SNAPSHOT_FORMAT, tuple(sys.version_info[:2]), __version__, _parser_signature(), key)
+
+
+def _parser_signature():
+    """A hash of what, besides the file, `_parse_config` builds the config
+    from: the defaults and the migrations."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(DEFAULT_CONFIG, sort_keys=True).encode())
+    digest.update(repr((_RETIRED_KEYS, _LEGACY_LOGON_CMD)).encode())
+    code = _migrate.__code__
+    digest.update(code.co_code)
+    digest.update(repr(code.co_consts).encode())
+    return digest.hexdigest()
+
+
+def _read_snapshot(key):
+    """The marshalled (config, base) from the snapshot, if it was taken of
+    this version of config.json; else None."""
+    try:
+        with open(SNAPSHOT_FILE, "rb") as f:
+            header, blobs = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return blobs if header == _snapshot_header(key) else None
+
+
+def _write_snapshot(key, blob, base):
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".config.snapshot.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                marshal.dump((_snapshot_header(key), (blob, base)), f)
+            os.replace(tmp, SNAPSHOT_FILE)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        logging_setup.get_logger().warning("config: snapshot not written: %s", e)
+
+
+def _read_local_copy():
+    """The local copy of a central config.json, or None if there is none."""
+    try:
+        with open(LOCAL_COPY_FILE, "r") as f:
+            text = f.read()
+        saved = json.loads(text)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(saved, dict):
+        return None
+    if not saved.get("config_url"):
+        # A copy of a sharded config holds only the index; the entries stay
+        # in config.d. (Not checked for here: config.d may be on the very
+        # mount that isn't answering. Outside that layout, an entry with
+        # nothing but index fields reads as such from its missing shard.)
+        _make_lazy(saved)
+    # Saves merge against what the copy held, like against a loaded file.
+    return model.Config(saved, base=text)
+
+
+def _write_local_copy(config):
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".config.json.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(_serialize(config))
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, LOCAL_COPY_FILE)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        logging_setup.get_logger().warning("config: local copy not written: %s", e)
+
+
+def _remove_snapshot():
+    try:
+        os.unlink(SNAPSHOT_FILE)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging_setup.get_logger().warning("config: snapshot not removed: %s", e)
 
 
 def save_config(config):
-    """Save config to disk, creating the directory if needed.
+    """Save config to disk now, creating the directory if needed.
+
+    The file is replaced atomically, and not written at all if its content
+    wouldn't change. Supersedes any save still queued by `queue_save`.
+
+    If `config` came from `load_config`, the save is a three-way merge
+    (see `merge`) with the file as it is now, under an advisory lock, so
+    edits saved meanwhile by other machines or instances are kept.
 
     Tightens permissions on every save so existing installs (whose config
     was originally written under the default umask) get migrated the next
     time the user touches a setting or launches a session.
     """
+    text, shards = _texts(config)
+    _writer.write_now(text, getattr(config, "base", None), shards, config)
+
+
+def queue_save(config):
+    """Save config on the background writer thread, so a slow (NFS)
+    config.json never blocks the caller. The config is serialized now;
+    saves queued in quick succession are coalesced into one write of the
+    latest. Anything still queued is written at exit (see `flush_saves`).
+    Merged like `save_config`.
+    """
+    text, shards = _texts(config)
+    _writer.submit(text, getattr(config, "base", None), shards, config)
+
+
+def _rebase(config, text, shards):
+    # What we just saved is what the next save's local edits are relative
+    # to. Only once it is on disk: until then (or if the write fails) they
+    # are still relative to the old base, so the next save carries them.
+    if isinstance(config, model.Config):
+        config.base = text
+    for kind, field, _ in _SHARDS if shards else ():
+        for item in config.get(kind, []):
+            change = shards.get(_shard_path(kind, item.get(field)))
+            if change is not None and hasattr(item, "base"):
+                item.base = json.loads(change[0] if isinstance(change, tuple) else change)
+
+
+def _decode_base(base):
+    """A Config's base as a dict: the marshalled config it was loaded
+    from, or the JSON text it was last saved as."""
+    return marshal.loads(base) if isinstance(base, bytes) else json.loads(base)
+
+
+def save_pending():
+    """True while a queued save hasn't been written yet."""
+    return _writer.pending()
+
+
+def flush_saves():
+    """Write any queued save now, waiting for one in progress."""
+    _writer.write_now(None, None, None)
+
+
+def _serialize(config):
+    return json.dumps(config, indent=2, default=model.json_default)
+
+
+def _texts(config):
+    """What saving `config` writes: the config.json text, and the shard
+    changes (see `_split`) or None outside the config.d layout."""
+    if _sharded(config):
+        return _split(config)
+    return _serialize(_local_part(config)), None
+
+
+def is_local(config, key):
+    """True if saving `config` writes `key`. With a `config_url` only
+    LOCAL_KEYS are the local file's; the rest can't be edited here."""
+    return not config.get("config_url") or key in LOCAL_KEYS
+
+
+def _local_part(config):
+    """What of `config` is saved to config.json: with a `config_url`,
+    only LOCAL_KEYS (the rest is the server's); else all of it."""
+    if not config.get("config_url"):
+        return config
+    return {k: config[k] for k in LOCAL_KEYS if k in config}
+
+
+# Content last written to (or found in) config.json, with the file key it
+# had then; a save of identical content to an unchanged file is skipped.
+_last_written = None
+
+
+def _write_text(text, base=None, shards=None):
     os.makedirs(CONFIG_DIR, exist_ok=True)
     os.chmod(CONFIG_DIR, 0o700)
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(config, f, indent=2)
-    os.chmod(CONFIG_FILE, 0o600)
+    # Replace the file a symlink points at (a central config), not the link.
+    path = os.path.realpath(CONFIG_FILE)
+    with _locked(path):
+        if shards:
+            _write_shards(shards)
+        if base is not None:
+            on_disk = _read_saved()
+            if on_disk is not None:
+                text = _serialize(merge(_decode_base(base), json.loads(text), on_disk))
+        if not _unchanged(text):
+            _replace(path, text)
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Hold an exclusive lock on the sidecar lock file of `path`. POSIX
+    (fcntl) locks rather than flock, since they also work over NFS. If the
+    lock file can't be created (a read-only shared directory), go ahead
+    unlocked: the write itself will most likely fail too."""
+    lock_path = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".lock")
+    try:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+    except OSError as e:
+        logging_setup.get_logger().warning("config: not locking %s: %s", lock_path, e)
+        fd = None
+    try:
+        if fd is not None:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+
+def _read_saved():
+    """config.json as saved, or None if it is missing or unreadable."""
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return saved if isinstance(saved, dict) else None
+
+
+def _replace(path, text):
+    """Atomically replace config.json, at `path`, with `text`."""
+    global _cached, _last_written
+    _atomic_write(path, text)
+    # The stat key would change anyway, but not necessarily within the
+    # mtime granularity of every filesystem.
+    with _cache_lock:
+        _cached = None
+    with contextlib.suppress(OSError):
+        _last_written = (_file_key(os.stat(CONFIG_FILE)), text)
+
+
+def _atomic_write(path, text):
+    """Replace `path` with `text`, so readers see the old or the new
+    content and never a partial file."""
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o600)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    with contextlib.suppress(OSError):
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _unchanged(text):
+    """True if config.json already holds exactly `text`."""
+    global _last_written
+    try:
+        key = _file_key(os.stat(CONFIG_FILE))
+    except OSError:
+        return False
+    if _last_written is not None and _last_written[0] == key:
+        return _last_written[1] == text
+    # Changed by someone else (or never written by us): reading it back
+    # is still cheaper than rewriting it.
+    try:
+        with open(CONFIG_FILE, "r") as f:
+            current = f.read()
+    except (OSError, ValueError):
+        return False
+    _last_written = (key, current)
+    return current == text
+
+
+class _Writer:
+    """Writes config.json for `queue_save`, one save at a time."""
+
+    # How long a queued save waits for further changes to coalesce with.
+    DELAY = 0.5
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None  # (text, base, shards, config) waiting to be written
+        self._busy = False  # a write is in progress
+        self._thread = None
+
+    def submit(self, text, base, shards, config):
+        with self._cond:
+            # A coalesced save is relative to the base of the first save
+            # it replaces: that one never reached the disk. Shards it
+            # changed are written too, unless this save changes them again.
+            if self._pending is not None:
+                base = self._pending[1]
+                shards = _combine_shards(self._pending[2], shards)
+            self._pending = (text, base, shards, config)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="config-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(flush_saves)
+            self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return self._pending is not None or self._busy
+
+    def write_now(self, text, base, shards, config=None):
+        """Write `text` (or, if None, whatever is queued) on this thread,
+        then rebase `config` on it. Errors are raised to the caller."""
+        with self._cond:
+            self._cond.wait_for(lambda: not self._busy)
+            if self._pending is not None:
+                if text is None:
+                    text, config = self._pending[0], self._pending[3]
+                base = self._pending[1]
+                shards = _combine_shards(self._pending[2], shards)
+            self._pending = None
+            if text is None:
+                return
+            self._busy = True
+        try:
+            _write_text(text, base, shards)
+            if config is not None:
+                _rebase(config, text, shards)
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None)
+                # Let a burst of changes settle; only the last one is
+                # written. (Cut short if write_now takes the text.)
+                self._cond.wait_for(lambda: self._pending is None, self.DELAY)
+                self._cond.wait_for(lambda: not self._busy)
+                pending, self._pending = self._pending, None
+                if pending is None:  # taken by write_now meanwhile
+                    continue
+                self._busy = True
+            text, base, shards, config = pending
+            try:
+                _write_text(text, base, shards)
+                _rebase(config, text, shards)
+            except OSError as e:
+                logging_setup.get_logger().warning("config: save failed: %s", e)
+            except Exception:
+                # Anything else too: the thread must live on to write (and
+                # report as pending) the saves still to come.
+                logging_setup.get_logger().exception("config: save failed")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+
+def _combine_shards(earlier, later):
+    if not earlier:
+        return later
+    combined = dict(earlier)
+    for path, change in (later or {}).items():
+        if isinstance(change, tuple) and path in earlier:
+            # The later change is relative to the earlier one, which never
+            # reached the disk: merge against what that one started from.
+            before = earlier[path]
+            change = (change[0], before[1]) if isinstance(before, tuple) else change[0]
+        combined[path] = change
+    return combined
+
+
+_writer = _Writer()
 
 
 def get_system(config, system_name):
-    """Find a system dict by name, or None."""
+    """Find a system by name, or None."""
+    if isinstance(config, model.Config):
+        return config.system(system_name)
     for s in config["systems"]:
         if s["name"] == system_name:
             return s
@@ -184,13 +997,149 @@ def get_system(config, system_name):
 
 
 def get_function(config, function_id):
-    """Find a function dict by id, or None."""
+    """Find a function by id, or None."""
+    if isinstance(config, model.Config):
+        return config.function(function_id)
     for fn in config["functions"]:
         if fn["id"] == function_id:
             return fn
     return None
 
 
+class ListDiff(collections.namedtuple("ListDiff", "added removed changed reordered")):
+    """Changes to the systems or functions list, keyed by name or id:
+    sets of `added`, `removed` and `changed` keys, and whether the entries
+    in both lists are now in a different order. False if nothing changed."""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.reordered)
+
+
+class ConfigDiff(collections.namedtuple("ConfigDiff", "settings systems functions")):
+    """The changes between two configs: the set of changed top-level
+    `settings`, and ListDiffs for `systems` and `functions`."""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return bool(self.settings or self.systems or self.functions)
+
+
+def diff(old, new):
+    """What changed from config `old` to config `new`, as a ConfigDiff."""
+    settings = {
+        key for key in old.keys() | new.keys()
+        if key not in ("systems", "functions") and old.get(key) != new.get(key)
+    }
+    return ConfigDiff(
+        settings,
+        _list_diff(old.get("systems", []), new.get("systems", []), "name", model.System),
+        _list_diff(old.get("functions", []), new.get("functions", []), "id", model.Function),
+    )
+
+
+def _list_diff(old_items, new_items, key, cls):
+    old, new = {}, {}
+    # The first entry with a key wins, as in lookups.
+    for items, index in ((old_items, old), (new_items, new)):
+        for item in items:
+            index.setdefault(item.get(key), item)
+    common = old.keys() & new.keys()
+    return ListDiff(
+        added=new.keys() - old.keys(),
+        removed=old.keys() - new.keys(),
+        changed={k for k in common if _entry_changed(old[k], new[k], cls)},
+        reordered=[k for k in old if k in common] != [k for k in new if k in common],
+    )
+
+
+def _entry_changed(old, new, cls):
+    if getattr(old, "loaded", True):
+        # Loads `new` if it is lazy: one file for each entry in use.
+        return dict(old) != dict(new)
+    # Only the index of `old` was ever read, and so shown; the rest of
+    # the entry is read from its file (as `new` has it) when it's used.
+    return _index_entry(old, cls) != _index_entry(new, cls)
+
+
+def merge(base, local, saved):
+    """Three-way merge of a config edited locally with the file as saved
+    by others meanwhile.
+
+    `base` is the config the local edits started from, `local` the config
+    with those edits, and `saved` the file's current content. A setting,
+    system (by name) or function (by id) that was changed, added or
+    removed locally takes the local version; anything not touched locally
+    takes the saved version, so other writers' edits survive. A system or
+    function changed on both sides is merged the same way field by field,
+    the local version winning where both changed a field. Entries keep
+    the saved order, with local additions placed before the entry that
+    follows them locally (at the end if none does). Settings only the saved
+    file knows (from a newer release) are kept; a setting removed locally
+    is dropped unless the file changed it meanwhile.
+    """
+    merged = {}
+    # The local key order, then any keys only the file has.
+    for key in [*local, *(k for k in saved if k not in local)]:
+        if key not in local and key in base and saved[key] == base[key]:
+            continue  # removed locally (a retired setting) and not edited since
+        if key == "systems":
+            merged[key] = _merge_list(
+                base.get(key, []), local.get(key, []), saved.get(key, []), "name"
+            )
+        elif key == "functions":
+            merged[key] = _merge_list(
+                base.get(key, []), local.get(key, []), saved.get(key, []), "id"
+            )
+        elif key not in saved or (key in local and local[key] != base.get(key)):
+            merged[key] = local[key]
+        else:
+            merged[key] = saved[key]
+    return merged
+
+
+def _merge_list(base_items, local_items, saved_items, key):
+    def index(items):
+        found = {}
+        for item in items:
+            found.setdefault(item.get(key), item)
+        return found
+
+    base, local, saved = index(base_items), index(local_items), index(saved_items)
+
+    def pick(k):
+        if k in local:
+            if k in base and dict(local[k]) == dict(base[k]):
+                return saved.get(k)  # untouched here: theirs, even if deleted
+            if k in base and k in saved:
+                return merge(base[k], local[k], saved[k])
+            return local[k]
+        if k in base:
+            return None  # deleted here
+        return saved.get(k)
+
+    result = [(k, pick(k)) for k in saved]
+    result = [(k, item) for k, item in result if item is not None]
+    # Local additions, before the entry that follows them locally (at the
+    # end if none does).
+    present = {k for k, _ in result}
+    following = None
+    for k in reversed(list(local)):
+        if k not in present:
+            item = pick(k)
+            if item is not None:
+                position = next(
+                    (i for i, (other, _) in enumerate(result) if other == following), len(result)
+                )
+                result.insert(position, (k, item))
+                present.add(k)
+        if k in present:
+            following = k
+    return [item for _, item in result]
+
+
 def get_default_icon(function_id):
     """Return the default icon_path for a built-in function, or empty string."""
     for fn in DEFAULT_FUNCTIONS:
@@ -218,3 +1167,60 @@ def system_has_required_fields(system, function):
         if not fields.get(field_name):
             return False
     return True
+
+
+def check_templates(config):
+    """Compile every command template and report the ones that can't be
+    parsed.
+
+    Returns {key: message}, keyed by function id (for its launch_cmd) or
+    "logon_cmd". Which placeholders a template may use depends on the
+    system it is launched for; see `template_problem`. Functions in
+    config.d that haven't been read yet are left to `template_problem`
+    too, rather than reading every file.
+    """
+    problems = {}
+    for fn in config["functions"]:
+        if not getattr(fn, "loaded", True):
+            continue
+        problem = _parse_problem(fn.get("launch_cmd", ""))
+        if problem:
+            problems[fn["id"]] = f"{fn.get('label', fn['id'])}: {problem}"
+    problem = _parse_problem(config.get("logon_cmd", ""))
+    if problem:
+        problems["logon_cmd"] = f"Logon command: {problem}"
+    return problems
+
+
+def template_problem(config, system, fn=None):
+    """Why `fn` (or, if None, the logon) can't be run for `system` with the
+    configured templates, or None.
+
+    A template may use the base placeholders and any custom field defined
+    on the system. The logon_cmd is checked too if `fn` requires a logon.
+    """
+    available = templates.BASE_PLACEHOLDERS | set(system.get("fields", {}))
+    checks = []
+    if fn is not None:
+        checks.append((fn.get("label", fn["id"]), fn.get("launch_cmd", "")))
+    if fn is None or fn.get("requires_logon", False):
+        checks.append(("Logon command", config.get("logon_cmd", "")))
+    for what, source in checks:
+        try:
+            unknown = templates.compile(source).unknown_fields(available)
+        except templates.TemplateError as e:
+            return f"{what}: {e}"
+        if unknown:
+            return (
+                f"{what}: system '{system['name']}' has no field "
+                + ", ".join("{" + f + "}" for f in unknown)
+            )
+    return None
+
+
+def _parse_problem(source):
+    try:
+        templates.compile(source)
+    except templates.TemplateError as e:
+        return str(e)
+    return None
@@ -0,0 +1,93 @@
+"""Fetch the shared configuration from an HTTP(S) URL.
+
+When config.json sets `config_url`, the systems, functions and shared
+settings come from that URL rather than from a (symlinked) file. The
+document is cached locally together with its `ETag` and `Last-Modified`
+validators, so loading the config never waits on the network, and a
+revalidation is a conditional GET: while the document is unchanged the
+server answers `304 Not Modified` with no body, which lets thousands of
+desktops poll it cheaply.
+
+This module knows nothing about the config's layout; config.py decides
+where the cache lives and how the document is overlaid with local
+settings.
+"""
+import contextlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+
+from acs_launcher import __version__
+
+
+def read_cache(cache_file, url):
+    """The cached document for `url`, or None if none is cached."""
+    cached = _read(cache_file)
+    if cached is None or cached.get("url") != url:
+        return None
+    return cached["config"]
+
+
+def fetch(url, cache_file, timeout):
+    """Revalidate the document at `url` against the cache, and store it if
+    it changed. Returns True if the cached document changed.
+
+    Raises OSError (including urllib's URLError) if the server can't be
+    reached or answers with an error, and ValueError if it doesn't send a
+    JSON object.
+    """
+    cached = _read(cache_file)
+    if cached is not None and cached.get("url") != url:
+        cached = None  # validators for another URL mean nothing here
+    headers = {"Accept": "application/json", "User-Agent": f"rm-acs-launcher/{__version__}"}
+    if cached is not None:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and cached is not None:
+            return False
+        raise
+    document = json.loads(body)
+    if not isinstance(document, dict):
+        raise ValueError(f"{url} did not return a JSON object")
+    changed = cached is None or cached["config"] != document
+    if changed or (etag, last_modified) != (cached.get("etag"), cached.get("last_modified")):
+        _write(cache_file, {
+            "url": url, "etag": etag, "last_modified": last_modified, "config": document,
+        })
+    return changed
+
+
+def _read(cache_file):
+    try:
+        with open(cache_file, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or not isinstance(cached.get("config"), dict):
+        return None
+    return cached
+
+
+def _write(cache_file, cached):
+    directory = os.path.dirname(cache_file)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(cache_file) + ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp, cache_file)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
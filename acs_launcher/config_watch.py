@@ -0,0 +1,229 @@
+"""Notice when config.json changes under a running launcher.
+
+config.json may be a symlink to a central file edited from other machines.
+The watcher monitors both the link and the file it points at (re-resolving
+the link if it is retargeted) with Gio file monitors, and since change
+notifications don't arrive for edits made on another NFS client, it also
+polls the file's stat every few seconds. Events are debounced, and the
+callback only runs when the file's content hash actually changed; our own
+saves of an unchanged config, a `touch` or a rewrite with identical content
+are ignored.
+
+The stat, the hash and reading the changed config all happen on a worker
+thread, since on a slow NFS mount any of them can take seconds; only the
+callback runs on the main loop, with the config already loaded.
+
+With a `config_url`, the document at the URL is revalidated on a worker
+thread at startup and then every few minutes; a new version lands in the
+local cache file, which counts as part of the config's content here.
+So do the files in config.d, for the sharded layout.
+"""
+import hashlib
+import os
+import threading
+
+import gi
+
+gi.require_version("Gio", "2.0")
+from gi.repository import Gio, GLib
+
+from acs_launcher import config, logging_setup
+
+# Seconds between stat polls, for changes no monitor reports.
+POLL_INTERVAL = 5
+
+# Seconds between conditional GETs of the `config_url` document.
+REMOTE_POLL_INTERVAL = 5 * 60
+
+# Milliseconds to let a burst of events (write, chmod, rename) settle.
+_SETTLE_MS = 300
+
+
+_FILES = ("CONFIG_FILE", "REMOTE_CACHE_FILE")
+
+
+def _content_hash():
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(config.CONFIG_FILE, "rb") as f:
+            digest.update(f.read())
+    except OSError:
+        return None
+    try:
+        with open(config.REMOTE_CACHE_FILE, "rb") as f:
+            digest.update(f.read())
+    except OSError:
+        pass
+    # A shard's stat stands in for its content: reading hundreds of them
+    # every few seconds would cost more than an occasional needless reload.
+    digest.update(repr(config.shards_signature()).encode())
+    return digest.digest()
+
+
+def _stat_key():
+    keys = []
+    for name in _FILES:
+        try:
+            st = os.stat(getattr(config, name))
+        except OSError:
+            keys.append(None)
+        else:
+            keys.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns))
+    if keys[0] is None:
+        return None
+    return (*keys, config.shards_signature())
+
+
+class ConfigWatcher:
+    """Calls `on_change(new_config)` when config.json's content changes,
+    with the config as `config.load_config` now returns it.
+
+    `on_change` returns True once it has dealt with the change. If it
+    returns False (it can't reload right now), the change stays pending
+    and is offered again on the next event or poll.
+
+    With `current` False the caller's config may be older than the file
+    (it was started from the local copy, see config.load_cached), so the
+    file is offered as changed straight away.
+    """
+
+    def __init__(self, on_change, current=True):
+        self._on_change = on_change
+        self._hash = None
+        self._stat = None
+        self._pending = False  # a change the callback couldn't take yet
+        self._target = None
+        self._monitors = []
+        self._settle_source = None
+        self._remote_busy = False  # a conditional GET is in flight
+        self._check_busy = False  # a check is running on its worker thread
+        self._check_again = False  # and a full one was asked for meanwhile
+        self._watch()
+        self._poll_source = GLib.timeout_add_seconds(POLL_INTERVAL, self._poll)
+        self._remote_source = GLib.timeout_add_seconds(REMOTE_POLL_INTERVAL, self._poll_remote)
+        self._poll_remote()
+        if current:
+            # Note what the caller's config was loaded from, offering
+            # nothing; a change made meanwhile is caught by the next check.
+            self._start_check(full=True, offer=False)
+        else:
+            self.check_soon()
+
+    def stop(self):
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._monitors = []
+        for source in (self._poll_source, self._settle_source, self._remote_source):
+            if source is not None:
+                GLib.source_remove(source)
+        self._poll_source = self._settle_source = self._remote_source = None
+
+    def _watch(self):
+        """(Re)create the monitors for the link and its current target."""
+        for monitor in self._monitors:
+            monitor.cancel()
+        self._target = os.path.realpath(config.CONFIG_FILE)
+        paths = {config.CONFIG_FILE, self._target}
+        self._monitors = []
+        for path in paths:
+            try:
+                monitor = Gio.File.new_for_path(path).monitor_file(
+                    Gio.FileMonitorFlags.WATCH_MOVES, None
+                )
+            except GLib.Error as e:
+                logging_setup.get_logger().warning("config: can't monitor %s: %s", path, e.message)
+                continue
+            monitor.connect("changed", self._on_event)
+            self._monitors.append(monitor)
+
+    def _on_event(self, monitor, file, other_file, event_type):
+        self.check_soon()
+
+    def _poll(self):
+        # Hashed (and offered) only if the stat moved, or a change is pending.
+        self._start_check(full=self._pending)
+        return GLib.SOURCE_CONTINUE
+
+    def _poll_remote(self):
+        if not self._remote_busy:
+            self._remote_busy = True
+            threading.Thread(target=self._revalidate, name="config-url-poll", daemon=True).start()
+        return GLib.SOURCE_CONTINUE
+
+    def _revalidate(self):
+        # On the worker thread.
+        try:
+            changed = config.poll_remote()
+        except (ValueError, OSError) as e:
+            logging_setup.get_logger().warning("config: can't revalidate config_url: %s", e)
+            changed = False
+        GLib.idle_add(self._remote_polled, changed)
+
+    def _remote_polled(self, changed):
+        self._remote_busy = False
+        if changed and self._poll_source is not None:
+            self.check_soon()
+        return GLib.SOURCE_REMOVE
+
+    def check_soon(self):
+        """Check for a change once things have been quiet for a moment."""
+        if self._settle_source is not None:
+            GLib.source_remove(self._settle_source)
+        self._settle_source = GLib.timeout_add(_SETTLE_MS, self._settled)
+
+    def _settled(self):
+        self._settle_source = None
+        self.check()
+        return GLib.SOURCE_REMOVE
+
+    def check(self):
+        """Offer the change to the callback, if the content changed, once
+        the worker thread has looked."""
+        self._start_check(full=True)
+
+    def _start_check(self, full, offer=True):
+        if self._check_busy:
+            # A poll can wait for the next one; an event's check can't.
+            self._check_again = self._check_again or full
+            return
+        self._check_busy = True
+        threading.Thread(
+            target=self._examine, args=(self._stat, self._hash, full, offer),
+            name="config-watch", daemon=True,
+        ).start()
+
+    def _examine(self, known_stat, known_hash, full, offer):
+        # On the worker thread: all the file system access of a check.
+        target = os.path.realpath(config.CONFIG_FILE)
+        stat = _stat_key()
+        content_hash = new_config = None
+        looked = full or stat != known_stat
+        if looked:
+            # Hashed before loading: a write in between then shows up as a
+            # further change, rather than being missed.
+            content_hash = _content_hash()
+            if offer and content_hash != known_hash:
+                new_config = config.load_config()
+        GLib.idle_add(self._examined, target, stat, looked, content_hash, new_config)
+
+    def _examined(self, target, stat, looked, content_hash, new_config):
+        self._check_busy = False
+        if self._poll_source is None:  # stopped
+            return GLib.SOURCE_REMOVE
+        if target != self._target:
+            self._watch()
+        if looked:
+            if new_config is None:
+                # Unchanged (or the initial look).
+                self._hash = content_hash
+                self._stat = stat
+                self._pending = False
+            else:
+                self._pending = not self._on_change(new_config)
+                if not self._pending:
+                    self._hash = content_hash
+                    self._stat = stat
+        if self._check_again:
+            self._check_again = False
+            self._start_check(full=True)
+        return GLib.SOURCE_REMOVE
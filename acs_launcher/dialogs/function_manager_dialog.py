@@ -95,6 +95,7 @@ class FunctionManagerDialog(Gtk.Dialog):
         if response == Gtk.ResponseType.OK:
             dialog.apply(fn)
             self.cfg["functions"].append(fn)
+            self.cfg.reindex()
             self._refresh_list()
         dialog.destroy()
 
@@ -107,6 +108,7 @@ class FunctionManagerDialog(Gtk.Dialog):
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             dialog.apply(fn)
+            self.cfg.reindex()  # the id may have changed
             self._refresh_list()
         dialog.destroy()
 
@@ -126,6 +128,7 @@ class FunctionManagerDialog(Gtk.Dialog):
         dialog.destroy()
         if response == Gtk.ResponseType.YES:
             self.cfg["functions"].pop(idx)
+            self.cfg.reindex()
             self._refresh_list()
 
 
@@ -6,7 +6,7 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
 
-from acs_launcher import logging_setup
+from acs_launcher import autostart, config, logging_setup
 
 
 class PreferencesDialog(Gtk.Dialog):
@@ -94,6 +94,10 @@ class PreferencesDialog(Gtk.Dialog):
         self.logon_entry = Gtk.Entry()
         self.logon_entry.set_text(cfg.get("logon_cmd", ""))
         self.logon_entry.set_hexpand(True)
+        if not config.is_local(cfg, "logon_cmd"):
+            # Saves only keep the per-machine settings of a config_url.
+            self.logon_entry.set_sensitive(False)
+            self.logon_entry.set_tooltip_text(f"Managed centrally at {cfg['config_url']}")
         grid.attach(self.logon_entry, 1, 4, 1, 1)
 
         # Diagnostic logging
@@ -110,6 +114,17 @@ class PreferencesDialog(Gtk.Dialog):
         log_box.pack_start(view_log_btn, False, False, 0)
         grid.attach(log_box, 1, 5, 1, 1)
 
+        # Resident mode
+        grid.attach(
+            Gtk.Label(label="Startup:", halign=Gtk.Align.END), 0, 6, 1, 1
+        )
+        self.autostart_check = Gtk.CheckButton(label="Start hidden at login")
+        self.autostart_check.set_tooltip_text(
+            "Start in the background when you log in, so the window opens instantly"
+        )
+        self.autostart_check.set_active(autostart.is_enabled())
+        grid.attach(self.autostart_check, 1, 6, 1, 1)
+
         self.show_all()
 
     def _on_view_log(self, button):
@@ -193,5 +208,11 @@ class PreferencesDialog(Gtk.Dialog):
         self.cfg["acs_jar_path"] = self.jar_entry.get_text().strip()
         self.cfg["java_path"] = self.java_entry.get_text().strip()
         self.cfg["java_opts"] = self.opts_entry.get_text().strip()
-        self.cfg["logon_cmd"] = self.logon_entry.get_text().strip()
+        if config.is_local(self.cfg, "logon_cmd"):
+            self.cfg["logon_cmd"] = self.logon_entry.get_text().strip()
         self.cfg["enable_logging"] = self.log_check.get_active()
+        if self.autostart_check.get_active() != autostart.is_enabled():
+            try:
+                autostart.set_enabled(self.autostart_check.get_active())
+            except OSError:
+                logging_setup.get_logger().exception("preferences: autostart update failed")
@@ -87,6 +87,7 @@ class SystemManagerDialog(Gtk.Dialog):
         if response == Gtk.ResponseType.OK:
             dialog.apply(system)
             self.cfg["systems"].append(system)
+            self.cfg.reindex()
             self._refresh_list()
         dialog.destroy()
 
@@ -99,6 +100,7 @@ class SystemManagerDialog(Gtk.Dialog):
         response = dialog.run()
         if response == Gtk.ResponseType.OK:
             dialog.apply(system)
+            self.cfg.reindex()  # the name may have changed
             self._refresh_list()
         dialog.destroy()
 
@@ -118,6 +120,7 @@ class SystemManagerDialog(Gtk.Dialog):
         dialog.destroy()
         if response == Gtk.ResponseType.YES:
             self.cfg["systems"].pop(idx)
+            self.cfg.reindex()
             self._refresh_list()
 
 
@@ -1,11 +1,12 @@
+import codecs
+import concurrent.futures
 import os
 import pty
-import select
+import re
 import shlex
 import subprocess
-import tempfile
 import termios
-import time
+import threading
 
 from acs_launcher import logging_setup
 
@@ -16,6 +17,50 @@ log = logging_setup.get_logger()
 # that actually affect ACS/Java behaviour.
 _LOGGED_ENV_KEYS = ("JAVA_TOOL_OPTIONS", "LANG", "LC_ALL", "DISPLAY")
 
+# Message returned by run_logon when the caller's `cancel` event fired.
+LOGON_CANCELLED = "Logon cancelled"
+
+# Printed by ACS once the logon has been accepted and the credentials stored.
+_SUCCESS_MARKER = b"completed successfully"
+
+# How long a background reaper lets a logon JVM take to exit after it has
+# reported success before killing it.
+_REAP_TIMEOUT = 60
+
+# An IBM i / ACS message id (e.g. CPF22E2, MSG0001) in a logon failure.
+_MESSAGE_ID = re.compile(r"\b(?:MSG|CPF)[0-9A-F]{4}\b")
+
+
+class CancelEvent(threading.Event):
+    """A threading.Event for `run_logon`'s `cancel` that also runs
+    callbacks when set, so the call it cancels stops at once rather than
+    at its next look at the flag."""
+
+    def __init__(self):
+        super().__init__()
+        self._callbacks = []
+        self._callbacks_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+        with self._callbacks_lock:
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback):
+        """Call `callback()` when the event is set (now, if it is)."""
+        with self._callbacks_lock:
+            if not self.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._callbacks_lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
 
 def _english_env():
     """Subprocess env that forces ACS prompts and message text into English.
@@ -65,94 +110,75 @@ def build_placeholders(config, system, user, password):
 def substitute(cmd_template, placeholders):
     """Replace {placeholder} tokens in a command string.
 
-    Returns the substituted command string.
+    Returns the substituted command string. Commands that are about to be
+    run should go through templates.compile(...).argv() instead, which
+    keeps each placeholder value a single argument.
     Raises KeyError if a placeholder is referenced but not available.
     """
     return cmd_template.format(**placeholders)
 
 
-def run_logon(cmd_string, password=None, timeout=30):
+def _argv(cmd):
+    """A command as an argv list: argv lists (from a compiled template)
+    are used as given, strings are split shell-style."""
+    if isinstance(cmd, str):
+        return shlex.split(cmd)
+    return list(cmd)
+
+
+def _display(cmd):
+    """A command as one string, for the log."""
+    return cmd if isinstance(cmd, str) else shlex.join(cmd)
+
+
+def _cmd_key(cmd):
+    """A hashable form of a command, for coalescing identical logons."""
+    return cmd if isinstance(cmd, str) else tuple(cmd)
+
+
+def run_logon(cmd, password=None, timeout=30, cancel=None):
     """Run a logon command (blocking) and return (success, message).
 
+    Concurrent calls for the same command and password are coalesced: the
+    first caller runs the logon and the others wait for, and receive, its
+    result — so a Launch click racing a favourite (or a background
+    pre-logon) never costs a second ACS JVM or a second failed sign-on.
+    The logon child is only killed once every caller waiting on it has
+    been cancelled.
+
+    `cmd` is an argv list (see templates.Template.argv) or, for callers
+    that build their own, a command string to be split shell-style.
+
     If `password` is None (legacy), the command is run with stdin=DEVNULL —
-    the password must already be embedded in `cmd_string` as `/password=...`.
+    the password must already be embedded in `cmd` as `/password=...`.
 
     If `password` is provided, the command is attached to a PTY and the
-    password is fed to the ACS prompt interactively. The cmd_string MUST
+    password is fed to the ACS prompt interactively. The command MUST
     NOT include `/password=...` in this mode (ACS would skip the prompt
     and our driver would hang waiting for a prompt that never arrives).
     The password never appears on the subprocess argv.
+
+    `cancel`, if given, is a CancelEvent (or a plain threading.Event,
+    which is only checked every 0.2 s); setting it stops this call
+    waiting and makes it return (False, LOGON_CANCELLED).
+
+    This is a blocking wrapper around aio.run_logon.
     """
-    if password:
-        logging_setup.add_secret(password)
-    log.info("run_logon: cmd=%s mode=%s", cmd_string, "pty" if password else "argv")
+    from acs_launcher import aio
+
     try:
-        if password is not None:
-            ok, msg = _run_logon_pty(cmd_string, password, timeout)
-            log.info("run_logon: result ok=%s msg=%s", ok, msg)
-            return ok, msg
-
-        try:
-            args = shlex.split(cmd_string)
-            proc = subprocess.Popen(
-                args,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                env=_english_env(),
-            )
-            output_lines = []
-            failed = False
-            succeeded = False
-            try:
-                while True:
-                    line = proc.stdout.readline()
-                    if not line:
-                        break
-                    line = line.strip()
-                    if line:
-                        output_lines.append(line)
-                    if "Login failed" in line or "Signon to" in line:
-                        failed = True
-                        break
-                    if "completed successfully" in line:
-                        succeeded = True
-                        break
-            except Exception:
-                pass
-
-            if failed:
-                proc.kill()
-                proc.wait()
-                errors = [l for l in output_lines if l.startswith("MSG") or l.startswith("CPF")]
-                detail = "; ".join(errors) if errors else "; ".join(output_lines[:3])
-                log.info("run_logon: failed detail=%s", detail)
-                return False, f"Logon failed: {detail}"
-
-            if succeeded:
-                proc.wait(timeout=5)
-                log.info("run_logon: succeeded")
-                return True, "Logon successful"
-
-            proc.wait(timeout=timeout)
-            if proc.returncode == 0:
-                log.info("run_logon: succeeded (rc=0, no completion line)")
-                return True, "Logon successful"
-            detail = "; ".join(output_lines[:3]) if output_lines else "no output"
-            log.info("run_logon: failed rc=%d detail=%s", proc.returncode, detail)
-            return False, f"Logon failed (rc={proc.returncode}): {detail}"
-
-        except subprocess.TimeoutExpired:
-            proc.kill()
-            proc.wait()
-            log.info("run_logon: timed out")
-            return False, "Logon timed out"
-        except Exception as e:
-            log.exception("run_logon: unexpected error")
-            return False, f"Logon error: {e}"
-    finally:
-        logging_setup.clear_secrets()
+        return aio.run_sync(aio.run_logon(cmd, password, timeout), cancel)
+    except concurrent.futures.CancelledError:
+        return False, LOGON_CANCELLED
+
+
+def is_credential_failure(message):
+    """True if a run_logon failure message is the host rejecting the
+    sign-on (a MSG/CPF message or ACS's "Login failed"), as opposed to a
+    timeout, a cancellation or a launcher-side error."""
+    if not message.startswith("Logon failed:"):
+        return False
+    return "Login failed" in message or _MESSAGE_ID.search(message) is not None
 
 
 def _ends_with_prompt(buf):
@@ -174,30 +200,161 @@ def _ends_with_prompt(buf):
     return tail.rstrip(b" \t").endswith(b":")
 
 
-def _drain_master(master_fd, output, max_secs):
-    """Read any remaining bytes from `master_fd` for up to `max_secs`."""
-    deadline = time.monotonic() + max_secs
-    while time.monotonic() < deadline:
-        r, _, _ = select.select([master_fd], [], [], 0.1)
-        if master_fd not in r:
-            break
-        try:
-            chunk = os.read(master_fd, 4096)
-        except OSError:
-            break
-        if not chunk:
-            break
-        output.extend(chunk)
+class _LogonMatcher:
+    """Incremental scanner for the PTY logon output.
 
+    Each `feed()` looks only at the new chunk (plus a few carried-over bytes
+    so a marker split across two os.read() calls still matches), so the
+    driver loop does constant work per chunk no matter how much ACS has
+    printed so far. After a feed:
 
-def _evaluate_logon_output(text, returncode):
-    """Decide success/failure from the captured output and exit code."""
+    - `at_prompt`: the output currently ends with a prompt (see
+      _ends_with_prompt); cleared again as soon as more text follows it
+    - `password_prompt`: "Password" has appeared somewhere in the output
+    - `succeeded` / `failed`: the success marker / "Login failed" has
+      appeared somewhere in the output
+    """
+
+    _PASSWORD = b"Password"
+    _FAILED = b"Login failed"
+    _CARRY = max(len(_PASSWORD), len(_FAILED), len(_SUCCESS_MARKER)) - 1
+
+    def __init__(self):
+        self.at_prompt = False
+        self.password_prompt = False
+        self.succeeded = False
+        self.failed = False
+        self._carry = b""
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        window = self._carry + bytes(chunk)
+        if not self.password_prompt and self._PASSWORD in window:
+            self.password_prompt = True
+        if not self.failed and self._FAILED in window:
+            self.failed = True
+        if not self.succeeded and _SUCCESS_MARKER in window:
+            self.succeeded = True
+        self._carry = window[-self._CARRY:]
+
+        # Only the text after the last newline can end in a prompt. A
+        # chunk that adds nothing but blanks to the current line leaves
+        # the previous verdict standing (the colon may have arrived in an
+        # earlier chunk than its trailing space).
+        nl = chunk.rfind(b"\n")
+        line = chunk[nl + 1:] if nl >= 0 else chunk
+        if line.strip(b" \t"):
+            self.at_prompt = _ends_with_prompt(line)
+        elif nl >= 0:
+            self.at_prompt = False
+
+
+class _LogonCapture:
+    """Bounded record of a logon's output.
+
+    A JVM that loops on a prompt or dumps stack traces can print without
+    limit for the whole logon timeout, so rather than keeping everything we
+    keep the first `head_size` bytes (banner, first errors), a ring of the
+    last `tail_size` bytes, and every MSG/CPF line seen anywhere — which is
+    all _evaluate_logon_output needs. The MSG/CPF lines are picked out as
+    the bytes arrive, through an incremental UTF-8 decoder, so a line in
+    the discarded middle still makes it into the failure message.
+    """
+
+    _LINE_MAX = 512  # longer lines are truncated before being kept
+
+    def __init__(self, head_size=4096, tail_size=16384, max_failure_lines=20):
+        self._head = bytearray()
+        self._head_size = head_size
+        self._ring = bytearray(tail_size)
+        self._ring_pos = 0
+        self._ring_len = 0
+        self._total = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._line = ""
+        self._max_failure_lines = max_failure_lines
+        self.failure_lines = []
+
+    def extend(self, chunk):
+        chunk = bytes(chunk)
+        self._total += len(chunk)
+        if len(self._head) < self._head_size:
+            self._head.extend(chunk[:self._head_size - len(self._head)])
+        self._ring_write(chunk)
+        self._scan_lines(self._decoder.decode(chunk))
+
+    def _ring_write(self, data):
+        size = len(self._ring)
+        if len(data) >= size:
+            self._ring[:] = data[-size:]
+            self._ring_pos = 0
+            self._ring_len = size
+            return
+        end = self._ring_pos + len(data)
+        if end <= size:
+            self._ring[self._ring_pos:end] = data
+        else:
+            first = size - self._ring_pos
+            self._ring[self._ring_pos:] = data[:first]
+            self._ring[:len(data) - first] = data[first:]
+        self._ring_pos = end % size
+        self._ring_len = min(size, self._ring_len + len(data))
+
+    def _scan_lines(self, text):
+        # Treat CR like LF, as str.splitlines() does for the full text.
+        parts = text.replace("\r", "\n").split("\n")
+        for part in parts[:-1]:
+            self._check_line((self._line + part)[:self._LINE_MAX])
+            self._line = ""
+        if len(self._line) < self._LINE_MAX:
+            self._line = (self._line + parts[-1])[:self._LINE_MAX]
+
+    def _check_line(self, line):
+        line = line.strip()
+        if (line.startswith("MSG") or line.startswith("CPF")) and \
+                len(self.failure_lines) < self._max_failure_lines:
+            self.failure_lines.append(line)
+
+    def _tail(self):
+        if self._ring_len < len(self._ring):
+            return bytes(self._ring[:self._ring_len])
+        return bytes(self._ring[self._ring_pos:] + self._ring[:self._ring_pos])
+
+    def text(self):
+        """Decoded head + tail, with a marker where bytes were dropped."""
+        tail = self._tail()
+        tail_start = self._total - len(tail)
+        if tail_start <= len(self._head):
+            data = bytes(self._head) + tail[len(self._head) - tail_start:]
+        else:
+            data = bytes(self._head) + b"\n[...]\n" + tail
+        return data.decode("utf-8", errors="replace")
+
+    def all_failure_lines(self):
+        """MSG/CPF lines, including a final line with no trailing newline."""
+        lines = list(self.failure_lines)
+        line = self._line.strip()
+        if (line.startswith("MSG") or line.startswith("CPF")) and \
+                len(lines) < self._max_failure_lines:
+            lines.append(line)
+        return lines
+
+
+def _evaluate_logon_output(text, returncode, failure_lines=None):
+    """Decide success/failure from the captured output and exit code.
+
+    `failure_lines`, if given, are the MSG/CPF lines already extracted
+    while capturing (see _LogonCapture); otherwise they're parsed from
+    `text`.
+    """
     if "completed successfully" in text:
         return True, "Logon successful"
-    failure_lines = [
-        s for s in (l.strip() for l in text.splitlines())
-        if s.startswith("MSG") or s.startswith("CPF")
-    ]
+    if failure_lines is None:
+        failure_lines = [
+            s for s in (l.strip() for l in text.splitlines())
+            if s.startswith("MSG") or s.startswith("CPF")
+        ]
     if failure_lines:
         return False, f"Logon failed: {'; '.join(failure_lines)}"
     if returncode == 0:
@@ -207,15 +364,71 @@ def _evaluate_logon_output(text, returncode):
     return False, f"Logon failed (rc={returncode}): {detail}"
 
 
-def _run_logon_pty(cmd_string, password, timeout):
-    """Drive `acslaunch /plugin=logon` over a PTY, feeding the password
-    to the prompt instead of placing it on the command line."""
-    args = shlex.split(cmd_string)
+class _LogonDriver:
+    """Answers the ACS logon prompts, independent of how the PTY is read.
+
+    Transports (the asyncio reader in aio, the GLib engine in logon_engine)
+    pass each chunk read from the PTY master to `feed()` and write back
+    whatever it returns. Once `finished` is set the transport stops reading
+    and asks `result()` for the (success, message) outcome.
+    """
+
+    def __init__(self, password):
+        self._password = password
+        self.output = _LogonCapture()
+        self._matcher = _LogonMatcher()
+        self._user_sent = False
+        self._pwd_sent = False
+
+    @property
+    def succeeded(self):
+        return self._matcher.succeeded
+
+    @property
+    def finished(self):
+        # Early-break on a clear failure: ACS retries the prompt after a
+        # bad password, so without this we'd idle until the full timeout
+        # instead of returning the actual error.
+        return self._matcher.succeeded or (self._pwd_sent and self._matcher.failed)
+
+    def feed(self, chunk):
+        """Consume a chunk of output; return the bytes to write back."""
+        self.output.extend(chunk)
+        self._matcher.feed(chunk)
+        # Return as soon as ACS reports success rather than waiting for its
+        # JVM to shut down.
+        if self._matcher.succeeded:
+            return b""
+        # Drive the prompts by content, not by "a new prompt appeared".
+        # ACS can emit "User (richardm): Password: " coalesced into one
+        # os.read() chunk; a positional check ("output grew since the
+        # username prompt") would then never fire the password branch,
+        # because ACS is already blocked waiting for the password and
+        # emits nothing more — the loop would idle to its timeout (rc=-9).
+        # The password prompt is unambiguous (it contains "Password"),
+        # so send the password as soon as we see it.
+        if not self._pwd_sent and self._matcher.at_prompt and self._matcher.password_prompt:
+            # If the username prompt was coalesced with the password prompt
+            # (or already satisfied by /userid=), just answer the password.
+            self._user_sent = True
+            self._pwd_sent = True
+            return self._password.encode("utf-8") + b"\n"
+        if not self._user_sent and self._matcher.at_prompt:
+            self._user_sent = True
+            return b"\n"
+        return b""
+
+    def result(self, returncode):
+        if self.succeeded:
+            return True, "Logon successful"
+        return _evaluate_logon_output(
+            self.output.text(), returncode, self.output.all_failure_lines()
+        )
+
+
+def _open_logon_pty():
+    """Open a PTY for a logon child; return (master_fd, slave_fd)."""
     master_fd, slave_fd = pty.openpty()
-    proc = None
-    output = bytearray()
-    user_sent = False
-    pwd_sent = False
     try:
         # Pre-disable echo so the password doesn't echo back into our buffer
         # and to avoid a race with Java's Console.readPassword disabling echo
@@ -223,7 +436,18 @@ def _run_logon_pty(cmd_string, password, timeout):
         attrs = termios.tcgetattr(slave_fd)
         attrs[3] &= ~termios.ECHO
         termios.tcsetattr(slave_fd, termios.TCSANOW, attrs)
+    except BaseException:
+        os.close(master_fd)
+        os.close(slave_fd)
+        raise
+    return master_fd, slave_fd
+
 
+def _spawn_logon_pty(cmd):
+    """Start a logon command on a fresh PTY; return (proc, master_fd)."""
+    args = _argv(cmd)
+    master_fd, slave_fd = _open_logon_pty()
+    try:
         proc = subprocess.Popen(
             args,
             stdin=slave_fd,
@@ -232,70 +456,22 @@ def _run_logon_pty(cmd_string, password, timeout):
             close_fds=True,
             env=_english_env(),
         )
-        os.close(slave_fd)
-        slave_fd = -1
-
-        deadline = time.monotonic() + timeout
-        while True:
-            remaining = deadline - time.monotonic()
-            if remaining <= 0:
-                break
-            r, _, _ = select.select([master_fd], [], [], min(remaining, 0.2))
-            if master_fd in r:
-                try:
-                    chunk = os.read(master_fd, 4096)
-                except OSError:
-                    chunk = b""
-                if not chunk:
-                    break
-                output.extend(chunk)
-                # Drive the prompts by content, not by "a new prompt appeared".
-                # ACS can emit "User (richardm): Password: " coalesced into one
-                # os.read() chunk; a positional check ("output grew since the
-                # username prompt") would then never fire the password branch,
-                # because ACS is already blocked waiting for the password and
-                # emits nothing more — the loop would idle to its timeout (rc=-9).
-                # The password prompt is unambiguous (it contains "Password"),
-                # so send the password as soon as we see it.
-                if not pwd_sent and _ends_with_prompt(output) and b"Password" in output:
-                    if not user_sent:
-                        # Username prompt was coalesced with the password prompt
-                        # (or already satisfied by /userid=); just answer the password.
-                        user_sent = True
-                    os.write(master_fd, password.encode("utf-8") + b"\n")
-                    pwd_sent = True
-                elif not user_sent and _ends_with_prompt(output):
-                    os.write(master_fd, b"\n")
-                    user_sent = True
-                # Early-break on a clear failure: ACS retries the prompt
-                # after a bad password, so without this we'd idle until the
-                # full timeout instead of returning the actual error.
-                if pwd_sent and b"Login failed" in output:
-                    break
-            if proc.poll() is not None:
-                _drain_master(master_fd, output, max_secs=0.5)
-                break
+    except BaseException:
+        os.close(master_fd)
+        raise
     finally:
-        if proc is not None and proc.poll() is None:
-            proc.kill()
-        try:
-            os.close(master_fd)
-        except OSError:
-            pass
-        if slave_fd >= 0:
-            try:
-                os.close(slave_fd)
-            except OSError:
-                pass
-        if proc is not None:
-            try:
-                proc.wait(timeout=5)
-            except subprocess.TimeoutExpired:
-                pass
-
-    text = output.decode("utf-8", errors="replace")
-    rc = proc.returncode if proc is not None else -1
-    return _evaluate_logon_output(text, rc)
+        os.close(slave_fd)
+    return proc, master_fd
+
+
+def _run_logon_pty(cmd, password, timeout, cancel=None):
+    """Blocking wrapper around aio._run_logon_pty (no coalescing)."""
+    from acs_launcher import aio
+
+    try:
+        return aio.run_sync(aio._run_logon_pty(cmd, password, timeout), cancel)
+    except concurrent.futures.CancelledError:
+        return False, LOGON_CANCELLED
 
 
 def _missing_session_files(args):
@@ -313,72 +489,18 @@ def _missing_session_files(args):
     return None
 
 
-def launch(cmd_string, password=None):
+def launch(cmd, password=None):
     """Launch a command (fire-and-forget, detached from this process).
 
     Waits briefly to catch immediate failures (e.g. bad path, missing file).
-    Returns (success, message).
+    Returns (success, message). `cmd` is an argv list or a command string,
+    as for run_logon.
 
     `password`, if given, is registered with the log redactor so any custom
     launch_cmd template that embeds {password} doesn't write it to the log.
+
+    This is a blocking wrapper around aio.launch.
     """
-    if password:
-        logging_setup.add_secret(password)
-    # Use temp files (not PIPEs) so the child can keep writing past the 2s
-    # window without us holding fds it would otherwise block on.
-    out_f = tempfile.TemporaryFile()
-    err_f = tempfile.TemporaryFile()
-    try:
-        args = shlex.split(cmd_string)
-        env = _launch_env()
-        env_summary = {k: env.get(k, "") for k in _LOGGED_ENV_KEYS}
-        log.info("launch: cmd=%s", cmd_string)
-        log.debug("launch: argv=%r env=%r", args, env_summary)
-        # ACS exits quietly (rc=0, no stderr) when handed a .hod session file
-        # that doesn't exist, which our "still running / rc=0" heuristics would
-        # otherwise report as a successful launch. Catch the missing file up
-        # front so the user gets a real error instead of a false success.
-        missing = _missing_session_files(args)
-        if missing:
-            log.warning("launch: session file not found: %s", missing)
-            return False, f"Launch failed: file not found — {missing}"
-        try:
-            proc = subprocess.Popen(
-                args,
-                start_new_session=True,
-                stdout=out_f,
-                stderr=err_f,
-                env=env,
-            )
-        except FileNotFoundError:
-            log.warning("launch: command not found: %s", args[0] if args else "")
-            return False, f"Launch error: command not found — {args[0] if args else ''}"
-
-        try:
-            proc.wait(timeout=2)
-            out_f.seek(0)
-            err_f.seek(0)
-            stdout = out_f.read().decode("utf-8", errors="replace").strip()
-            stderr = err_f.read().decode("utf-8", errors="replace").strip()
-            log.info(
-                "launch: exited within 2s rc=%d stdout_len=%d stderr_len=%d",
-                proc.returncode, len(stdout), len(stderr),
-            )
-            if stdout:
-                log.debug("launch: stdout=%s", stdout)
-            if stderr:
-                log.debug("launch: stderr=%s", stderr)
-            if proc.returncode != 0 and stderr:
-                return False, f"Launch failed (rc={proc.returncode}): {stderr[:200]}"
-            return True, "Launched successfully"
-        except subprocess.TimeoutExpired:
-            log.info("launch: still running after 2s (treating as success)")
-            return True, "Launched successfully"
-    except Exception as e:
-        log.exception("launch: unexpected error")
-        return False, f"Launch error: {e}"
-    finally:
-        # Don't close the temp files if the child is still running — it
-        # still holds them via its inherited fds and will write to them
-        # until it exits. They'll be reclaimed when the child closes them.
-        logging_setup.clear_secrets()
+    from acs_launcher import aio
+
+    return aio.run_sync(aio.launch(cmd, password))
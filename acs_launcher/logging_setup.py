@@ -1,6 +1,8 @@
+import collections
 import logging
 import os
 import re
+import threading
 from logging.handlers import RotatingFileHandler
 
 LOG_DIR = os.path.expanduser("~/.local/state/rm-acs-launcher")
@@ -22,25 +24,40 @@ _FLAG_PATTERNS = [
 
 
 class _SecretRedactingFilter(logging.Filter):
-    """Replace per-launch secrets and password-flag values in every record."""
+    """Replace per-launch secrets and password-flag values in every record.
+
+    Secrets are counted: logons and launches run concurrently, and one
+    finishing must not unmask a password another is still using.
+    """
 
     def __init__(self):
         super().__init__()
-        self._secrets = set()
+        self._secrets = collections.Counter()
+        self._lock = threading.Lock()
 
     def add_secret(self, secret):
         if secret:
-            self._secrets.add(secret)
+            with self._lock:
+                self._secrets[secret] += 1
+
+    def remove_secret(self, secret):
+        if secret:
+            with self._lock:
+                self._secrets[secret] -= 1
+                if self._secrets[secret] <= 0:
+                    del self._secrets[secret]
 
     def clear_secrets(self):
-        self._secrets.clear()
+        with self._lock:
+            self._secrets.clear()
 
     def _scrub(self, text):
         if not isinstance(text, str):
             return text
-        for s in self._secrets:
-            if s:
-                text = text.replace(s, "***")
+        with self._lock:
+            secrets = list(self._secrets)
+        for s in secrets:
+            text = text.replace(s, "***")
         for pat in _FLAG_PATTERNS:
             text = pat.sub(r"\1***", text)
         return text
@@ -66,10 +83,17 @@ def get_logger():
 
 
 def add_secret(secret):
+    """Mask `secret` in the log until a matching remove_secret()."""
     _filter.add_secret(secret)
 
 
+def remove_secret(secret):
+    """Undo one add_secret(secret); pair the two in a try/finally."""
+    _filter.remove_secret(secret)
+
+
 def clear_secrets():
+    """Stop masking every secret, whoever registered it."""
     _filter.clear_secrets()
 
 
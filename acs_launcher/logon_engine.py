@@ -0,0 +1,208 @@
+"""PTY logons driven by the GLib main loop.
+
+launcher.run_logon blocks its caller until the logon is done, so the GUI
+had to spend a thread on every logon. Here the PTY master is watched with
+GLib.io_add_watch and the child with GLib.child_watch_add instead: output
+is handled the moment it arrives, any number of logons can run at once,
+and results are delivered on the main loop. The prompt handling and the
+output evaluation are launcher's (_LogonDriver), so both paths behave the
+same.
+
+Like run_logon, logons for the same command and password are coalesced:
+a second start() joins the one in flight. Each caller gets a Handle and
+may cancel it; the ACS child is only killed once every caller waiting on
+it has cancelled.
+"""
+import os
+
+import gi
+
+gi.require_version("GLib", "2.0")
+from gi.repository import GLib
+
+from acs_launcher import launcher, logging_setup
+
+log = logging_setup.get_logger()
+
+# In-flight logons keyed by (command, password). Only touched from the
+# main loop, so no locking is needed.
+_logons = {}
+
+
+class Handle:
+    """One caller's interest in a logon."""
+
+    def __init__(self, logon, callback):
+        self._logon = logon
+        self._callback = callback
+
+    def cancel(self):
+        """Stop waiting; the callback will not be called."""
+        self._callback = None
+        if self._logon is not None:
+            self._logon.detach(self)
+            self._logon = None
+
+    def _notify(self, ok, msg):
+        if self._callback is not None:
+            callback, self._callback = self._callback, None
+            callback(ok, msg)
+
+
+class _Logon:
+    def __init__(self, key, cmd, password, timeout):
+        self._key = key
+        self._password = password  # masked in the log until _forget()
+        self._waiters = []
+        self._delivered = False
+        self._proc, self._fd = launcher._spawn_logon_pty(cmd)
+        os.set_blocking(self._fd, False)
+        self._driver = launcher._LogonDriver(password)
+        self._io_id = GLib.io_add_watch(
+            self._fd, GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR, self._on_output,
+        )
+        self._child_id = GLib.child_watch_add(
+            GLib.PRIORITY_DEFAULT, self._proc.pid, self._on_exit
+        )
+        self._timeout_id = GLib.timeout_add_seconds(timeout, self._on_timeout)
+
+    def attach(self, callback):
+        handle = Handle(self, callback)
+        self._waiters.append(handle)
+        return handle
+
+    def detach(self, handle):
+        if handle in self._waiters:
+            self._waiters.remove(handle)
+        if not self._waiters and not self._delivered:
+            log.info("logon_engine: cancelled")
+            self._delivered = True
+            self._forget()
+            self._kill()
+
+    def _forget(self):
+        if _logons.get(self._key) is self:
+            del _logons[self._key]
+        if self._password is not None:
+            logging_setup.remove_secret(self._password)
+            self._password = None
+
+    def _kill(self):
+        if self._proc.returncode is None:
+            try:
+                self._proc.kill()
+            except ProcessLookupError:
+                pass
+
+    def _read(self):
+        try:
+            return os.read(self._fd, 4096)
+        except BlockingIOError:
+            return None
+        except OSError:
+            return b""
+
+    def _on_output(self, fd, condition):
+        while True:
+            chunk = self._read()
+            if chunk is None:
+                return GLib.SOURCE_CONTINUE
+            if not chunk:
+                # EOF/EIO: the child closed the PTY; its exit (child watch)
+                # finishes the logon.
+                self._io_id = None
+                return GLib.SOURCE_REMOVE
+            if self._delivered:
+                continue  # just draining until the child exits
+            reply = self._driver.feed(chunk)
+            if reply:
+                os.write(self._fd, reply)
+            if self._driver.succeeded:
+                # Report success now and let the JVM exit in its own time,
+                # keeping the PTY drained meanwhile (see aio._reap).
+                self._deliver(self._driver.result(None))
+                if self._timeout_id is not None:
+                    GLib.source_remove(self._timeout_id)
+                self._timeout_id = GLib.timeout_add_seconds(
+                    launcher._REAP_TIMEOUT, self._on_timeout
+                )
+            elif self._driver.finished:
+                self._kill()
+
+    def _on_timeout(self):
+        self._timeout_id = None
+        if not self._delivered:
+            log.info("logon_engine: timed out")
+        else:
+            log.warning("logon_engine: logon child still running after success, killing")
+        self._kill()
+        return GLib.SOURCE_REMOVE
+
+    def _on_exit(self, pid, status):
+        rc = os.waitstatus_to_exitcode(status)
+        # GLib reaped the child; tell Popen so it doesn't try again.
+        self._proc.returncode = rc
+        if self._io_id is not None:
+            # The exit can be seen before the last of the output (a failure
+            # message printed just before exiting, say): it decides the result.
+            while True:
+                chunk = self._read()
+                if not chunk:
+                    break
+                if not self._delivered:
+                    self._driver.feed(chunk)
+            GLib.source_remove(self._io_id)
+            self._io_id = None
+        if self._timeout_id is not None:
+            GLib.source_remove(self._timeout_id)
+            self._timeout_id = None
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        if not self._delivered:
+            self._deliver(self._driver.result(rc))
+
+    def _deliver(self, result):
+        self._delivered = True
+        self._forget()
+        log.info("logon_engine: result ok=%s msg=%s", *result)
+        waiters, self._waiters = self._waiters, []
+        for handle in waiters:
+            handle._logon = None
+            try:
+                handle._notify(*result)
+            except Exception:
+                log.exception("logon_engine: callback failed")
+
+
+def start(cmd, password, callback, timeout=30):
+    """Start (or join) a PTY logon; `callback(ok, msg)` runs on the main
+    loop when it completes. Returns a Handle that can cancel the wait.
+
+    Must be called from the main loop's thread.
+    """
+    key = (launcher._cmd_key(cmd), password)
+    logon = _logons.get(key)
+    if logon is None:
+        logging_setup.add_secret(password)
+        log.info("logon_engine: cmd=%s", launcher._display(cmd))
+        try:
+            logon = _Logon(key, cmd, password, timeout)
+        except Exception as e:
+            log.exception("logon_engine: failed to start logon")
+            logging_setup.remove_secret(password)
+            handle = Handle(None, callback)
+            msg = f"Logon error: {e}"
+
+            def fail():
+                handle._notify(False, msg)
+                return GLib.SOURCE_REMOVE
+
+            GLib.idle_add(fail)
+            return handle
+        _logons[key] = logon
+    else:
+        log.info("logon_engine: joining in-flight logon cmd=%s", launcher._display(cmd))
+    return logon.attach(callback)
@@ -1,40 +1,186 @@
 #!/usr/bin/env python3
 import os
 import sys
+import threading
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# CLI subcommands run without importing GTK at all.
+if len(sys.argv) > 1 and sys.argv[1] in ("launch", "serve"):
+    from acs_launcher import cli
+
+    sys.exit(cli.main(sys.argv[1:]))
+
+from acs_launcher import profiling
+
+if profiling.requested():
+    profiling.start()
+
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gtk, GdkPixbuf
+from gi.repository import Gio, GLib, Gtk, GdkPixbuf
 
-GLib.set_prgname("com.github.richardm90.rm-acs-launcher")
+profiling.mark("gi imports")
 
-from acs_launcher import __version__, config, logging_setup
-from acs_launcher.window import MainWindow
+GLib.set_prgname("com.github.richardm90.rm-acs-launcher")
 
-logging_setup.configure(config.load_config().get("enable_logging", True))
-logging_setup.get_logger().info("rm-acs-launcher %s starting", __version__)
+from acs_launcher import __version__, cli, config, logging_setup
 
 ICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "rm-acs-launcher.png")
 
 
+def _option(options, name):
+    """A string option from a GLib.VariantDict, or None if not given."""
+    value = options.lookup_value(name, GLib.VariantType.new("s"))
+    return value.get_string() if value is not None else None
+
+
 class ACSLauncherApp(Gtk.Application):
-    def __init__(self):
-        super().__init__(application_id="com.github.richardm90.rm-acs-launcher")
+    """The GUI application.
+
+    The application id makes it unique per session: running
+    `rm-acs-launcher --launch rss@PROD` while an instance is up forwards
+    the command line over D-Bus to that primary instance, which already
+    has the config, keyring and logon cache warm, and launches from there.
+    The same request is exposed as the `app.launch` action, taking
+    (system, user, function) with an empty user meaning "the default".
+
+    Started with --autostart (see autostart.py) the application is
+    resident: it builds the window hidden, warms up the keyring, and from
+    then on closing the window only hides it. Ctrl+Q quits.
+    """
+
+    def __init__(self, cfg, cfg_current=True):
+        super().__init__(
+            application_id="com.github.richardm90.rm-acs-launcher",
+            flags=Gio.ApplicationFlags.HANDLES_COMMAND_LINE,
+        )
+        # Parsed once in main(), and handed to the window when it is built.
+        # Not current if it is the local copy of a central config.json.
+        self._cfg = cfg
+        self._cfg_current = cfg_current
+        self._main_window = None
+        self._resident = False
+        self.add_main_option(
+            "launch", ord("l"), GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            "Launch FUNCTION on SYSTEM (in the running instance, if any)",
+            "FUNCTION@SYSTEM",
+        )
+        self.add_main_option(
+            "user", ord("u"), GLib.OptionFlags.NONE, GLib.OptionArg.STRING,
+            "User for --launch (default: the system's only user, or the last one used)",
+            "USER",
+        )
+        self.add_main_option(
+            "autostart", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            "Start hidden and stay running in the background", None,
+        )
+        self.add_main_option(
+            "version", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            "Show the version and exit", None,
+        )
+        # Acted on in main.py before GTK is imported; declared so GApplication
+        # accepts it and --help lists it.
+        self.add_main_option(
+            "profile-startup", 0, GLib.OptionFlags.NONE, GLib.OptionArg.NONE,
+            "Write a startup timing report to the state directory", None,
+        )
+
+    def do_startup(self):
+        Gtk.Application.do_startup(self)
+        action = Gio.SimpleAction.new("launch", GLib.VariantType.new("(sss)"))
+        action.connect("activate", self._on_launch_action)
+        self.add_action(action)
+        action = Gio.SimpleAction.new("quit", None)
+        action.connect("activate", lambda action, parameter: self.quit())
+        self.add_action(action)
+        self.set_accels_for_action("app.quit", ["<Primary>q"])
+
+    def do_handle_local_options(self, options):
+        if options.contains("version"):
+            print(f"rm-acs-launcher {__version__}")
+            return 0
+        # Reject a malformed target here, before contacting the primary.
+        target = _option(options, "launch")
+        if target is not None:
+            try:
+                cli.parse_target(target)
+            except cli.CLIError as e:
+                print(f"rm-acs-launcher: {e}", file=sys.stderr)
+                return 2
+        return -1
+
+    def do_command_line(self, command_line):
+        options = command_line.get_options_dict()
+        if options.contains("autostart"):
+            self._become_resident()
+            return 0
+        target = _option(options, "launch")
+        if target is None:
+            self.activate()
+            return 0
+        fn_id, system_name = cli.parse_target(target)
+        win = self._window()
+        if not self._resident:
+            win.present()
+        error = win.launch_request(system_name, _option(options, "user") or "", fn_id)
+        if error:
+            command_line.printerr(f"rm-acs-launcher: {error}\n")
+            return 1
+        return 0
 
     def do_activate(self):
-        win = self.get_active_window()
-        if not win:
-            win = MainWindow(application=self)
+        self._window().present()
+
+    def _window(self):
+        """The main window, built (but not shown) on first use."""
+        if self._main_window is None:
+            from acs_launcher.window import MainWindow
+
+            win = MainWindow(cfg=self._cfg, cfg_current=self._cfg_current, application=self)
+            self._cfg = None  # the window owns (and may modify) it now
             if os.path.exists(ICON_PATH):
                 win.set_icon(GdkPixbuf.Pixbuf.new_from_file(ICON_PATH))
-        win.present()
+            win.connect("delete-event", self._on_window_delete)
+            win.connect("destroy", self._on_window_destroy)
+            self._main_window = win
+        return self._main_window
+
+    def _become_resident(self):
+        if self._resident:
+            return
+        logging_setup.get_logger().info("resident mode: starting hidden")
+        self._resident = True
+        # Keep running with no visible window.
+        self.hold()
+        self._window().prewarm()
+        from acs_launcher import passwords
+
+        threading.Thread(target=passwords.prewarm, name="keyring-prewarm", daemon=True).start()
+
+    def _on_window_delete(self, win, event):
+        if self._resident:
+            win.hide()
+            return True
+        return False
+
+    def _on_window_destroy(self, win):
+        self._main_window = None
+
+    def _on_launch_action(self, action, parameter):
+        system_name, user, fn_id = parameter.unpack()
+        self._window().launch_request(system_name, user, fn_id)
 
 
 def main():
-    app = ACSLauncherApp()
+    # A symlinked central config.json on a slow or hung mount doesn't
+    # hold up startup: the window starts from its local copy.
+    cfg, current = config.load_cached()
+    profiling.mark("load_config")
+    logging_setup.configure(cfg.get("enable_logging", True))
+    logging_setup.get_logger().info("rm-acs-launcher %s starting", __version__)
+    app = ACSLauncherApp(cfg, current)
     app.run(sys.argv)
 
 
@@ -0,0 +1,190 @@
+"""Typed, indexed view of the configuration.
+
+`config.load_config()` returns a `Config`: still a dict, so code that
+reads `cfg["java_path"]` or iterates `cfg["systems"]` is unchanged, but
+its systems and functions are `System` and `Function` records, and it
+keeps indexes of them by name and id so lookups don't scan the lists.
+
+The records behave as mutable mappings over a fixed set of slots (plus
+an overflow dict for keys this release doesn't know, so they survive a
+save), which keeps hundreds of systems far smaller than as dicts. A key
+that was never set is absent, exactly as in the dict it was read from.
+
+Code that edits the lists or renames an entry in place must call
+`Config.reindex()` afterwards; assigning a new list reindexes by itself.
+
+A record can also be lazy (see `_Record.lazy`): it holds only the fields
+kept in an index, such as a system's name and label or a function's
+favourite flag and icon, and loads the rest
+the first time anything else is asked of it. The config.d layout uses
+this to read a system's file only when the system is used, and keeps
+what was read as the record's `base`, so that saving writes back only
+the records that were changed.
+"""
+import copy
+from collections.abc import MutableMapping
+
+
+class _Record(MutableMapping):
+    __slots__ = ("_extra", "_loader", "base")
+    _FIELDS = ()
+    # The fields a lazy record's index holds (see `lazy`).
+    _INDEXED = ()
+
+    def __init__(self, data=(), **fields):
+        self._extra = None
+        self._loader = None
+        # The data a lazy record loaded (or was last saved with), which a
+        # save compares and merges against; None until then.
+        self.base = None
+        self.update(data, **fields)
+
+    @classmethod
+    def lazy(cls, index, loader):
+        """A record holding just `index` until anything else is read or
+        it is changed; `loader()` then returns all of its data.
+
+        `index` is taken to hold every `_INDEXED` field the record has: one
+        it lacks reads as absent rather than loading the record."""
+        record = cls(index)
+        record._loader = loader
+        return record
+
+    @property
+    def loaded(self):
+        """False while a lazy record holds only its index fields."""
+        return self._loader is None
+
+    def _load(self):
+        if self._loader is not None:
+            loader, self._loader = self._loader, None
+            self.base = loader()
+            self.update(copy.deepcopy(self.base))
+
+    def __getitem__(self, key):
+        if key in self._FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                if self._loader is None or key in self._INDEXED:
+                    raise KeyError(key) from None
+            self._load()
+            return self[key]
+        self._load()
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        self._load()
+        if key in self._FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        self._load()
+        if key in self._FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        self._load()
+        for name in self.__slots__:  # in declaration order
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class System(_Record):
+    """One IBM i system: its host name, label, users and custom fields."""
+
+    __slots__ = ("name", "label", "users", "fields")
+    _FIELDS = frozenset(__slots__)
+    _INDEXED = ("name", "label")
+
+
+class Function(_Record):
+    """One launchable ACS function."""
+
+    __slots__ = (
+        "id", "label", "launch_cmd", "requires_logon", "system_fields",
+        "is_favourite", "icon_path",
+    )
+    _FIELDS = frozenset(__slots__)
+    # Enough to build the favourites bar and decide on a prelogon
+    # without reading every function's file.
+    _INDEXED = ("id", "label", "is_favourite", "icon_path", "requires_logon")
+
+
+class Config(dict):
+    """The configuration dict, with its systems and functions as records
+    indexed by name and id.
+
+    `base` is the config as it was loaded or last saved, which a save
+    merges against (see config.merge); None for a config not read from
+    disk.
+    """
+
+    __slots__ = ("_systems", "_functions", "base")
+
+    def __init__(self, data=(), base=None):
+        super().__init__(data)
+        self.base = base
+        self.reindex()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key in ("systems", "functions"):
+            self.reindex()
+
+    def reindex(self):
+        """Rebuild the indexes after the systems or functions changed.
+        Plain dicts added to either list are converted to records."""
+        systems = _records(self.get("systems", []), System)
+        functions = _records(self.get("functions", []), Function)
+        # The first entry wins, as with the linear scan this replaces.
+        self._systems = {}
+        for s in systems:
+            self._systems.setdefault(s.get("name"), s)
+        self._functions = {}
+        for fn in functions:
+            self._functions.setdefault(fn.get("id"), fn)
+
+    def system(self, name):
+        """The system called `name`, or None."""
+        return self._systems.get(name)
+
+    def function(self, function_id):
+        """The function with id `function_id`, or None."""
+        return self._functions.get(function_id)
+
+
+def _records(items, cls):
+    """Convert the dicts in `items` to `cls` records, in place."""
+    for i, item in enumerate(items):
+        if not isinstance(item, cls):
+            items[i] = cls(item)
+    return items
+
+
+def json_default(obj):
+    """`default=` for json.dump, serialising records as plain objects."""
+    if isinstance(obj, _Record):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
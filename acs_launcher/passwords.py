@@ -46,3 +46,13 @@ def clear(system, user):
 def has_password(system, user):
     """Check if a password exists in the keyring."""
     return lookup(system, user) is not None
+
+
+def prewarm():
+    """Connect to the Secret Service and open a session now, so the first
+    lookup doesn't pay for the D-Bus round trips. Blocks; errors are
+    ignored (the first real lookup will report them)."""
+    try:
+        Secret.Service.get_sync(Secret.ServiceFlags.OPEN_SESSION, None)
+    except Exception:
+        pass
@@ -0,0 +1,195 @@
+"""Startup profiler.
+
+    rm-acs-launcher --profile-startup
+    RM_ACS_LAUNCHER_PROFILE_STARTUP=1 rm-acs-launcher
+
+When enabled, main.py starts the profiler before importing GTK. It records
+the time of each startup milestone, measured from the moment the kernel
+started the interpreter (read from /proc/self/stat), and times every module
+imported from then on, in the manner of `python -X importtime`: `self` is
+the time spent executing the module itself, `cumulative` includes the
+imports it triggered. Once startup is complete the report is written as
+JSON to the state dir, so runs can be compared across installs and
+releases.
+
+Everything here is a no-op unless `start()` has been called.
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+from acs_launcher import __version__
+
+FLAG = "--profile-startup"
+ENV_VAR = "RM_ACS_LAUNCHER_PROFILE_STARTUP"
+
+_profiler = None
+
+
+def requested(argv=None, environ=None):
+    """True if profiling was asked for on the command line or in the
+    environment."""
+    argv = sys.argv if argv is None else argv
+    environ = os.environ if environ is None else environ
+    return FLAG in argv[1:] or environ.get(ENV_VAR, "") not in ("", "0")
+
+
+def _process_age():
+    """Seconds since the kernel started this process, or None where
+    /proc isn't available. Resolution is one clock tick (usually 10 ms)."""
+    try:
+        with open("/proc/self/stat") as f:
+            stat = f.read()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    # Fields after the command name, which is in parentheses and may
+    # itself contain spaces; starttime is field 22 overall.
+    fields = stat[stat.rindex(")") + 2:].split()
+    try:
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (ValueError, IndexError, OSError):
+        return None
+    return max(0.0, uptime - started)
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time its exec_module()."""
+
+    def __init__(self, loader, timer, name):
+        self._loader = loader
+        self._timer = timer
+        self._name = name
+
+    def create_module(self, spec):
+        create = getattr(self._loader, "create_module", None)
+        return create(spec) if create is not None else None
+
+    def exec_module(self, module):
+        self._timer.exec_module(self._loader, self._name, module)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _ImportTimer:
+    """A meta path finder that times every import found after it was
+    installed. It finds nothing itself: it asks the finders behind it and
+    wraps the loader of whatever they find."""
+
+    def __init__(self):
+        self.imports = []  # (name, self seconds, cumulative seconds), in completion order
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self, name)
+        return spec
+
+    def exec_module(self, loader, name, module):
+        # Child time accumulated by each module this thread is executing.
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            loader.exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += cumulative
+            self.imports.append((name, cumulative - children, cumulative))
+
+
+class _Profiler:
+    def __init__(self):
+        self._origin = time.perf_counter()
+        # Milestone times are relative to interpreter start when known,
+        # else to the moment profiling started.
+        age = _process_age()
+        self.interpreter_start_known = age is not None
+        self._offset = age or 0.0
+        self.milestones = []
+        self.timer = _ImportTimer()
+        sys.meta_path.insert(0, self.timer)
+
+    def now(self):
+        return self._offset + time.perf_counter() - self._origin
+
+    def mark(self, name):
+        if not any(m[0] == name for m in self.milestones):
+            self.milestones.append((name, self.now()))
+
+    def stop(self):
+        if self.timer in sys.meta_path:
+            sys.meta_path.remove(self.timer)
+
+    def report(self):
+        milestones = []
+        if self.interpreter_start_known:
+            milestones.append({"name": "interpreter start", "ms": 0.0})
+        milestones += [{"name": n, "ms": round(t * 1000, 2)} for n, t in self.milestones]
+        return {
+            "version": __version__,
+            "python": sys.version.split()[0],
+            "host": os.uname().nodename,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "interpreter_start_known": self.interpreter_start_known,
+            "milestones": milestones,
+            "imports": [
+                {"module": n, "self_us": round(s * 1e6), "cumulative_us": round(c * 1e6)}
+                for n, s, c in self.timer.imports
+            ],
+        }
+
+
+def start():
+    """Start profiling: mark the time and begin timing imports."""
+    global _profiler
+    if _profiler is None:
+        _profiler = _Profiler()
+        _profiler.mark("profiler started")
+
+
+def mark(name):
+    """Record that startup reached `name`. Only the first mark of each
+    name counts, so a step that is repeated later isn't re-recorded."""
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+def finish(directory=None):
+    """Stop profiling and write the report; return its path, or None if
+    profiling isn't running or the report can't be written."""
+    global _profiler
+    if _profiler is None:
+        return None
+    profiler, _profiler = _profiler, None
+    profiler.stop()
+    from acs_launcher import config, logging_setup
+
+    directory = directory or config.STATE_DIR
+    path = os.path.join(directory, time.strftime("startup-profile-%Y%m%d-%H%M%S.json"))
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(profiler.report(), f, indent=2)
+    except OSError as e:
+        logging_setup.get_logger().warning("startup profile not written: %s", e)
+        return None
+    logging_setup.get_logger().info("startup profile written to %s", path)
+    return path
@@ -0,0 +1,294 @@
+"""Launch service on a Unix domain socket.
+
+    rm-acs-launcher serve [--socket PATH]
+
+Editors, shell scripts and other desktop tools can ask a resident process
+to log on and launch, instead of paying for a cold start per request. The
+protocol is JSON lines: each request is one JSON object on its own line,
+each response likewise. Requests on one connection run concurrently, so a
+client may pipeline several and match the responses, which arrive in
+completion order, by the `id` it chose:
+
+    {"id": 1, "op": "launch", "system": "PROD", "user": "RICHARD", "function": "rss"}
+    {"id": 2, "op": "logon", "system": "PROD", "user": "RICHARD"}
+    {"id": 3, "op": "status"}
+
+    {"id": 2, "ok": true, "message": "Logon successful"}
+    {"id": 1, "ok": true, "message": "Launched successfully"}
+    {"id": 3, "ok": true, "version": "0.3.2", "pid": 1234, "active": 0}
+
+`user` is optional, as for `rm-acs-launcher launch`. A `status` request
+with `system` and `user` reports whether a cached logon is valid for them
+(`logged_on`). Passwords come from the keyring only; the service never
+prompts. Logons go through the same session cache as the window and the
+CLI, and concurrent requests for the same logon share one ACS run.
+
+The socket is created mode 0600 in $XDG_RUNTIME_DIR, so only the user
+who started the service can use it.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import signal
+import socket
+
+from acs_launcher import __version__, aio, cli, config, launcher, logging_setup, sessions, templates
+
+log = logging_setup.get_logger()
+
+SOCKET_NAME = "rm-acs-launcher.sock"
+
+# Longest request line accepted; anything bigger is a client bug.
+_LINE_LIMIT = 64 * 1024
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or config.STATE_DIR
+    return os.path.join(runtime_dir, SOCKET_NAME)
+
+
+class RequestError(Exception):
+    """A malformed request; reported to the client, the connection stays open."""
+
+
+class Service:
+    """Handles requests for one serving socket."""
+
+    def __init__(self):
+        self.active = 0  # requests currently being handled
+
+    async def handle(self, request):
+        """Run one request and return the response dict (without the id)."""
+        if not isinstance(request, dict):
+            raise RequestError("request must be a JSON object")
+        op = request.get("op")
+        handler = {
+            "launch": self._launch,
+            "logon": self._logon,
+            "status": self._status,
+        }.get(op)
+        if handler is None:
+            raise RequestError(f"unknown op {op!r}")
+        if op == "status":
+            return await handler(request)
+        self.active += 1
+        try:
+            return await handler(request)
+        except cli.CLIError as e:
+            return {"ok": False, "message": str(e)}
+        finally:
+            self.active -= 1
+
+    async def _launch(self, request):
+        cfg, system, user, fn, launch_template, needs_logon = await _blocking(
+            self._prepare_launch, request
+        )
+        password = None
+        if needs_logon or "password" in launch_template.fields:
+            password = await self._password(system["name"], user)
+        if needs_logon:
+            ok, msg = await self._run_logon(cfg, system, user, password)
+            if not ok:
+                return {"ok": False, "message": msg}
+        placeholders = launcher.build_placeholders(cfg, system, user, password)
+        ok, msg = await aio.launch(launch_template.argv(placeholders), password=password)
+        return {"ok": ok, "message": msg}
+
+    @staticmethod
+    def _prepare_launch(request):
+        # On an executor thread: reads the config, its shards and the
+        # session cache.
+        cfg = config.load_config()
+        system, user, fn = cli.resolve(
+            cfg, _field(request, "system"), _field(request, "user", required=False),
+            _field(request, "function"),
+        )
+        launch_template = templates.compile(fn["launch_cmd"])
+        needs_logon = fn.get("requires_logon", False) and \
+            not sessions.is_logged_on(system["name"], user)
+        return cfg, system, user, fn, launch_template, needs_logon
+
+    async def _logon(self, request):
+        cfg, system, user, logged_on = await _blocking(self._prepare_logon, request)
+        if logged_on:
+            return {"ok": True, "message": "Already logged on"}
+        password = await self._password(system["name"], user)
+        ok, msg = await self._run_logon(cfg, system, user, password)
+        return {"ok": ok, "message": msg}
+
+    @staticmethod
+    def _prepare_logon(request):
+        # On an executor thread, as _prepare_launch.
+        cfg = config.load_config()
+        system_name = _field(request, "system")
+        system = config.get_system(cfg, system_name)
+        if system is None:
+            raise cli.CLIError(f"unknown system '{system_name}'")
+        user = cli.resolve_user(cfg, system, _field(request, "user", required=False))
+        problem = config.template_problem(cfg, system)
+        if problem:
+            raise cli.CLIError(problem)
+        logged_on = not request.get("force") and sessions.is_logged_on(system_name, user)
+        return cfg, system, user, logged_on
+
+    async def _status(self, request):
+        response = {"ok": True, "version": __version__, "pid": os.getpid(), "active": self.active}
+        if "system" in request:
+            response["logged_on"] = await _blocking(
+                sessions.is_logged_on, _field(request, "system"), _field(request, "user")
+            )
+        return response
+
+    async def _password(self, system_name, user):
+        # libsecret is a blocking D-Bus call; keep it off the event loop.
+        password = await _blocking(cli.keyring_lookup, system_name, user)
+        if password is None:
+            raise cli.CLIError(f"no password stored for {user}@{system_name}")
+        return password
+
+    async def _run_logon(self, cfg, system, user, password):
+        rejected = sessions.recent_failure(system["name"], user, password)
+        if rejected is not None:
+            return False, rejected
+        argv, pty_password = cli.logon_command(cfg, system, user, password)
+        ok, msg = await aio.run_logon(argv, password=pty_password)
+        await _blocking(cli.record_logon, cfg, system["name"], user, password, ok, msg)
+        return ok, msg
+
+    async def serve_client(self, reader, writer):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(request_id, response):
+            if request_id is not None:
+                response = {"id": request_id, **response}
+            data = json.dumps(response).encode("utf-8") + b"\n"
+            async with write_lock:
+                writer.write(data)
+                await writer.drain()
+
+        async def run(request):
+            request_id = request.get("id") if isinstance(request, dict) else None
+            try:
+                response = await self.handle(request)
+            except RequestError as e:
+                response = {"ok": False, "error": str(e)}
+            except Exception as e:
+                log.exception("service: request failed")
+                response = {"ok": False, "error": f"internal error: {e}"}
+            with contextlib.suppress(ConnectionError):
+                await respond(request_id, response)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await respond(None, {"ok": False, "error": "request too long"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await respond(None, {"ok": False, "error": "invalid JSON"})
+                    continue
+                task = asyncio.ensure_future(run(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # The client has finished sending; let outstanding requests
+            # answer before closing.
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def _field(request, name, required=True):
+    value = request.get(name)
+    if value is None:
+        if required:
+            raise RequestError(f"missing '{name}'")
+        return None
+    if not isinstance(value, str):
+        raise RequestError(f"'{name}' must be a string")
+    return value
+
+
+async def _blocking(func, *args):
+    """Run `func(*args)` on the default executor. For anything that
+    touches the disk (a config or lock file possibly on NFS) or D-Bus, so
+    one slow call doesn't hold up every other request."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def _claim_socket_path(path):
+    """Remove a stale socket left by a service that died, refusing to
+    take over one that is still being served."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.unlink(path)
+    else:
+        raise cli.CLIError(f"a service is already listening on {path}")
+    finally:
+        probe.close()
+
+
+async def serve(path, ready=None):
+    """Serve requests on the Unix socket at `path` until cancelled.
+
+    `ready`, if given, is an asyncio.Event set once the socket accepts
+    connections.
+    """
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    _claim_socket_path(path)
+    service = Service()
+    # Create the socket private from the start rather than chmod-ing it
+    # after a window in which anyone could connect.
+    old_umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(
+            service.serve_client, path, limit=_LINE_LIMIT
+        )
+    finally:
+        os.umask(old_umask)
+    log.info("service: listening on %s", path)
+    try:
+        async with server:
+            if ready is not None:
+                ready.set()
+            await server.serve_forever()
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+        log.info("service: stopped")
+
+
+def run(path=None):
+    """Run the service in the foreground until SIGINT/SIGTERM."""
+    path = path or default_socket_path()
+
+    async def main():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, task.cancel)
+        with contextlib.suppress(asyncio.CancelledError):
+            await serve(path)
+
+    print(f"rm-acs-launcher: serving on {path}")
+    asyncio.run(main())
+    return 0
@@ -0,0 +1,162 @@
+"""Cache of successful ACS logons, shared between launcher instances.
+
+A logon (`acslaunch /plugin=logon ... /auth`) leaves ACS holding shared
+credentials for that system/user, so repeating it before every launch only
+costs a multi-second JVM run. We remember each successful logon with an
+expiry and persist the cache under the state dir, so switching systems or
+restarting the launcher doesn't force a fresh logon. Several launcher
+processes can run at once; every read/modify/write happens under an
+advisory `flock` on a sidecar lock file.
+
+Failed logons are remembered too, but only briefly and only in memory:
+retrying a password the host just rejected costs another 5–30 s logon and
+moves the IBM i profile closer to being disabled.
+"""
+import contextlib
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+
+from acs_launcher import config, logging_setup
+
+log = logging_setup.get_logger()
+
+SESSIONS_FILE = os.path.join(config.STATE_DIR, "sessions.json")
+LOCK_FILE = os.path.join(config.STATE_DIR, "sessions.lock")
+
+# How long a rejected password keeps failing fast without a new logon.
+FAILURE_TTL = 5 * 60
+
+# Rejected logons, keyed by (system, user) -> (fingerprint, message, expires).
+# Never persisted: the fingerprint is an HMAC under a key that lives only
+# in this process, so it can't be used to brute-force the password offline.
+_failures = {}
+_failures_lock = threading.Lock()
+_fingerprint_key = os.urandom(32)
+
+
+def _key(system, user):
+    # Tab can't appear in a hostname or an IBM i user profile name.
+    return f"{system}\t{user}"
+
+
+@contextlib.contextmanager
+def _locked(exclusive):
+    os.makedirs(os.path.dirname(LOCK_FILE), mode=0o700, exist_ok=True)
+    fd = os.open(LOCK_FILE, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _read():
+    try:
+        with open(SESSIONS_FILE, "r") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, OSError):
+        log.warning("sessions: unreadable cache %s, ignoring", SESSIONS_FILE)
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+
+def _write(entries):
+    """Replace the cache file atomically so a concurrent reader never sees
+    a half-written file, dropping expired entries on the way."""
+    now = time.time()
+    entries = {k: v for k, v in entries.items() if v.get("expires", 0) > now}
+    directory = os.path.dirname(SESSIONS_FILE)
+    fd, tmp = tempfile.mkstemp(prefix=".sessions-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp, SESSIONS_FILE)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+
+def is_logged_on(system, user):
+    """True if a logon for system/user succeeded and hasn't expired yet."""
+    try:
+        with _locked(exclusive=False):
+            entry = _read().get(_key(system, user))
+    except OSError:
+        log.exception("sessions: lookup failed")
+        return False
+    return bool(entry) and entry.get("expires", 0) > time.time()
+
+
+def mark_logged_on(system, user, ttl):
+    """Record a successful logon for system/user, valid for `ttl` seconds.
+
+    A `ttl` of 0 (or less) disables caching: any existing entry is dropped
+    instead, so every launch re-authenticates.
+    """
+    if ttl <= 0:
+        forget(system, user)
+        return
+    now = time.time()
+    try:
+        with _locked(exclusive=True):
+            entries = _read()
+            entries[_key(system, user)] = {"logged_on": now, "expires": now + ttl}
+            _write(entries)
+    except OSError:
+        log.exception("sessions: failed to record logon")
+
+
+def forget(system, user):
+    """Drop the cached logon for system/user (e.g. after a password change)."""
+    try:
+        with _locked(exclusive=True):
+            entries = _read()
+            if entries.pop(_key(system, user), None) is not None:
+                _write(entries)
+    except OSError:
+        log.exception("sessions: failed to forget logon")
+
+
+def _fingerprint(password):
+    return hmac.new(
+        _fingerprint_key, (password or "").encode("utf-8"), hashlib.sha256
+    ).digest()
+
+
+def record_failure(system, user, password, message):
+    """Remember that the host rejected `password` for system/user."""
+    with _failures_lock:
+        _failures[(system, user)] = (
+            _fingerprint(password), message, time.monotonic() + FAILURE_TTL,
+        )
+
+
+def recent_failure(system, user, password):
+    """Return the error message if this exact password was rejected for
+    system/user within the last FAILURE_TTL seconds, else None."""
+    with _failures_lock:
+        entry = _failures.get((system, user))
+        if entry is None:
+            return None
+        fingerprint, message, expires = entry
+        if expires <= time.monotonic():
+            del _failures[(system, user)]
+            return None
+    if not hmac.compare_digest(fingerprint, _fingerprint(password)):
+        return None
+    return message
+
+
+def clear_failure(system, user):
+    """Forget a rejected logon (e.g. the user has just re-entered the password)."""
+    with _failures_lock:
+        _failures.pop((system, user), None)
@@ -0,0 +1,99 @@
+"""Local UI state: the system, user and function chosen last.
+
+This used to live in config.json, which the README suggests symlinking to
+a central file shared by several machines, so every launch rewrote the
+shared file and machines overwrote each other's selections. It is now
+kept per machine in the state dir, and written with a plain atomic
+replace (no fsync: losing the last selection costs nothing). The shared
+config is only rewritten when a setting changes.
+
+Keys other than these are preserved, for future history or state.
+"""
+import contextlib
+import json
+import os
+import tempfile
+
+from acs_launcher import config, logging_setup
+
+STATE_FILE = os.path.join(config.STATE_DIR, "state.json")
+
+DEFAULT_STATE = {
+    "last_system": "",
+    "last_user": "",
+    "last_function": "",
+}
+
+# (path, content) last written or read, to skip rewriting the same state.
+_saved = None
+
+
+def load():
+    """The saved state, with defaults for missing keys.
+
+    The first time (no state file yet) the selections are taken over from
+    config.json, where older releases kept them.
+    """
+    global _saved
+    state = dict(DEFAULT_STATE)
+    try:
+        with open(STATE_FILE, "r") as f:
+            text = f.read()
+        saved = json.loads(text)
+        _saved = (STATE_FILE, text)
+    except FileNotFoundError:
+        saved = _legacy_state()
+        if saved:
+            save(state | saved)
+    except (OSError, ValueError):
+        saved = {}
+    if isinstance(saved, dict):
+        state.update(saved)
+    return state
+
+
+def _legacy_state():
+    try:
+        with open(config.CONFIG_FILE, "r") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(saved, dict):
+        return {}
+    return {
+        key: saved[key] for key in DEFAULT_STATE
+        if isinstance(saved.get(key), str) and saved[key]
+    }
+
+
+def save(state):
+    """Write `state` if it differs from what is on disk. Failures are
+    logged, not raised: the state is a convenience."""
+    global _saved
+    text = json.dumps(state, indent=2)
+    if _saved == (STATE_FILE, text):
+        return
+    directory = os.path.dirname(STATE_FILE)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".state.json.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+            os.replace(tmp, STATE_FILE)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp)
+            raise
+    except OSError as e:
+        logging_setup.get_logger().warning("state: not saved: %s", e)
+        return
+    _saved = (STATE_FILE, text)
+
+
+def update(**changes):
+    """Load the state, apply `changes`, and save it."""
+    state = load()
+    state.update(changes)
+    save(state)
+    return state
@@ -0,0 +1,86 @@
+"""Compiled launch_cmd / logon_cmd templates.
+
+A template is split into argv tokens once (shlex, on the template itself)
+and cached by its source string. Placeholders are then filled into each
+token on its own, so a value containing spaces or quotes — a .hod path
+under "My Sessions", say — stays exactly one argument instead of being
+re-split by the shell-style parser.
+"""
+import functools
+import shlex
+import string
+
+# Placeholders launcher.build_placeholders always provides. Templates may
+# also use the custom fields of the system they are run for.
+BASE_PLACEHOLDERS = frozenset(("system", "user", "password", "acs_exe", "acs_jar", "java"))
+
+_formatter = string.Formatter()
+
+
+class TemplateError(ValueError):
+    """A template that can't be tokenized or parsed."""
+
+
+class Template:
+    """A command template split into argv tokens.
+
+    `fields` is the set of placeholder names the template references.
+    """
+
+    __slots__ = ("source", "fields", "_tokens")
+
+    def __init__(self, source):
+        self.source = source
+        try:
+            tokens = shlex.split(source)
+        except ValueError as e:
+            raise TemplateError(f"{e} in {source!r}") from None
+        self._tokens = []
+        fields = set()
+        for token in tokens:
+            try:
+                names = [
+                    name for _, name, _, _ in _formatter.parse(token) if name is not None
+                ]
+            except ValueError as e:
+                raise TemplateError(f"{e} in {source!r}") from None
+            for name in names:
+                if not name or not name.isidentifier():
+                    raise TemplateError(f"bad placeholder {{{name}}} in {source!r}")
+            fields.update(names)
+            if not names:
+                # Literal: unescape "{{" / "}}" now rather than per launch.
+                self._tokens.append((token.format(), False, False))
+            else:
+                self._tokens.append((token, True, token == "{" + names[0] + "}"))
+        self.fields = frozenset(fields)
+
+    def argv(self, placeholders):
+        """Fill `placeholders` into each token and return the argv list.
+
+        A token that is nothing but a placeholder with an empty value is
+        dropped, as splitting the substituted string used to do.
+        Raises KeyError if a placeholder is referenced but not available.
+        """
+        argv = []
+        for token, has_fields, bare in self._tokens:
+            if not has_fields:
+                argv.append(token)
+                continue
+            value = token.format_map(placeholders)
+            if value or not bare:
+                argv.append(value)
+        return argv
+
+    def unknown_fields(self, available):
+        """Placeholder names used by the template but not in `available`."""
+        return sorted(self.fields - set(available))
+
+
+@functools.lru_cache(maxsize=256)
+def compile(source):
+    """Return the (cached) Template for `source`.
+
+    Raises TemplateError if the template can't be parsed.
+    """
+    return Template(source)
@@ -1,3 +1,4 @@
+import collections
 import threading
 
 import gi
@@ -5,11 +6,9 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib, GdkPixbuf
 
-from acs_launcher import __version__, config, passwords, launcher, logging_setup
-from acs_launcher.dialogs.password_dialog import PasswordDialog
-from acs_launcher.dialogs.system_manager_dialog import SystemManagerDialog
-from acs_launcher.dialogs.function_manager_dialog import FunctionManagerDialog
-from acs_launcher.dialogs.preferences_dialog import PreferencesDialog
+# The dialogs and `passwords` (which loads the libsecret typelib) are
+# imported where they are first used, to keep them off the startup path.
+from acs_launcher import __version__, cli, config, config_watch, launcher, logging_setup, logon_engine, profiling, sessions, state, templates
 
 import os
 
@@ -18,9 +17,60 @@ DEFAULT_ICON_PATH = os.path.join(
     "data", "icons", "app-default.png",
 )
 
+# How long the system/user selection must stay put before a speculative
+# background logon starts, so scrolling through the combos doesn't spawn
+# (and immediately kill) an ACS JVM per entry.
+_PRELOGON_DELAY_MS = 750
+
+
+def _sync_combo(combo, items):
+    """Make a ComboBoxText's rows match `items`, a list of (id, label),
+    removing and inserting only the rows that differ. The active row stays
+    selected unless it was removed."""
+    active = combo.get_active_id()
+    model = combo.get_model()
+    id_column, text_column = combo.get_id_column(), combo.get_entry_text_column()
+    wanted = dict(items)
+    for position in reversed(range(len(model))):
+        row = model[position]
+        if wanted.get(row[id_column]) != row[text_column]:
+            combo.remove(position)
+    present = {row[id_column] for row in model}
+    for position, (item_id, label) in enumerate(items):
+        if item_id not in present:
+            combo.insert(position, item_id, label)
+    if [row[id_column] for row in model] != [item_id for item_id, _ in items]:
+        # Reordered: the rare case a full rebuild is simplest.
+        combo.remove_all()
+        for item_id, label in items:
+            combo.append(item_id, label)
+    if active is not None and combo.get_active_id() != active and active in wanted:
+        combo.set_active_id(active)
+
+
+def _describe(list_diff):
+    parts = [
+        f"{what} {', '.join(sorted(map(str, keys)))}"
+        for what, keys in (
+            ("+", list_diff.added), ("-", list_diff.removed), ("~", list_diff.changed),
+        )
+        if keys
+    ]
+    if list_diff.reordered:
+        parts.append("reordered")
+    return "; ".join(parts) or "-"
+
+
+class _Prelogon:
+    """A background logon started ahead of the Launch click."""
+
+    def __init__(self, key):
+        self.key = key  # (system_name, user)
+        self.handle = None  # logon_engine.Handle, once started
+
 
 class MainWindow(Gtk.ApplicationWindow):
-    def __init__(self, **kwargs):
+    def __init__(self, cfg=None, cfg_current=True, **kwargs):
         super().__init__(
             title="RM ACS Launcher",
             default_width=450,
@@ -28,13 +78,42 @@ class MainWindow(Gtk.ApplicationWindow):
             **kwargs,
         )
         self._apply_css()
-        self.cfg = config.load_config()
+        self.cfg = cfg if cfg is not None else config.load_config()
+        self._state = state.load()  # last selections, kept out of the shared config
+        self._template_problems = {}  # see _check_templates
         self._launching = False
-        self._logged_on = None  # (system_name, user) of last successful logon
+        self._queued_launches = collections.deque()  # _do_launch args, see there
+        self._prelogon = None  # _Prelogon running in the background, if any
+        self._prelogon_source = None  # pending debounce timeout id
+        self._favourite_buttons = {}  # fn id -> (button, (label, icon path))
+        self._editing_config = 0  # manager dialogs open on self.cfg
+        self.connect("destroy", self._on_destroy)
         self._build_ui()
+        profiling.mark("MainWindow._build_ui")
+        self._check_templates()
         self._populate_combos()
+        profiling.mark("_populate_combos")
         self._restore_last_selections()
         self._update_launch_sensitivity()
+        self._config_watcher = None
+        self._closed = False
+        if cfg_current:
+            self._config_watcher = config_watch.ConfigWatcher(self._on_config_file_changed)
+        else:
+            # Started from the local copy of a central config: read the
+            # file itself in the background, watching it once it answers.
+            config.refresh(
+                lambda new_cfg: GLib.idle_add(self._on_config_refreshed, new_cfg),
+                lambda: GLib.idle_add(
+                    self._set_status, "Central configuration not responding - using the local copy"
+                ),
+            )
+
+    def _on_destroy(self, window):
+        self._closed = True
+        self._cancel_prelogon()
+        if self._config_watcher is not None:
+            self._config_watcher.stop()
 
     def _apply_css(self):
         css = b"""
@@ -128,7 +207,11 @@ class MainWindow(Gtk.ApplicationWindow):
         self.launch_button.connect("clicked", self._on_launch)
         self.launch_row.pack_start(self.launch_button, False, False, 0)
 
-        self._build_favourites()
+        # Decoding the favourite icons is the slowest part of building the
+        # window, so it waits until the first frame is on screen.
+        self._favourites_pending = True
+        self._favourites_separator.set_no_show_all(True)
+        self._first_draw_handler = self.connect_after("draw", self._on_first_draw)
 
         # --- Bottom buttons ---
         button_box = Gtk.Box(
@@ -144,13 +227,14 @@ class MainWindow(Gtk.ApplicationWindow):
         passwords_btn.connect("clicked", self._on_manage_passwords)
         button_box.pack_start(passwords_btn, True, True, 0)
 
-        systems_btn = Gtk.Button(label="Systems")
-        systems_btn.connect("clicked", self._on_manage_systems)
-        button_box.pack_start(systems_btn, True, True, 0)
+        self.systems_btn = Gtk.Button(label="Systems")
+        self.systems_btn.connect("clicked", self._on_manage_systems)
+        button_box.pack_start(self.systems_btn, True, True, 0)
 
-        functions_btn = Gtk.Button(label="Functions")
-        functions_btn.connect("clicked", self._on_manage_functions)
-        button_box.pack_start(functions_btn, True, True, 0)
+        self.functions_btn = Gtk.Button(label="Functions")
+        self.functions_btn.connect("clicked", self._on_manage_functions)
+        button_box.pack_start(self.functions_btn, True, True, 0)
+        self._update_managers()
 
         prefs_btn = Gtk.Button(label="Preferences")
         prefs_btn.connect("clicked", self._on_preferences)
@@ -161,7 +245,9 @@ class MainWindow(Gtk.ApplicationWindow):
         self.statusbar.push(0, f"Ready — v{__version__}")
         vbox.pack_end(self.statusbar, False, False, 0)
 
-        self.show_all()
+        # Show the contents but not the window itself; the application
+        # presents it (or, in resident mode, keeps it hidden until asked).
+        vbox.show_all()
 
     # ---- Combo population ----
 
@@ -175,6 +261,21 @@ class MainWindow(Gtk.ApplicationWindow):
         for fn in self.cfg["functions"]:
             self.function_combo.append(fn["id"], fn["label"])
 
+    def _sync_combos(self, changes):
+        """Apply `changes` (a config.ConfigDiff) to the combos, touching
+        only the rows that changed."""
+        if changes.systems:
+            _sync_combo(self.system_combo, [
+                (s["name"], s.get("label") or s["name"]) for s in self.cfg["systems"]
+            ])
+        system = config.get_system(self.cfg, self.system_combo.get_active_id() or "")
+        if system is not None and system["name"] in changes.systems.changed:
+            _sync_combo(self.user_combo, [(u, u) for u in system.get("users", [])])
+        if changes.functions:
+            _sync_combo(self.function_combo, [
+                (fn["id"], fn["label"]) for fn in self.cfg["functions"]
+            ])
+
     def _populate_users(self):
         self.user_combo.remove_all()
         system_name = self.system_combo.get_active_id()
@@ -187,13 +288,13 @@ class MainWindow(Gtk.ApplicationWindow):
             self.user_combo.append(user, user)
 
     def _restore_last_selections(self):
-        last_sys = self.cfg.get("last_system", "")
+        last_sys = self._state.get("last_system", "")
         if last_sys:
             self.system_combo.set_active_id(last_sys)
-        last_user = self.cfg.get("last_user", "")
+        last_user = self._state.get("last_user", "")
         if last_user:
             self.user_combo.set_active_id(last_user)
-        last_fn = self.cfg.get("last_function", "")
+        last_fn = self._state.get("last_function", "")
         if last_fn:
             self.function_combo.set_active_id(last_fn)
 
@@ -202,13 +303,15 @@ class MainWindow(Gtk.ApplicationWindow):
     def _on_system_changed(self, combo):
         self._populate_users()
         # Try to restore last user if switching back to a previously used system
-        last_user = self.cfg.get("last_user", "")
+        last_user = self._state.get("last_user", "")
         if last_user:
             self.user_combo.set_active_id(last_user)
         self._update_launch_sensitivity()
+        self._schedule_prelogon()
 
     def _on_selection_changed(self, combo):
         self._update_launch_sensitivity()
+        self._schedule_prelogon()
 
     def _update_launch_sensitivity(self):
         if self._launching:
@@ -238,8 +341,24 @@ class MainWindow(Gtk.ApplicationWindow):
             )
             return
 
+        problem = config.template_problem(self.cfg, system, fn)
+        if problem:
+            self.launch_button.set_sensitive(False)
+            self._set_error_status(problem)
+            return
+
         self.launch_button.set_sensitive(True)
 
+    def _check_templates(self):
+        """Compile every command template now, so a malformed one is
+        reported when the config is loaded rather than on Launch. Whether
+        its placeholders suit the selected system is checked on selection
+        (config.template_problem)."""
+        self._template_problems = config.check_templates(self.cfg)
+        log = logging_setup.get_logger()
+        for message in self._template_problems.values():
+            log.warning("config: %s", message)
+
     def _set_status(self, message):
         self.statusbar.get_style_context().remove_class("error-status")
         self.statusbar.pop(0)
@@ -250,38 +369,150 @@ class MainWindow(Gtk.ApplicationWindow):
         self.statusbar.push(0, message)
         self.statusbar.get_style_context().add_class("error-status")
 
+    # ---- Speculative logon ----
+
+    def _schedule_prelogon(self):
+        """(Re)start the debounce timer for a background logon of the
+        selected system/user. Any pending or running logon for a different
+        selection is cancelled."""
+        key = (self.system_combo.get_active_id(), self.user_combo.get_active_id())
+        if self._prelogon is not None and self._prelogon.key == key:
+            return
+        self._cancel_prelogon()
+        if all(key):
+            self._prelogon_source = GLib.timeout_add(
+                _PRELOGON_DELAY_MS, self._start_prelogon
+            )
+
+    def _cancel_prelogon(self):
+        if self._prelogon_source is not None:
+            GLib.source_remove(self._prelogon_source)
+            self._prelogon_source = None
+        if self._prelogon is not None:
+            if self._prelogon.handle is not None:
+                self._prelogon.handle.cancel()
+            self._prelogon = None
+
+    def _wants_logon(self):
+        """True if the selected function or any favourite needs a logon."""
+        fn = config.get_function(self.cfg, self.function_combo.get_active_id() or "")
+        if fn and fn.get("requires_logon", False):
+            return True
+        return any(
+            f.get("is_favourite", False) and f.get("requires_logon", False)
+            for f in self.cfg["functions"]
+        )
+
+    def _start_prelogon(self):
+        self._prelogon_source = None
+        if self._launching or not self._wants_logon():
+            return GLib.SOURCE_REMOVE
+        # Legacy argv logons can't be cancelled, so don't speculate on them.
+        if "logon_cmd" in self._template_problems or \
+                "password" in templates.compile(self.cfg.get("logon_cmd", "")).fields:
+            return GLib.SOURCE_REMOVE
+        system_name = self.system_combo.get_active_id()
+        user = self.user_combo.get_active_id()
+        system = config.get_system(self.cfg, system_name or "")
+        if not system or not user or sessions.is_logged_on(system_name, user):
+            return GLib.SOURCE_REMOVE
+        if config.template_problem(self.cfg, system):
+            return GLib.SOURCE_REMOVE
+        from acs_launcher import passwords
+
+        # Only ever use a stored password — never prompt for a logon the
+        # user hasn't asked for yet.
+        password = passwords.lookup(system_name, user)
+        if password is None:
+            return GLib.SOURCE_REMOVE
+
+        log = logging_setup.get_logger()
+        log.info("prelogon: %s@%s", user, system_name)
+        prelogon = _Prelogon((system_name, user))
+
+        def done(ok, msg):
+            log.info("prelogon: %s@%s ok=%s msg=%s", user, system_name, ok, msg)
+            if self._prelogon is prelogon:
+                self._prelogon = None
+
+        self._prelogon = prelogon
+        try:
+            prelogon.handle = self._start_logon(system, user, password, done)
+        except KeyError:
+            self._prelogon = None
+        return GLib.SOURCE_REMOVE
+
     # ---- Favourites ----
 
+    def _on_first_draw(self, widget, cr):
+        self.disconnect(self._first_draw_handler)
+        profiling.mark("first frame")
+        GLib.idle_add(self._build_pending_favourites)
+        return False
+
+    def _build_pending_favourites(self):
+        if self._favourites_pending:
+            self._build_favourites()
+            profiling.mark("_build_favourites")
+            # The last step of startup, so the profile (if any) is complete.
+            profiling.finish()
+        return GLib.SOURCE_REMOVE
+
+    def prewarm(self):
+        """Finish the work deferred past the first frame now, for a window
+        that is built hidden (resident mode) and so may not draw for a while."""
+        self._build_pending_favourites()
+
     def _build_favourites(self):
-        for child in self._favourites_box.get_children():
-            child.destroy()
-        has_favourites = False
+        """Bring the favourite buttons in line with the config, reusing the
+        buttons (and decoded icons) of favourites whose label and icon are
+        unchanged."""
+        self._favourites_pending = False
+        old_buttons = self._favourite_buttons
+        self._favourite_buttons = {}
+        ordered = []
         for fn in self.cfg["functions"]:
             if not fn.get("is_favourite", False):
                 continue
             icon_path = config.resolve_icon_path(fn.get("icon_path", ""), fn["id"])
             if not icon_path or not os.path.exists(icon_path):
                 icon_path = DEFAULT_ICON_PATH
-            if not os.path.exists(icon_path):
-                continue
-            try:
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
-                    icon_path, 28, 28, True
-                )
-            except Exception:
-                continue
-            image = Gtk.Image.new_from_pixbuf(pixbuf)
-            btn = Gtk.Button()
-            btn.set_image(image)
-            btn.set_relief(Gtk.ReliefStyle.NONE)
-            btn.set_tooltip_text(fn["label"])
-            fn_id = fn["id"]
-            btn.connect("clicked", lambda b, fid=fn_id: self._on_favourite_launch(fid))
-            self._favourites_box.pack_start(btn, False, False, 0)
-            has_favourites = True
-        self._favourites_separator.set_visible(has_favourites)
+            signature = (fn["label"], icon_path)
+            entry = old_buttons.pop(fn["id"], None)
+            if entry is None or entry[1] != signature:
+                if entry is not None:
+                    entry[0].destroy()
+                btn = self._favourite_button(fn["id"], fn["label"], icon_path)
+                if btn is None:
+                    continue
+                self._favourites_box.pack_start(btn, False, False, 0)
+                entry = (btn, signature)
+            self._favourite_buttons[fn["id"]] = entry
+            ordered.append(entry[0])
+        for btn, _ in old_buttons.values():
+            btn.destroy()
+        for position, btn in enumerate(ordered):
+            self._favourites_box.reorder_child(btn, position)
+        self._favourites_separator.set_visible(bool(ordered))
         self._favourites_box.show_all()
 
+    def _favourite_button(self, fn_id, label, icon_path):
+        if not os.path.exists(icon_path):
+            return None
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(
+                icon_path, 28, 28, True
+            )
+        except Exception:
+            return None
+        image = Gtk.Image.new_from_pixbuf(pixbuf)
+        btn = Gtk.Button()
+        btn.set_image(image)
+        btn.set_relief(Gtk.ReliefStyle.NONE)
+        btn.set_tooltip_text(label)
+        btn.connect("clicked", lambda b: self._on_favourite_launch(fn_id))
+        return btn
+
     def _on_favourite_launch(self, fn_id):
         system_name = self.system_combo.get_active_id()
         user = self.user_combo.get_active_id()
@@ -300,15 +531,38 @@ class MainWindow(Gtk.ApplicationWindow):
                 f"System is missing required fields: {', '.join(fn.get('system_fields', []))}"
             )
             return
-        # Save last selections
-        self.cfg["last_system"] = system_name
-        self.cfg["last_user"] = user
-        self.cfg["last_function"] = fn_id
-        config.save_config(self.cfg)
+        problem = config.template_problem(self.cfg, system, fn)
+        if problem:
+            self._set_error_status(problem)
+            return
+        self._save_selections(system_name, user, fn_id)
         self._do_launch(system_name, user, system, fn)
 
+    def launch_request(self, system_name, user, fn_id):
+        """Launch `fn_id` for system/user on behalf of another process
+        (`rm-acs-launcher --launch`, or the app.launch action).
+
+        An empty `user` means the system's only user, or the last one
+        used. Returns None once the launch has been queued, or an error
+        message if it can't be launched. A launch already in progress is
+        finished first. The selections in the window are left as they are.
+        """
+        try:
+            system, user, fn = cli.resolve(self.cfg, system_name, user or None, fn_id)
+        except cli.CLIError as e:
+            self._set_error_status(str(e))
+            return str(e)
+        # Reply to the caller first; the launch may still need to ask for
+        # a password.
+        GLib.idle_add(self._do_launch, system_name, user, system, fn)
+        return None
+
     # ---- Launch flow ----
 
+    def _save_selections(self, system_name, user, fn_id):
+        self._state.update(last_system=system_name, last_user=user, last_function=fn_id)
+        state.save(self._state)
+
     def _on_launch(self, button):
         system_name = self.system_combo.get_active_id()
         user = self.user_combo.get_active_id()
@@ -316,22 +570,42 @@ class MainWindow(Gtk.ApplicationWindow):
         system = config.get_system(self.cfg, system_name)
         fn = config.get_function(self.cfg, fn_id)
 
-        # Save last selections
-        self.cfg["last_system"] = system_name
-        self.cfg["last_user"] = user
-        self.cfg["last_function"] = fn_id
-        config.save_config(self.cfg)
+        self._save_selections(system_name, user, fn_id)
 
         self._do_launch(system_name, user, system, fn)
 
-    def _do_launch(self, system_name, user, system, fn):
+    def _do_launch(self, system_name, user, system, fn, password=None):
+        # One launch at a time: another (a favourite, or a request from
+        # another process) waits for this one, password prompt included.
+        if self._launching:
+            self._queued_launches.append((system_name, user, system, fn, password))
+            return GLib.SOURCE_REMOVE
+        self._launching = True
+        self.launch_button.set_label("Launching...")
+        self._update_launch_sensitivity()
+        try:
+            self._begin_launch(system_name, user, system, fn, password)
+        except Exception as e:
+            # The keyring, the password dialog or a template: whatever
+            # failed, the launches queued behind this one must still run.
+            logging_setup.get_logger().exception("launch: failed to start")
+            self._set_error_status(f"Error: {e}")
+            self._launch_finished()
+        return GLib.SOURCE_REMOVE
+
+    def _begin_launch(self, system_name, user, system, fn, password):
+        """The body of `_do_launch`: get the password, then log on and/or
+        launch. Every path ends in `_launch_finished`."""
         # Check if we need a password
         needs_password = fn.get("requires_logon", False)
-        if not needs_password and "{password}" in fn.get("launch_cmd", ""):
+        if not needs_password and \
+                "password" in templates.compile(fn.get("launch_cmd", "")).fields:
             needs_password = True
 
-        password = None
-        if needs_password:
+        if needs_password and password is None:
+            from acs_launcher import passwords
+            from acs_launcher.dialogs.password_dialog import PasswordDialog
+
             password = passwords.lookup(system_name, user)
             if password is None:
                 dialog = PasswordDialog(self, system_name, user)
@@ -343,13 +617,38 @@ class MainWindow(Gtk.ApplicationWindow):
                 dialog.destroy()
                 if password is None:
                     self._set_status("Launch cancelled - no password")
+                    self._launch_finished()
                     return
 
-        self._launching = True
-        self.launch_button.set_label("Launching...")
-        self._update_launch_sensitivity()
-        self._set_status("Launching...")
+        # Run logon command if required (skip if a cached logon for this
+        # system/user is still valid — possibly from another instance).
+        # A background pre-logon still running for the same system/user
+        # is joined rather than started twice.
+        if fn.get("requires_logon", False) and not sessions.is_logged_on(system_name, user):
+            self._set_status("Authenticating...")
+            try:
+                self._start_logon(
+                    system, user, password,
+                    lambda ok, msg: self._on_logon_done(ok, msg, system, user, password, fn),
+                )
+            except KeyError as e:
+                self._set_error_status(f"Missing placeholder: {e}")
+                self._launch_finished()
+            return
+
+        self._start_launch(system, user, password, fn)
+
+    def _on_logon_done(self, ok, msg, system, user, password, fn):
+        if ok:
+            self._start_launch(system, user, password, fn)
+        elif launcher.is_credential_failure(msg):
+            self._on_logon_rejected(system, user, fn, msg)
+        else:
+            self._set_error_status(msg)
+            self._launch_finished()
 
+    def _start_launch(self, system, user, password, fn):
+        self._set_status("Launching...")
         thread = threading.Thread(
             target=self._launch_thread,
             args=(system, user, password, fn),
@@ -358,52 +657,21 @@ class MainWindow(Gtk.ApplicationWindow):
         thread.start()
 
     def _launch_thread(self, system, user, password, fn):
+        # launcher.launch waits up to 2 s to catch an immediate failure,
+        # so it runs off the main thread.
         try:
             placeholders = launcher.build_placeholders(
                 self.cfg, system, user, password
             )
-
-            # Run logon command if required (skip if already logged on for this system/user)
-            logon_key = (system["name"], user)
-            if fn.get("requires_logon", False) and self._logged_on != logon_key:
-                logon_cmd = self.cfg.get("logon_cmd", "")
-                GLib.idle_add(self._set_status, "Authenticating...")
-                try:
-                    cmd = launcher.substitute(logon_cmd, placeholders)
-                except KeyError as e:
-                    GLib.idle_add(
-                        self._set_error_status, f"Missing placeholder: {e}"
-                    )
-                    GLib.idle_add(self._launch_finished)
-                    return
-
-                # If the template doesn't embed {password}, the password is
-                # fed through a PTY so it never lands on the subprocess argv.
-                # Templates that do embed {password} (custom/legacy) keep
-                # the original argv-based behaviour.
-                if "{password}" in logon_cmd:
-                    ok, msg = launcher.run_logon(cmd)
-                else:
-                    ok, msg = launcher.run_logon(cmd, password=password)
-                if ok:
-                    self._logged_on = logon_key
-                else:
-                    GLib.idle_add(self._set_error_status, msg)
-                    GLib.idle_add(self._launch_finished)
-                    return
-
-            # Run launch command
-            GLib.idle_add(self._set_status, "Launching...")
             try:
-                cmd = launcher.substitute(fn["launch_cmd"], placeholders)
+                argv = templates.compile(fn["launch_cmd"]).argv(placeholders)
             except KeyError as e:
                 GLib.idle_add(
                     self._set_status, f"Missing placeholder: {e}"
                 )
-                GLib.idle_add(self._launch_finished)
                 return
 
-            ok, msg = launcher.launch(cmd, password=password)
+            ok, msg = launcher.launch(argv, password=password)
             if ok:
                 GLib.idle_add(self._set_status, msg)
             else:
@@ -413,10 +681,80 @@ class MainWindow(Gtk.ApplicationWindow):
         finally:
             GLib.idle_add(self._launch_finished)
 
+    def _start_logon(self, system, user, password, callback):
+        """Start the configured logon command for system/user, recording
+        the outcome in the session caches. `callback(ok, msg)` runs on the
+        main loop when it completes.
+
+        A password the host rejected within the last few minutes fails
+        fast with the previous error instead of running another logon.
+
+        Returns a logon_engine.Handle whose cancel() abandons the logon,
+        or None if it can't be cancelled. Raises KeyError if the logon
+        template references an unknown placeholder.
+        """
+        system_name = system["name"]
+        rejected = sessions.recent_failure(system_name, user, password)
+        if rejected is not None:
+            GLib.idle_add(callback, False, rejected)
+            return None
+        template = templates.compile(self.cfg.get("logon_cmd", ""))
+        placeholders = launcher.build_placeholders(self.cfg, system, user, password)
+        argv = template.argv(placeholders)
+
+        def done(ok, msg):
+            if ok:
+                sessions.mark_logged_on(
+                    system_name, user,
+                    self.cfg.get("logon_cache_ttl", config.DEFAULT_CONFIG["logon_cache_ttl"]),
+                )
+            elif launcher.is_credential_failure(msg):
+                sessions.record_failure(system_name, user, password, msg)
+            callback(ok, msg)
+
+        # If the template doesn't embed {password}, the password is
+        # fed through a PTY so it never lands on the subprocess argv;
+        # the PTY is driven from the main loop. Templates that do embed
+        # {password} (custom/legacy) keep the original argv-based
+        # behaviour, on a worker thread.
+        if "password" in template.fields:
+            def worker():
+                ok, msg = launcher.run_logon(argv)
+                GLib.idle_add(done, ok, msg)
+
+            threading.Thread(target=worker, daemon=True).start()
+            return None
+        return logon_engine.start(argv, password, done)
+
+    def _on_logon_rejected(self, system, user, fn, message):
+        """The host rejected the password: go straight to updating it and,
+        if the user enters a new one, retry the launch with it."""
+        from acs_launcher import passwords
+        from acs_launcher.dialogs.password_dialog import PasswordDialog
+
+        self._set_error_status(message)
+        system_name = system["name"]
+        dialog = PasswordDialog(self, system_name, user)
+        password = None
+        if dialog.run() == Gtk.ResponseType.OK:
+            password = dialog.get_password()
+            if dialog.get_save_to_keyring():
+                passwords.store(system_name, user, password)
+            sessions.clear_failure(system_name, user)
+            sessions.forget(system_name, user)
+        dialog.destroy()
+        # Still this launch's turn until the retry has started.
+        self._launch_finished()
+        if password is not None:
+            self._do_launch(system_name, user, system, fn, password=password)
+        return GLib.SOURCE_REMOVE
+
     def _launch_finished(self):
         self._launching = False
         self.launch_button.set_label("Launch")
         self._update_launch_sensitivity()
+        if self._queued_launches:
+            GLib.idle_add(self._do_launch, *self._queued_launches.popleft())
 
     # ---- ACS default launcher ----
 
@@ -426,7 +764,7 @@ class MainWindow(Gtk.ApplicationWindow):
             self._set_error_status("ACS executable not configured — check Preferences")
             return
         self._set_status("Launching ACS...")
-        ok, msg = launcher.launch(acs_exe)
+        ok, msg = launcher.launch([acs_exe])
         if ok:
             self._set_status(msg)
         else:
@@ -435,6 +773,9 @@ class MainWindow(Gtk.ApplicationWindow):
     # ---- Dialog handlers ----
 
     def _on_manage_passwords(self, button):
+        from acs_launcher import passwords
+        from acs_launcher.dialogs.password_dialog import PasswordDialog
+
         system_name = self.system_combo.get_active_id()
         user = self.user_combo.get_active_id()
 
@@ -470,12 +811,16 @@ class MainWindow(Gtk.ApplicationWindow):
 
             if response == Gtk.ResponseType.REJECT:
                 passwords.clear(system_name, user)
+                sessions.forget(system_name, user)
+                sessions.clear_failure(system_name, user)
                 self._set_status(f"Password removed for {user}@{system_name}")
             elif response == Gtk.ResponseType.OK:
                 pw_dialog = PasswordDialog(self, system_name, user)
                 resp = pw_dialog.run()
                 if resp == Gtk.ResponseType.OK:
                     passwords.store(system_name, user, pw_dialog.get_password())
+                    sessions.forget(system_name, user)
+                    sessions.clear_failure(system_name, user)
                     self._set_status(
                         f"Password updated for {user}@{system_name}"
                     )
@@ -485,34 +830,112 @@ class MainWindow(Gtk.ApplicationWindow):
             resp = pw_dialog.run()
             if resp == Gtk.ResponseType.OK:
                 passwords.store(system_name, user, pw_dialog.get_password())
+                sessions.clear_failure(system_name, user)
                 self._set_status(f"Password saved for {user}@{system_name}")
             pw_dialog.destroy()
 
+    def _update_managers(self):
+        """Systems and functions from a config_url can't be saved here, so
+        their editors are offered only for a local config."""
+        for button, key in ((self.systems_btn, "systems"), (self.functions_btn, "functions")):
+            editable = config.is_local(self.cfg, key)
+            button.set_sensitive(editable)
+            button.set_tooltip_text(
+                None if editable else f"Managed centrally at {self.cfg['config_url']}"
+            )
+
     def _on_manage_systems(self, button):
+        from acs_launcher.dialogs.system_manager_dialog import SystemManagerDialog
+
         dialog = SystemManagerDialog(self, self.cfg)
-        dialog.run()
+        self._editing_config += 1
+        try:
+            dialog.run()
+        finally:
+            self._editing_config -= 1
         dialog.destroy()
-        config.save_config(self.cfg)
+        config.queue_save(self.cfg)
         self._populate_combos()
         self._restore_last_selections()
         self._update_launch_sensitivity()
 
     def _on_manage_functions(self, button):
+        from acs_launcher.dialogs.function_manager_dialog import FunctionManagerDialog
+
         dialog = FunctionManagerDialog(self, self.cfg)
-        dialog.run()
+        self._editing_config += 1
+        try:
+            dialog.run()
+        finally:
+            self._editing_config -= 1
         dialog.destroy()
-        config.save_config(self.cfg)
+        config.queue_save(self.cfg)
+        self._check_templates()
         self._populate_combos()
         self._restore_last_selections()
         self._update_launch_sensitivity()
         self._build_favourites()
 
     def _on_preferences(self, button):
+        from acs_launcher.dialogs.preferences_dialog import PreferencesDialog
+
         dialog = PreferencesDialog(self, self.cfg)
-        response = dialog.run()
+        self._editing_config += 1
+        try:
+            response = dialog.run()
+        finally:
+            self._editing_config -= 1
         if response == Gtk.ResponseType.OK:
             dialog.apply()
-            config.save_config(self.cfg)
+            config.queue_save(self.cfg)
             logging_setup.configure(self.cfg.get("enable_logging", True))
             self._set_status("Preferences saved")
+            self._check_templates()
+            self._update_launch_sensitivity()
         dialog.destroy()
+
+    # ---- Live reload ----
+
+    def _on_config_refreshed(self, new_cfg):
+        """The background read of a central config.json finished, with
+        `new_cfg` None if it failed. The watcher then offers the file as
+        changed, and it is applied like any live reload (load_config is
+        answered from memory by now)."""
+        if self._closed:
+            return GLib.SOURCE_REMOVE
+        if new_cfg is None:
+            self._set_error_status("Central configuration unreadable - using the local copy")
+        self._config_watcher = config_watch.ConfigWatcher(
+            self._on_config_file_changed, current=new_cfg is None
+        )
+        return GLib.SOURCE_REMOVE
+
+    def _on_config_file_changed(self, new_cfg):
+        """config.json changed on disk (perhaps from another machine), and
+        the watcher has read it as `new_cfg`. Returns False, leaving the
+        change pending, while a dialog is editing the config in memory or
+        one of our own saves is still queued (the file would be older than
+        self.cfg)."""
+        if self._editing_config or config.save_pending():
+            return False
+        changes = config.diff(self.cfg, new_cfg)
+        if not changes:
+            return True
+        logging_setup.get_logger().info(
+            "config: reloaded (settings: %s; systems: %s; functions: %s)",
+            ", ".join(sorted(changes.settings)) or "-",
+            _describe(changes.systems), _describe(changes.functions),
+        )
+        self.cfg = new_cfg
+        if "enable_logging" in changes.settings:
+            logging_setup.configure(self.cfg.get("enable_logging", True))
+        if "config_url" in changes.settings:
+            self._update_managers()
+        if changes.functions or "logon_cmd" in changes.settings:
+            self._check_templates()
+        self._sync_combos(changes)
+        if changes.functions and not self._favourites_pending:
+            self._build_favourites()
+        self._update_launch_sensitivity()
+        self._set_status("Configuration reloaded")
+        return True
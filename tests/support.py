@@ -0,0 +1,89 @@
+"""Fixtures shared by the test modules.
+
+Not a test module itself (unittest only collects test*.py); the test
+modules import it as `support`, which works both under
+`python3 -m unittest discover -s tests` and when a file is run directly.
+"""
+import os
+import sys
+import tempfile
+import types
+from unittest import mock
+
+
+def scratch_dir(test):
+    """A temporary directory removed when `test` finishes."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    return tmp.name
+
+
+def patch_paths(test, module, **values):
+    """Patch each of `module`'s attributes named in `values` for the
+    duration of `test`."""
+    for name, value in values.items():
+        patcher = mock.patch.object(module, name, value)
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+def patch_config(test, directory, **values):
+    """Point every file acs_launcher.config reads or writes into
+    `directory` and start from empty caches; `values` patches anything
+    else, or overrides one of those paths."""
+    from acs_launcher import config
+
+    config_dir = os.path.join(directory, "config")
+    cache_dir = os.path.join(directory, "cache")
+    patch_paths(test, config, **{
+        "CONFIG_DIR": config_dir,
+        "CONFIG_FILE": os.path.join(config_dir, "config.json"),
+        "CONFIG_D": os.path.join(config_dir, "config.d"),
+        "CACHE_DIR": cache_dir,
+        "SNAPSHOT_FILE": os.path.join(cache_dir, "config.snapshot"),
+        "LOCAL_COPY_FILE": os.path.join(cache_dir, "config.json"),
+        "REMOTE_CACHE_FILE": os.path.join(cache_dir, "remote-config.json"),
+        "_cached": None,
+        "_shard_cache": {},
+        **values,
+    })
+
+
+class _StubType(type):
+    def __getattr__(cls, name):
+        return _stub_class(name)
+
+
+class _Stub(metaclass=_StubType):
+    """Stands in for any PyGObject class, instance, function or constant:
+    everything can be called, subclassed or looked up on it, and yields
+    another stub."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return _Stub()
+
+    def __call__(self, *args, **kwargs):
+        return _Stub()
+
+    def __iter__(self):
+        return iter(())
+
+
+def _stub_class(name):
+    return _StubType(name, (_Stub,), {})
+
+
+def stub_gi():
+    """Install a `gi` whose every module, class and call is a stub, so
+    GUI modules can be imported and built without PyGObject or a display.
+    Nothing is drawn: only good for checking what gets imported or run."""
+    gi = types.ModuleType("gi")
+    gi.require_version = lambda namespace, version: None
+    repository = types.ModuleType("gi.repository")
+    repository.__getattr__ = _stub_class
+    gi.repository = repository
+    sys.modules["gi"] = gi
+    sys.modules["gi.repository"] = repository
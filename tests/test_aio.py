@@ -0,0 +1,136 @@
+"""Tests for the asyncio logon/launch API in acs_launcher.aio.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import asyncio
+import os
+import pathlib
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import aio  # noqa: E402
+
+
+def _make_child(body):
+    """Write a scripted fake `acslaunch` and return the command to run it."""
+    p = pathlib.Path(tempfile.mkdtemp()) / "fake_acs.py"
+    p.write_text("#!/usr/bin/env python3\n" + textwrap.dedent(body))
+    return f"{sys.executable} {p}"
+
+
+async def _reaped():
+    """Let the background reapers finish before asyncio.run closes the loop."""
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(t for t in aio._background if t.get_loop() is loop))
+
+
+_SLOW_LOGON = """
+    import sys, time
+    with open({runs!r}, "a") as f:
+        f.write("run\\n")
+    sys.stdout.write("Password: ")
+    sys.stdout.flush()
+    pw = sys.stdin.readline().strip()
+    time.sleep(0.5)
+    if pw == "s3cret":
+        sys.stdout.write("\\nLogon completed successfully\\n")
+    else:
+        sys.stdout.write("\\nMSG0001 Login failed\\n")
+    sys.stdout.flush()
+"""
+
+
+class AioLogonTests(unittest.TestCase):
+    def setUp(self):
+        self.runs = os.path.join(tempfile.mkdtemp(), "runs")
+
+    def _runs(self):
+        with open(self.runs) as f:
+            return len(f.readlines())
+
+    def test_many_logons_run_concurrently(self):
+        cmds = [_make_child(_SLOW_LOGON.format(runs=self.runs)) for _ in range(5)]
+
+        async def main():
+            results = await asyncio.gather(
+                *(aio.run_logon(cmd, "s3cret", timeout=10) for cmd in cmds)
+            )
+            await _reaped()
+            return results
+
+        start = time.monotonic()
+        results = asyncio.run(main())
+        self.assertEqual(results, [(True, "Logon successful")] * 5)
+        self.assertEqual(self._runs(), 5)
+        self.assertLess(time.monotonic() - start, 2.5, "logons should overlap")
+
+    def test_bad_password(self):
+        cmd = _make_child(_SLOW_LOGON.format(runs=self.runs))
+        ok, msg = asyncio.run(aio.run_logon(cmd, "wrong", timeout=10))
+        self.assertFalse(ok)
+        self.assertIn("MSG0001", msg)
+
+    def test_same_logon_is_coalesced(self):
+        cmd = _make_child(_SLOW_LOGON.format(runs=self.runs))
+
+        async def main():
+            results = await asyncio.gather(
+                *(aio.run_logon(cmd, "s3cret", timeout=10) for _ in range(3))
+            )
+            await _reaped()
+            return results
+
+        self.assertEqual(asyncio.run(main()), [(True, "Logon successful")] * 3)
+        self.assertEqual(self._runs(), 1)
+
+    def test_cancelling_one_waiter_keeps_the_logon(self):
+        cmd = _make_child(_SLOW_LOGON.format(runs=self.runs))
+
+        async def main():
+            first = asyncio.ensure_future(aio.run_logon(cmd, "s3cret", timeout=10))
+            second = asyncio.ensure_future(aio.run_logon(cmd, "s3cret", timeout=10))
+            await asyncio.sleep(0.1)
+            first.cancel()
+            result = await second
+            await _reaped()
+            return result
+
+        self.assertEqual(asyncio.run(main()), (True, "Logon successful"))
+        self.assertEqual(self._runs(), 1)
+
+    def test_wait_for_bounds_a_hung_logon(self):
+        cmd = _make_child(
+            """
+            import time
+            time.sleep(30)
+            """
+        )
+
+        async def main():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(aio.run_logon(cmd, "s3cret", timeout=30), 0.3)
+
+        start = time.monotonic()
+        asyncio.run(main())
+        self.assertLess(time.monotonic() - start, 5)
+
+
+class AioLaunchTests(unittest.TestCase):
+    def test_launch(self):
+        self.assertEqual(
+            asyncio.run(aio.launch("/bin/echo hello")), (True, "Launched successfully")
+        )
+
+    def test_command_not_found(self):
+        ok, msg = asyncio.run(aio.launch("/nonexistent/acslaunch"))
+        self.assertFalse(ok)
+        self.assertIn("command not found", msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
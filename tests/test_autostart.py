@@ -0,0 +1,44 @@
+"""Tests for the XDG autostart entry in acs_launcher.autostart.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import configparser
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import autostart  # noqa: E402
+import support  # noqa: E402
+
+
+class AutostartTests(unittest.TestCase):
+    def setUp(self):
+        directory = os.path.join(support.scratch_dir(self), "autostart")
+        support.patch_paths(
+            self, autostart,
+            AUTOSTART_DIR=directory,
+            AUTOSTART_FILE=os.path.join(directory, "rm-acs-launcher.desktop"),
+        )
+
+    def test_enable_and_disable(self):
+        self.assertFalse(autostart.is_enabled())
+        autostart.set_enabled(True)
+        self.assertTrue(autostart.is_enabled())
+        entry = configparser.ConfigParser(interpolation=None)
+        entry.read(autostart.AUTOSTART_FILE)
+        self.assertEqual(entry["Desktop Entry"]["Type"], "Application")
+        self.assertTrue(entry["Desktop Entry"]["Exec"].endswith(" --autostart"))
+        autostart.set_enabled(False)
+        self.assertFalse(autostart.is_enabled())
+        autostart.disable()  # already gone: no error
+
+    def test_exec_quoting(self):
+        self.assertEqual(autostart._quote("/usr/bin/python3"), "/usr/bin/python3")
+        self.assertEqual(autostart._quote("/home/me/my apps/main.py"), '"/home/me/my apps/main.py"')
+        self.assertEqual(autostart._quote('/a/$x"y'), '"/a/\\\\$x\\\\"y"')
+
+
+if __name__ == "__main__":
+    unittest.main()
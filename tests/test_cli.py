@@ -0,0 +1,133 @@
+"""Tests for the headless `launch` command in acs_launcher.cli.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from acs_launcher import cli, config, state  # noqa: E402
+import support  # noqa: E402
+
+
+def _config():
+    cfg = copy.deepcopy(config.DEFAULT_CONFIG)
+    cfg["systems"] = [
+        {"name": "PROD", "label": "Production", "users": ["RICHARD"], "fields": {}},
+        {"name": "TEST", "users": ["A", "B"], "fields": {}},
+    ]
+    cfg["functions"].append({
+        "id": "echo",
+        "label": "Echo",
+        "launch_cmd": "/bin/echo {system} {user}",
+        "requires_logon": False,
+        "system_fields": [],
+    })
+    return cfg
+
+
+class ResolveTests(unittest.TestCase):
+    def setUp(self):
+        self.cfg = _config()
+        directory = support.scratch_dir(self)
+        support.patch_paths(self, state, STATE_FILE=os.path.join(directory, "state.json"))
+        support.patch_config(self, directory, CONFIG_FILE=os.path.join(directory, "config.json"))
+
+    def test_single_user_is_the_default(self):
+        _, user, fn = cli.resolve(self.cfg, "PROD", None, "echo")
+        self.assertEqual((user, fn["id"]), ("RICHARD", "echo"))
+
+    def test_user_required_when_ambiguous(self):
+        with self.assertRaisesRegex(cli.CLIError, "--user"):
+            cli.resolve(self.cfg, "TEST", None, "echo")
+
+    def test_last_user_breaks_the_tie(self):
+        state.update(last_user="B")
+        _, user, _ = cli.resolve(self.cfg, "TEST", None, "echo")
+        self.assertEqual(user, "B")
+
+    def test_unknown_system_and_function(self):
+        with self.assertRaisesRegex(cli.CLIError, "unknown system"):
+            cli.resolve(self.cfg, "NOPE", "RICHARD", "echo")
+        with self.assertRaisesRegex(cli.CLIError, "unknown function"):
+            cli.resolve(self.cfg, "PROD", "RICHARD", "nope")
+
+    def test_missing_system_field(self):
+        with self.assertRaisesRegex(cli.CLIError, "hod_file"):
+            cli.resolve(self.cfg, "PROD", "RICHARD", "5250")
+
+    def test_no_password_without_terminal(self):
+        with mock.patch.object(cli, "keyring_lookup", return_value=None), \
+                mock.patch.object(cli.sys.stdin, "isatty", return_value=False):
+            with self.assertRaisesRegex(cli.CLIError, "no password stored"):
+                cli.launch(self.cfg, "PROD", "RICHARD", "rss")
+
+
+class ParseTargetTests(unittest.TestCase):
+    def test_function_at_system(self):
+        self.assertEqual(cli.parse_target("rss@PROD"), ("rss", "PROD"))
+        self.assertEqual(cli.parse_target("my@fn@PROD"), ("my@fn", "PROD"))
+
+    def test_malformed(self):
+        for target in ("rss", "@PROD", "rss@", ""):
+            with self.subTest(target=target):
+                with self.assertRaises(cli.CLIError):
+                    cli.parse_target(target)
+
+
+class LaunchCommandTests(unittest.TestCase):
+    """Run main.py as the user would, against a config in a scratch $HOME."""
+
+    def setUp(self):
+        self.home = tempfile.TemporaryDirectory()
+        self.addCleanup(self.home.cleanup)
+        config_dir = os.path.join(self.home.name, ".config", "rm-acs-launcher")
+        os.makedirs(config_dir)
+        with open(os.path.join(config_dir, "config.json"), "w") as f:
+            json.dump(_config(), f)
+
+    def _run(self, *args):
+        return subprocess.run(
+            [sys.executable, os.path.join(REPO, "acs_launcher", "main.py"), *args],
+            env={**os.environ, "HOME": self.home.name},
+            capture_output=True, text=True, timeout=30,
+        )
+
+    def test_launch(self):
+        result = self._run("launch", "--system", "PROD", "--function", "echo")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Launched successfully", result.stdout)
+
+    def test_unknown_function_fails(self):
+        result = self._run("launch", "--system", "PROD", "--function", "nope")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("unknown function", result.stderr)
+
+    def test_gtk_is_never_imported(self):
+        code = (
+            "import sys; sys.path.insert(0, {repo!r}); "
+            "from acs_launcher import cli; "
+            "rc = cli.main(['launch', '--system', 'PROD', '--function', 'echo']); "
+            "assert 'gi' not in sys.modules, 'gi imported'; "
+            # Only a config_url needs the HTTP client.
+            "assert 'urllib.request' not in sys.modules, 'urllib.request imported'; "
+            "sys.exit(rc)"
+        ).format(repo=REPO)
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            env={**os.environ, "HOME": self.home.name},
+            capture_output=True, text=True, timeout=30,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,659 @@
+"""Tests for loading, caching and migrating config.json in acs_launcher.config,
+and for the indexed model in acs_launcher.model.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import copy
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, model  # noqa: E402
+import support  # noqa: E402
+
+
+class LoadConfigTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = support.scratch_dir(self)
+        support.patch_config(self, self.dir)
+
+    def _write(self, cfg):
+        os.makedirs(config.CONFIG_DIR, exist_ok=True)
+        with open(config.CONFIG_FILE, "w") as f:
+            json.dump(cfg, f, default=model.json_default)
+
+    def _current(self):
+        """The config as saved, with nothing left to migrate."""
+        cfg = config.load_config()
+        cfg["systems"] = [{"name": "PROD", "users": ["RICHARD"], "fields": {}}]
+        self._write(cfg)
+        return cfg
+
+    def test_parsed_once_while_file_unchanged(self):
+        self._current()
+        with mock.patch.object(config.json, "load", wraps=config.json.load) as load:
+            first = config.load_config()
+            second = config.load_config()
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(first, second)
+        # Each caller gets its own copy.
+        first["systems"].append({"name": "TEST"})
+        self.assertEqual(len(config.load_config()["systems"]), 1)
+
+    def test_change_is_picked_up(self):
+        cfg = self._current()
+        config.load_config()
+        cfg["systems"].append({"name": "TEST", "users": [], "fields": {}})
+        cfg["java_opts"] = "-Xmx2g -Xms64m"  # a different size, even on a coarse mtime
+        self._write(cfg)
+        self.assertEqual(len(config.load_config()["systems"]), 2)
+
+    def test_save_invalidates(self):
+        cfg = self._current()
+        config.load_config()
+        cfg["java_opts"] = "-Xmx512m"
+        config.save_config(cfg)
+        self.assertEqual(config.load_config()["java_opts"], "-Xmx512m")
+
+    def test_migrations_are_saved_with_the_next_change(self):
+        self._write({
+            "logon_cmd": config._LEGACY_LOGON_CMD,
+            "functions": [{"id": "own", "label": "Own", "launch_cmd": "x", "icon_path": "acs-logo.png"}],
+            "last_system": "PROD",
+            "future_setting": {"from": "a newer release"},
+        })
+        with open(config.CONFIG_FILE) as f:
+            before = f.read()
+        cfg = config.load_config()
+        self.assertEqual(cfg["logon_cmd"], config.DEFAULT_CONFIG["logon_cmd"])
+        self.assertEqual(cfg["functions"][0]["icon_path"], "app-default.png")
+        self.assertEqual(cfg["future_setting"], {"from": "a newer release"})
+        self.assertNotIn("last_system", cfg)
+        # Loading (from the CLI or the service, say) leaves the file alone.
+        with open(config.CONFIG_FILE) as f:
+            self.assertEqual(f.read(), before)
+
+        cfg["java_opts"] = "-Xmx2g"
+        config.save_config(cfg)
+        with open(config.CONFIG_FILE) as f:
+            saved = json.load(f)
+        self.assertEqual(saved["logon_cmd"], config.DEFAULT_CONFIG["logon_cmd"])
+        self.assertEqual(saved["functions"][0]["icon_path"], "app-default.png")
+        self.assertEqual(len(saved["functions"]), len(config.DEFAULT_FUNCTIONS) + 1)
+        self.assertEqual(saved["future_setting"], {"from": "a newer release"})
+        self.assertNotIn("last_system", saved)
+        self.assertEqual(saved["java_opts"], "-Xmx2g")
+
+    def test_migration_merges_with_edits_made_elsewhere(self):
+        self._write({"logon_cmd": config._LEGACY_LOGON_CMD, "java_path": "/usr/bin/java"})
+        cfg = config.load_config()
+        # Another machine changes a setting meanwhile.
+        with open(config.CONFIG_FILE) as f:
+            other = json.load(f)
+        other["java_path"] = "/opt/java/bin/java"
+        self._write(other)
+        config.save_config(cfg)
+        merged = config.load_config()
+        self.assertEqual(merged["java_path"], "/opt/java/bin/java")
+        self.assertEqual(merged["logon_cmd"], config.DEFAULT_CONFIG["logon_cmd"])
+
+    def test_snapshot_skips_parsing(self):
+        cfg = self._current()
+        cfg["config_snapshot"] = True
+        self._write(cfg)
+        config.load_config()
+        self.assertTrue(os.path.exists(config.SNAPSHOT_FILE))
+
+        config._cached = None  # a cold start
+        with mock.patch.object(config.json, "load") as load:
+            self.assertEqual(config.load_config(), cfg)
+        load.assert_not_called()
+
+        # A snapshot of an older version of the file is ignored...
+        cfg["java_path"] = "/opt/java/bin/java"
+        self._write(cfg)
+        config._cached = None
+        self.assertEqual(config.load_config()["java_path"], "/opt/java/bin/java")
+        # ...and turning the option off removes it.
+        cfg["config_snapshot"] = False
+        self._write(cfg)
+        config.load_config()
+        self.assertFalse(os.path.exists(config.SNAPSHOT_FILE))
+
+    def test_snapshot_of_another_release_is_ignored(self):
+        cfg = self._current()
+        cfg["config_snapshot"] = True
+        cfg["future_setting"] = "from a newer release"
+        self._write(cfg)
+        config.load_config()
+
+        # New defaults...
+        defaults = dict(config.DEFAULT_CONFIG, new_setting="default")
+        config._cached = None
+        with mock.patch.object(config, "DEFAULT_CONFIG", defaults):
+            self.assertEqual(config.load_config()["new_setting"], "default")
+        # ...new migrations...
+        config._cached = None
+        with mock.patch.object(config, "_RETIRED_KEYS", config._RETIRED_KEYS + ("future_setting",)):
+            self.assertNotIn("future_setting", config.load_config())
+        # ...or just a new version: each parses the file afresh.
+        config._cached = None
+        with mock.patch.object(config, "__version__", "99.0"), \
+                mock.patch.object(config.json, "load", wraps=config.json.load) as load:
+            self.assertEqual(config.load_config(), cfg)
+        load.assert_called_once()
+
+    def test_corrupt_snapshot_is_ignored(self):
+        cfg = self._current()
+        os.makedirs(config.CACHE_DIR)
+        with open(config.SNAPSHOT_FILE, "wb") as f:
+            f.write(b"\x00garbage")
+        self.assertEqual(config.load_config(), cfg)
+
+    def test_missing_or_invalid_file_gives_defaults(self):
+        self.assertEqual(config.load_config(), config.DEFAULT_CONFIG)
+        os.makedirs(config.CONFIG_DIR)
+        with open(config.CONFIG_FILE, "w") as f:
+            f.write("{not json")
+        self.assertEqual(config.load_config(), config.DEFAULT_CONFIG)
+        for text in ("[]", "null", '"config"'):
+            with open(config.CONFIG_FILE, "w") as f:
+                f.write(text)
+            self.assertEqual(config.load_config(), config.DEFAULT_CONFIG)
+
+    def _central(self):
+        """Make config.json a symlink to a central file, and return the
+        central file's path."""
+        central = os.path.join(self.dir, "central", "config.json")
+        os.makedirs(os.path.dirname(central))
+        os.makedirs(config.CONFIG_DIR)
+        os.symlink(central, config.CONFIG_FILE)
+        return central
+
+    def test_local_config_has_no_local_copy(self):
+        cfg = self._current()
+        self.assertEqual(config.load_cached(), (cfg, True))
+        self.assertFalse(os.path.exists(config.LOCAL_COPY_FILE))
+
+    def test_central_config_starts_from_local_copy(self):
+        central = self._central()
+        # No copy yet: the file is read.
+        cfg = self._current()
+        self.assertEqual(config.load_cached(), (cfg, True))
+        self.assertTrue(os.path.exists(config.LOCAL_COPY_FILE))
+
+        config._cached = None
+        with mock.patch.object(config.os, "stat", side_effect=AssertionError("central read")):
+            local, current = config.load_cached()
+        self.assertEqual((local, current), (cfg, False))
+        # Saves merge relative to the copy.
+        local["java_opts"] = "-Xmx2g"
+        config.save_config(local)
+        with open(central) as f:
+            self.assertEqual(json.load(f)["java_opts"], "-Xmx2g")
+
+    def test_unreachable_central_config_falls_back_to_local_copy(self):
+        central = self._central()
+        cfg = self._current()
+        config.load_config()
+        os.unlink(central)  # the mount went away
+        config._cached = None
+        self.assertEqual(config.load_config(), cfg)
+        with open(central, "w") as f:
+            f.write("[]")  # or someone saved nonsense there
+        self.assertEqual(config.load_config(), cfg)
+
+    def test_refresh_reads_in_background(self):
+        self._central()
+        cfg = self._current()
+        results = []
+        on_done = results.append
+
+        config.refresh(on_done).join(5)
+        self.assertEqual(results, [cfg])
+        # A hung mount: on_timeout first, on_done once the read returns.
+        release = threading.Event()
+        load = config._load
+
+        def slow_load():
+            release.wait(5)
+            return load()
+
+        timed_out = threading.Event()
+        results.clear()
+        with mock.patch.object(config, "_load", slow_load):
+            thread = config.refresh(on_done, timed_out.set, timeout=0.05)
+            self.assertTrue(timed_out.wait(5))
+            self.assertEqual(results, [])
+            release.set()
+            thread.join(5)
+        self.assertEqual(results, [cfg])
+
+        os.unlink(config.CONFIG_FILE)
+        results.clear()
+        config.refresh(on_done).join(5)
+        self.assertEqual(results, [None])
+
+
+class SaveConfigTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = support.scratch_dir(self)
+        support.patch_config(self, self.dir, _last_written=None, _writer=config._Writer())
+        self.addCleanup(config.flush_saves)
+        self.cfg = config.load_config()
+
+    def test_atomic_and_private(self):
+        config.save_config(self.cfg)
+        self.assertEqual(config.load_config(), self.cfg)
+        self.assertEqual(os.stat(config.CONFIG_FILE).st_mode & 0o777, 0o600)
+        self.assertEqual(sorted(os.listdir(config.CONFIG_DIR)), [".config.json.lock", "config.json"])
+
+    def test_unchanged_content_is_not_rewritten(self):
+        config.save_config(self.cfg)
+        inode = os.stat(config.CONFIG_FILE).st_ino
+        config.save_config(config.load_config())
+        self.assertEqual(os.stat(config.CONFIG_FILE).st_ino, inode)
+        self.cfg["java_opts"] = "-Xmx512m"
+        config.save_config(self.cfg)
+        self.assertNotEqual(os.stat(config.CONFIG_FILE).st_ino, inode)
+
+    def test_symlinked_config_replaces_the_target(self):
+        central = os.path.join(self.dir, "central.json")
+        with open(central, "w") as f:
+            f.write("{}")
+        os.makedirs(config.CONFIG_DIR)
+        os.symlink(central, config.CONFIG_FILE)
+        self.cfg["java_opts"] = "-Xmx2g"
+        config.save_config(self.cfg)
+        self.assertTrue(os.path.islink(config.CONFIG_FILE))
+        with open(central) as f:
+            self.assertEqual(json.load(f)["java_opts"], "-Xmx2g")
+
+    def test_queued_saves_are_coalesced(self):
+        with mock.patch.object(config, "_write_text", wraps=config._write_text) as write:
+            for ttl in (1, 2, 3):
+                self.cfg["logon_cache_ttl"] = ttl
+                config.queue_save(self.cfg)
+            config.flush_saves()
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(config.load_config()["logon_cache_ttl"], 3)
+
+    def test_queued_save_is_written_in_the_background(self):
+        written = threading.Event()
+        real_write = config._write_text
+
+        def write(*args):
+            real_write(*args)
+            written.set()
+
+        with mock.patch.object(config, "_write_text", write):
+            self.cfg["java_opts"] = "-Xmx2g"
+            config.queue_save(self.cfg)
+            self.assertTrue(written.wait(5))
+        self.assertEqual(config.load_config()["java_opts"], "-Xmx2g")
+
+    def test_concurrent_writers_keep_each_others_edits(self):
+        config.save_config(self.cfg)
+        here, there = config.load_config(), config.load_config()
+        here["systems"].append({"name": "PROD", "users": ["RICHARD"], "fields": {}})
+        here["java_opts"] = "-Xmx2g"
+        config.save_config(here)
+        there["systems"].append({"name": "TEST", "users": [], "fields": {}})
+        config.get_function(there, "rss")["label"] = "SQL"
+        config.save_config(there)
+
+        merged = config.load_config()
+        self.assertEqual([s["name"] for s in merged["systems"]], ["PROD", "TEST"])
+        self.assertEqual(merged["java_opts"], "-Xmx2g")
+        self.assertEqual(config.get_function(merged, "rss")["label"], "SQL")
+        # Saving again from the same (now stale) copy changes nothing.
+        here["systems"][0]["users"].append("ALICE")
+        config.save_config(here)
+        merged = config.load_config()
+        self.assertEqual([s["name"] for s in merged["systems"]], ["PROD", "TEST"])
+        self.assertEqual(merged["systems"][0]["users"], ["RICHARD", "ALICE"])
+        self.assertEqual(config.get_function(merged, "rss")["label"], "SQL")
+
+    def test_failed_queued_save_is_carried_by_the_next(self):
+        config.save_config(self.cfg)
+        self.cfg["java_opts"] = "-Xmx2g"
+        with mock.patch.object(config, "_write_text", side_effect=OSError("stale NFS handle")), \
+                self.assertLogs(config.logging_setup.get_logger(), "WARNING"):
+            config.queue_save(self.cfg)
+            self._wait_for_writer()
+        self.cfg["logon_cache_ttl"] = 7
+        config.queue_save(self.cfg)
+        config.flush_saves()
+        saved = config.load_config()
+        self.assertEqual(saved["java_opts"], "-Xmx2g")
+        self.assertEqual(saved["logon_cache_ttl"], 7)
+
+    def test_writer_survives_unexpected_errors(self):
+        failed = threading.Event()
+
+        def write(*args):
+            failed.set()
+            raise ValueError("a bug")
+
+        with mock.patch.object(config, "_write_text", write), \
+                self.assertLogs(config.logging_setup.get_logger(), "ERROR"):
+            config.queue_save(self.cfg)
+            self.assertTrue(failed.wait(5))
+            self._wait_for_writer()
+        # The next save is still written in the background.
+        self.cfg["java_opts"] = "-Xmx2g"
+        config.queue_save(self.cfg)
+        self._wait_for_writer()
+        self.assertEqual(config.load_config()["java_opts"], "-Xmx2g")
+
+    def _wait_for_writer(self):
+        """Wait for the writer thread to finish what is queued, without
+        taking it over as flush_saves would."""
+        deadline = time.monotonic() + 5
+        while config.save_pending():
+            self.assertLess(time.monotonic(), deadline, "save still pending")
+            time.sleep(0.01)
+
+    def test_save_config_supersedes_a_queued_save(self):
+        self.cfg["java_opts"] = "-Xmx1g"
+        config.queue_save(self.cfg)
+        self.cfg["java_opts"] = "-Xmx3g"
+        config.save_config(self.cfg)
+        config.flush_saves()
+        self.assertEqual(config.load_config()["java_opts"], "-Xmx3g")
+
+
+class ShardedConfigTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = support.scratch_dir(self)
+        support.patch_config(self, self.dir)
+        # A monolithic config.json, split up by the first save.
+        cfg = config.load_config()
+        cfg["systems"] = [
+            {"name": "PROD", "label": "Production", "users": ["RICHARD"], "fields": {}},
+            {"name": "TEST", "users": ["ALICE"], "fields": {}},
+            {"name": "DEV/1", "label": "Dev", "users": [], "fields": {}},
+        ]
+        config.save_config(cfg)
+        os.makedirs(config.CONFIG_D)
+        config.save_config(config.load_config())
+
+    def _saved(self):
+        with open(config.CONFIG_FILE) as f:
+            return json.load(f)
+
+    def _cold_load(self):
+        config._cached = None
+        config._shard_cache.clear()
+        return config.load_config()
+
+    def _shard(self, kind, name):
+        return config._shard_path(kind, name)
+
+    def test_first_save_splits_the_config(self):
+        self.assertEqual(self._saved()["systems"], [
+            {"name": "PROD", "label": "Production"}, {"name": "TEST"},
+            {"name": "DEV/1", "label": "Dev"},
+        ])
+        self.assertEqual(len(self._saved()["functions"]), len(config.DEFAULT_FUNCTIONS))
+        with open(self._shard("systems", "DEV/1")) as f:
+            self.assertEqual(json.load(f)["users"], [])
+        self.assertTrue(os.path.exists(self._shard("functions", "rss")))
+
+    def test_shards_are_read_when_used(self):
+        cfg = self._cold_load()
+        self.assertEqual(
+            [(s["name"], s.get("label")) for s in cfg["systems"]],
+            [("PROD", "Production"), ("TEST", None), ("DEV/1", "Dev")],
+        )
+        prod, test, dev = cfg["systems"]
+        # TEST has no label, which the index says without loading it.
+        self.assertEqual([prod.loaded, test.loaded, dev.loaded], [False, False, False])
+        self.assertEqual(config.get_system(cfg, "PROD")["users"], ["RICHARD"])
+        self.assertTrue(prod.loaded)
+        self.assertFalse(dev.loaded)
+        self.assertEqual(config.get_function(cfg, "5250")["system_fields"], ["hod_file"])
+
+    def test_startup_reads_only_the_index(self):
+        cfg = self._cold_load()
+        self.assertEqual(config.check_templates(cfg), {})
+        favourites = [
+            (fn["id"], fn["label"], fn.get("icon_path"), fn.get("requires_logon", False))
+            for fn in cfg["functions"] if fn.get("is_favourite", False)
+        ]
+        self.assertEqual(favourites, [
+            (fn["id"], fn["label"], fn["icon_path"], fn["requires_logon"])
+            for fn in config.DEFAULT_FUNCTIONS if fn["is_favourite"]
+        ])
+        self.assertFalse(any(fn.loaded for fn in cfg["functions"]))
+
+    def test_diff_reads_only_entries_in_use(self):
+        old = self._cold_load()
+        config.get_system(old, "PROD")["users"]  # in use
+        with open(self._shard("systems", "PROD")) as f:
+            prod = json.load(f)
+        prod["users"] = ["BOB"]
+        with open(self._shard("systems", "PROD"), "w") as f:
+            json.dump(prod, f)
+        with open(self._shard("systems", "TEST"), "w") as f:
+            json.dump({"name": "TEST", "users": ["EVE"], "fields": {}}, f)
+        config._cached = None
+        new = config.load_config()
+        changes = config.diff(old, new)
+        self.assertEqual(changes.systems.changed, {"PROD"})
+        self.assertFalse(changes.functions)
+        self.assertEqual(
+            [s.loaded for s in new["systems"]], [True, False, False]
+        )
+
+    def test_save_writes_only_changed_shards(self):
+        cfg = self._cold_load()
+        inodes = {
+            name: os.stat(self._shard("systems", name)).st_ino for name in ("PROD", "TEST", "DEV/1")
+        }
+        settings = os.stat(config.CONFIG_FILE).st_ino
+        config.get_system(cfg, "TEST")  # loaded, but unchanged
+        config.get_system(cfg, "PROD")["users"].append("BOB")
+        config.save_config(cfg)
+        self.assertNotEqual(os.stat(self._shard("systems", "PROD")).st_ino, inodes["PROD"])
+        self.assertEqual(os.stat(self._shard("systems", "TEST")).st_ino, inodes["TEST"])
+        self.assertEqual(os.stat(self._shard("systems", "DEV/1")).st_ino, inodes["DEV/1"])
+        self.assertEqual(os.stat(config.CONFIG_FILE).st_ino, settings)  # index unchanged
+        self.assertEqual(
+            config.get_system(self._cold_load(), "PROD")["users"], ["RICHARD", "BOB"]
+        )
+
+    def test_shards_edited_elsewhere_are_kept(self):
+        cfg = self._cold_load()
+        prod = config.get_system(cfg, "PROD")
+        users = prod["users"]
+        config.get_system(cfg, "TEST")["users"]  # loaded, but unchanged here
+        # Another machine edits both files meanwhile.
+        for name, key, value in (("PROD", "fields", {"site": "B"}), ("TEST", "users", ["EVE"])):
+            with open(self._shard("systems", name)) as f:
+                entry = json.load(f)
+            entry[key] = value
+            with open(self._shard("systems", name), "w") as f:
+                json.dump(entry, f)
+        users.append("BOB")
+        config.save_config(cfg)
+        cfg = self._cold_load()
+        self.assertEqual(config.get_system(cfg, "PROD")["users"], ["RICHARD", "BOB"])
+        self.assertEqual(config.get_system(cfg, "PROD")["fields"], {"site": "B"})
+        self.assertEqual(config.get_system(cfg, "TEST")["users"], ["EVE"])
+
+    def test_local_copy_of_a_sharded_config_keeps_the_shards(self):
+        # A central config.json, symlinked; loading it leaves a local copy
+        # that holds just the index.
+        central = os.path.join(self.dir, "central.json")
+        os.replace(config.CONFIG_FILE, central)
+        os.symlink(central, config.CONFIG_FILE)
+        self._cold_load()
+        config._cached = None
+        cfg, current = config.load_cached()
+        self.assertFalse(current)
+        self.assertEqual(config.get_system(cfg, "PROD")["users"], ["RICHARD"])
+        cfg["java_opts"] = "-Xmx2g"
+        config.save_config(cfg)
+        cfg = self._cold_load()
+        self.assertEqual(config.get_system(cfg, "PROD")["users"], ["RICHARD"])
+        self.assertEqual(
+            config.get_function(cfg, "rss")["launch_cmd"],
+            next(f for f in config.DEFAULT_FUNCTIONS if f["id"] == "rss")["launch_cmd"],
+        )
+
+    def test_records_with_only_index_fields_are_not_written(self):
+        cfg = self._cold_load()
+        cfg["systems"][0] = model.System({"name": "PROD", "label": "Production"})
+        cfg.reindex()
+        config.save_config(cfg)
+        self.assertEqual(
+            config.get_system(self._cold_load(), "PROD")["users"], ["RICHARD"]
+        )
+
+    def test_removed_and_renamed_entries_take_their_shards(self):
+        cfg = self._cold_load()
+        del cfg["systems"][2]
+        config.get_system(cfg, "TEST")["name"] = "QA"
+        cfg.reindex()
+        config.save_config(cfg)
+        self.assertFalse(os.path.exists(self._shard("systems", "DEV/1")))
+        self.assertFalse(os.path.exists(self._shard("systems", "TEST")))
+        self.assertEqual(
+            [s["name"] for s in self._cold_load()["systems"]], ["PROD", "QA"]
+        )
+
+    def test_dropped_in_shard_is_picked_up(self):
+        with open(self._shard("systems", "NEW"), "w") as f:
+            json.dump({"name": "NEW", "users": ["EVE"], "fields": {}}, f)
+        cfg = self._cold_load()
+        self.assertEqual(config.get_system(cfg, "NEW")["users"], ["EVE"])
+        config.save_config(cfg)
+        self.assertEqual(self._saved()["systems"][-1], {"name": "NEW"})
+
+
+class MergeTests(unittest.TestCase):
+    def setUp(self):
+        self.base = {
+            "java_opts": "-Xmx1g",
+            "systems": [{"name": "A"}, {"name": "B"}, {"name": "C"}],
+            "functions": [],
+        }
+
+    def test_local_changes_win_untouched_entries_take_theirs(self):
+        local = copy.deepcopy(self.base)
+        saved = copy.deepcopy(self.base)
+        local["systems"][0]["label"] = "mine"  # edited here
+        del local["systems"][2]  # removed here
+        saved["systems"][1]["label"] = "theirs"  # edited there
+        saved["systems"][0]["label"] = "theirs too"  # conflict: ours wins
+        saved["java_opts"] = "-Xmx4g"
+        saved["future_setting"] = True
+        merged = config.merge(self.base, local, saved)
+        self.assertEqual(merged["systems"], [{"name": "A", "label": "mine"}, {"name": "B", "label": "theirs"}])
+        self.assertEqual(merged["java_opts"], "-Xmx4g")
+        self.assertTrue(merged["future_setting"])
+
+    def test_additions_and_removals_from_both_sides(self):
+        local = copy.deepcopy(self.base)
+        saved = copy.deepcopy(self.base)
+        local["systems"].insert(1, {"name": "NEW"})
+        saved["systems"].append({"name": "OTHER"})
+        del saved["systems"][0]
+        merged = config.merge(self.base, local, saved)
+        self.assertEqual([s["name"] for s in merged["systems"]], ["NEW", "B", "C", "OTHER"])
+
+    def test_entry_changed_on_both_sides_is_merged_field_by_field(self):
+        self.base["systems"][0].update(label="Prod", users=["RICHARD"], host="old")
+        local = copy.deepcopy(self.base)
+        saved = copy.deepcopy(self.base)
+        local["systems"][0]["users"] = ["RICHARD", "ALICE"]
+        local["systems"][0]["host"] = "mine"
+        del local["systems"][0]["label"]
+        saved["systems"][0]["host"] = "theirs"  # conflict: ours wins
+        saved["systems"][0]["site"] = "B"
+        merged = config.merge(self.base, local, saved)
+        self.assertEqual(
+            merged["systems"][0],
+            {"name": "A", "users": ["RICHARD", "ALICE"], "host": "mine", "site": "B"},
+        )
+
+
+class ModelTests(unittest.TestCase):
+    def setUp(self):
+        self.cfg = model.Config(copy.deepcopy(config.DEFAULT_CONFIG))
+        self.cfg["systems"] = [
+            {"name": "PROD", "users": ["RICHARD"], "fields": {}},
+            {"name": "TEST", "label": "Test", "users": [], "fields": {}, "site": "B"},
+        ]
+
+    def test_records_behave_like_the_dicts_they_replace(self):
+        prod, test = self.cfg["systems"]
+        self.assertIsInstance(prod, model.System)
+        self.assertEqual(prod, {"name": "PROD", "users": ["RICHARD"], "fields": {}})
+        self.assertNotIn("label", prod)
+        self.assertEqual(prod.get("label", prod["name"]), "PROD")
+        self.assertEqual(test["site"], "B")  # unknown keys are kept
+        with self.assertRaises(KeyError):
+            prod["label"]
+        self.assertEqual(self.cfg, config.DEFAULT_CONFIG | {"systems": self.cfg["systems"]})
+        self.assertEqual(
+            json.loads(json.dumps(self.cfg, default=model.json_default))["systems"][1],
+            {"name": "TEST", "label": "Test", "users": [], "fields": {}, "site": "B"},
+        )
+
+    def test_lookups_follow_reindex(self):
+        self.assertIs(config.get_system(self.cfg, "TEST"), self.cfg["systems"][1])
+        self.assertEqual(config.get_function(self.cfg, "rss")["label"], "Run SQL Scripts")
+        self.cfg["systems"][1]["name"] = "QA"
+        self.cfg["systems"].append({"name": "DEV", "users": [], "fields": {}})
+        self.cfg.reindex()
+        self.assertIsNone(config.get_system(self.cfg, "TEST"))
+        self.assertEqual(config.get_system(self.cfg, "QA")["label"], "Test")
+        self.assertIsInstance(config.get_system(self.cfg, "DEV"), model.System)
+        # Plain dict configs still work.
+        self.assertEqual(config.get_system(copy.deepcopy(dict(self.cfg)), "QA")["name"], "QA")
+
+
+class DiffTests(unittest.TestCase):
+    def setUp(self):
+        self.old = model.Config(copy.deepcopy(config.DEFAULT_CONFIG))
+        self.old["systems"] = [
+            {"name": "PROD", "users": ["RICHARD"], "fields": {}},
+            {"name": "TEST", "users": [], "fields": {}},
+        ]
+        self.new = copy.deepcopy(self.old)
+
+    def test_no_changes(self):
+        changes = config.diff(self.old, self.new)
+        self.assertFalse(changes)
+        self.assertFalse(changes.systems)
+
+    def test_settings_and_list_changes(self):
+        self.new["java_opts"] = "-Xmx2g"
+        self.new["systems"][0]["users"].append("ALICE")
+        self.new["systems"].append({"name": "DEV", "users": [], "fields": {}})
+        del self.new["functions"][0]
+        self.new.reindex()
+        changes = config.diff(self.old, self.new)
+        self.assertEqual(changes.settings, {"java_opts"})
+        self.assertEqual(changes.systems, ({"DEV"}, set(), {"PROD"}, False))
+        self.assertEqual(changes.functions.removed, {"5250"})
+        self.assertFalse(changes.functions.changed or changes.functions.added)
+
+    def test_reorder_and_plain_dicts(self):
+        self.new["systems"].reverse()
+        changes = config.diff(dict(self.old), dict(self.new))
+        self.assertTrue(changes.systems.reordered)
+        self.assertFalse(changes.systems.changed)
+        self.assertFalse(changes.functions)
+
+
+if __name__ == "__main__":
+    unittest.main()
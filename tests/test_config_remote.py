@@ -0,0 +1,142 @@
+"""Tests for fetching the shared config from a `config_url`, against a
+local http.server standing in for the central server.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import http.server
+import json
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, config_remote  # noqa: E402
+import support  # noqa: E402
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.document is None:
+            self.send_error(500)
+            return
+        etag = f'"{server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        body = json.dumps(server.document).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ConfigURLTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = support.scratch_dir(self)
+        support.patch_config(self, self.dir)
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = []
+        self.server.version = 1
+        self.server.document = {
+            "java_path": "/central/java",
+            "logon_cmd": "{acs_exe} /plugin=logon /system={system} /userid={user}",
+            "systems": [{"name": "PROD", "users": ["RICHARD"], "fields": {}}],
+        }
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/config.json"
+
+    def _publish(self, document):
+        self.server.document = document
+        self.server.version += 1
+
+    def _write_local(self, cfg):
+        os.makedirs(config.CONFIG_DIR, exist_ok=True)
+        with open(config.CONFIG_FILE, "w") as f:
+            json.dump(cfg, f)
+
+    def test_unchanged_document_is_not_modified(self):
+        self.assertTrue(config_remote.fetch(self.url, config.REMOTE_CACHE_FILE, 5))
+        self.assertEqual(
+            config_remote.read_cache(config.REMOTE_CACHE_FILE, self.url), self.server.document
+        )
+        self.assertFalse(config_remote.fetch(self.url, config.REMOTE_CACHE_FILE, 5))
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+        self.assertEqual(self.server.requests[1]["If-None-Match"], '"1"')
+
+        self._publish({"systems": []})
+        self.assertTrue(config_remote.fetch(self.url, config.REMOTE_CACHE_FILE, 5))
+        self.assertEqual(
+            config_remote.read_cache(config.REMOTE_CACHE_FILE, self.url), {"systems": []}
+        )
+        # The cache is only good for the URL it was fetched from.
+        self.assertIsNone(config_remote.read_cache(config.REMOTE_CACHE_FILE, self.url + "?x"))
+
+    def test_server_errors_raise(self):
+        self.server.document = None
+        with self.assertRaises(OSError):
+            config_remote.fetch(self.url, config.REMOTE_CACHE_FILE, 5)
+        self.server.document = ["not", "an", "object"]
+        with self.assertRaises(ValueError):
+            config_remote.fetch(self.url, config.REMOTE_CACHE_FILE, 5)
+
+    def test_local_settings_overlay_the_document(self):
+        self._write_local({"config_url": self.url, "java_opts": "-Xmx2g", "systems": []})
+        cfg = config.load_config()
+        self.assertEqual([s["name"] for s in cfg["systems"]], ["PROD"])
+        self.assertEqual(cfg["logon_cmd"], self.server.document["logon_cmd"])
+        self.assertEqual(cfg["java_opts"], "-Xmx2g")
+        # Per-machine settings aren't the document's to set.
+        self.assertEqual(cfg["java_path"], config.DEFAULT_CONFIG["java_path"])
+        # Further loads don't touch the network...
+        config._cached = None
+        config.load_config()
+        self.assertEqual(len(self.server.requests), 1)
+        # ...and a save keeps the local settings only, so only they are
+        # offered for editing.
+        self.assertTrue(config.is_local(cfg, "java_opts"))
+        self.assertFalse(config.is_local(cfg, "systems"))
+        self.assertFalse(config.is_local(cfg, "logon_cmd"))
+        self.assertTrue(config.is_local(config.DEFAULT_CONFIG, "systems"))
+        cfg["java_opts"] = "-Xmx4g"
+        config.save_config(cfg)
+        with open(config.CONFIG_FILE) as f:
+            saved = json.load(f)
+        self.assertEqual(saved["java_opts"], "-Xmx4g")
+        self.assertEqual(saved["systems"], [])
+        self.assertNotIn("logon_cmd", saved)
+
+    def test_poll_picks_up_a_new_document(self):
+        self._write_local({"config_url": self.url})
+        config.load_config()
+        self.assertFalse(config.poll_remote())
+        self._publish({"systems": [{"name": "TEST", "users": [], "fields": {}}]})
+        self.assertTrue(config.poll_remote())
+        self.assertEqual([s["name"] for s in config.load_config()["systems"]], ["TEST"])
+
+    def test_unreachable_server_without_cache_uses_local_file(self):
+        self.server.document = None
+        self._write_local({
+            "config_url": self.url,
+            "systems": [{"name": "LOCAL", "users": [], "fields": {}}],
+        })
+        self.assertEqual([s["name"] for s in config.load_config()["systems"]], ["LOCAL"])
+        with self.assertRaises(OSError):
+            config.poll_remote()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,11 +12,13 @@ import os
 import sys
 import textwrap
 import unittest
+from unittest import mock
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Importing launcher pulls in logging_setup but not GTK, so this is safe.
 from acs_launcher import launcher  # noqa: E402
+import support  # noqa: E402
 
 
 class EndsWithPromptTests(unittest.TestCase):
@@ -44,6 +46,98 @@ class EndsWithPromptTests(unittest.TestCase):
         self.assertFalse(launcher._ends_with_prompt(b""))
 
 
+class LogonMatcherTests(unittest.TestCase):
+    def _feed(self, *chunks):
+        m = launcher._LogonMatcher()
+        for c in chunks:
+            m.feed(c)
+        return m
+
+    def test_prompt_split_from_trailing_space(self):
+        m = self._feed(b"Password:", b" ")
+        self.assertTrue(m.at_prompt)
+        self.assertTrue(m.password_prompt)
+
+    def test_prompt_cleared_by_following_text(self):
+        self.assertFalse(self._feed(b"User (richardm): ", b"\nconnecting").at_prompt)
+        self.assertFalse(self._feed(b"Password: ", b"\n").at_prompt)
+
+    def test_only_last_line_considered(self):
+        self.assertTrue(self._feed(b"some banner: text\nPass", b"word: ").at_prompt)
+        self.assertFalse(self._feed(b"connecting to host").at_prompt)
+
+    def test_markers_split_across_chunks(self):
+        m = self._feed(b"Logon comp", b"leted succ", b"essfully\n")
+        self.assertTrue(m.succeeded)
+        m = self._feed(b"MSG0001 Log", b"in failed\n")
+        self.assertTrue(m.failed)
+        self.assertFalse(m.succeeded)
+        self.assertTrue(self._feed(b"Pass", b"word: ").password_prompt)
+
+
+class LogonDriverTests(unittest.TestCase):
+    def test_answers_coalesced_prompts_with_password(self):
+        d = launcher._LogonDriver("s3cret")
+        self.assertEqual(d.feed(b"Signon to IBM i; User (richardm): Password: "), b"s3cret\n")
+        self.assertFalse(d.finished)
+        self.assertEqual(d.feed(b"\nLogon completed successfully\n"), b"")
+        self.assertTrue(d.finished)
+        self.assertEqual(d.result(None), (True, "Logon successful"))
+
+    def test_answers_username_prompt_with_blank_line(self):
+        d = launcher._LogonDriver("s3cret")
+        self.assertEqual(d.feed(b"User (richardm): "), b"\n")
+        self.assertEqual(d.feed(b"Pass"), b"")
+        self.assertEqual(d.feed(b"word: "), b"s3cret\n")
+
+    def test_failure_after_password_finishes(self):
+        d = launcher._LogonDriver("wrong")
+        d.feed(b"Password: ")
+        d.feed(b"\nMSG0001 Login failed\n")
+        self.assertTrue(d.finished)
+        ok, msg = d.result(-9)
+        self.assertFalse(ok)
+        self.assertIn("MSG0001", msg)
+
+
+class LogonCaptureTests(unittest.TestCase):
+    def test_small_output_is_kept_whole(self):
+        cap = launcher._LogonCapture(head_size=16, tail_size=16)
+        for c in (b"User: ", b"Password: ", b"\nMSG0001 bad\n"):
+            cap.extend(c)
+        self.assertEqual(cap.text(), "User: Password: \nMSG0001 bad\n")
+        self.assertEqual(cap.all_failure_lines(), ["MSG0001 bad"])
+
+    def test_memory_is_bounded(self):
+        cap = launcher._LogonCapture(head_size=16, tail_size=32)
+        cap.extend(b"banner line\n")
+        cap.extend(b"CPF22E2 Password not correct\n")
+        for _ in range(10000):
+            cap.extend(b"at java.lang.Thread.run(Thread.java:750)\n")
+        cap.extend(b"MSG0001 Login failed")
+        text = cap.text()
+        self.assertLess(len(text), 16 + 32 + 16)
+        self.assertTrue(text.startswith("banner line"))
+        self.assertTrue(text.endswith("MSG0001 Login failed"))
+        self.assertEqual(
+            cap.all_failure_lines(),
+            ["CPF22E2 Password not correct", "MSG0001 Login failed"],
+        )
+
+    def test_multibyte_character_split_across_chunks(self):
+        cap = launcher._LogonCapture()
+        data = "MSG0002 Kennwort ungültig\n".encode("utf-8")
+        split = data.index(b"\xc3") + 1
+        cap.extend(data[:split])
+        cap.extend(data[split:])
+        self.assertEqual(cap.all_failure_lines(), ["MSG0002 Kennwort ungültig"])
+
+    def test_evaluate_uses_extracted_failure_lines(self):
+        ok, msg = launcher._evaluate_logon_output("[...]\n", 1, ["CPF22E2 bad"])
+        self.assertFalse(ok)
+        self.assertEqual(msg, "Logon failed: CPF22E2 bad")
+
+
 class EvaluateLogonOutputTests(unittest.TestCase):
     def test_success_phrase(self):
         ok, msg = launcher._evaluate_logon_output("...completed successfully\n", 0)
@@ -67,6 +161,43 @@ class EvaluateLogonOutputTests(unittest.TestCase):
         self.assertIn("rc=-9", msg)
 
 
+class CredentialFailureTests(unittest.TestCase):
+    def test_message_id_is_credential_failure(self):
+        self.assertTrue(launcher.is_credential_failure("Logon failed: CPF22E2 Password not correct"))
+        self.assertTrue(launcher.is_credential_failure("Logon failed: MSG0001 Login failed"))
+
+    def test_other_failures_are_not(self):
+        self.assertFalse(launcher.is_credential_failure("Logon timed out"))
+        self.assertFalse(launcher.is_credential_failure(launcher.LOGON_CANCELLED))
+        self.assertFalse(launcher.is_credential_failure("Logon failed (rc=-9): no output"))
+
+
+class SecretMaskingTests(unittest.TestCase):
+    def setUp(self):
+        self.filter = launcher.logging_setup._SecretRedactingFilter()
+
+    def _scrub(self, text):
+        return self.filter._scrub(text)
+
+    def test_secret_stays_masked_until_every_user_is_done(self):
+        # Two concurrent logons with the same password, then another.
+        self.filter.add_secret("s3cret")
+        self.filter.add_secret("s3cret")
+        self.filter.add_secret("other")
+        self.filter.remove_secret("s3cret")
+        self.assertEqual(self._scrub("pw s3cret other"), "pw *** ***")
+        self.filter.remove_secret("other")
+        self.assertEqual(self._scrub("pw s3cret other"), "pw *** other")
+        self.filter.remove_secret("s3cret")
+        self.assertEqual(self._scrub("pw s3cret"), "pw s3cret")
+
+    def test_empty_secret_is_ignored(self):
+        self.filter.add_secret("")
+        self.filter.add_secret(None)
+        self.filter.remove_secret(None)
+        self.assertEqual(self._scrub("text"), "text")
+
+
 def _write_fake_acs(path, script):
     """Write a fake `acslaunch` that emits prompts and reads replies, so the
     real _run_logon_pty loop can be driven end-to-end over a PTY."""
@@ -151,6 +282,191 @@ class RunLogonPtyTests(unittest.TestCase):
         self.assertIn("Login failed", msg)
         self.assertLess(elapsed, 5, "should not idle to the full timeout")
 
+    def test_success_returns_before_child_exits(self):
+        import time
+
+        child = self._make_child(
+            """
+            import sys, time
+            sys.stdout.write("Password: ")
+            sys.stdout.flush()
+            sys.stdin.readline()
+            sys.stdout.write("\\nLogon completed successfully\\n")
+            sys.stdout.flush()
+            time.sleep(5)                  # slow JVM shutdown
+            """
+        )
+        start = time.monotonic()
+        ok, msg = launcher._run_logon_pty(
+            f"{sys.executable} {child}", "s3cret", timeout=10
+        )
+        self.assertTrue(ok, msg)
+        self.assertLess(time.monotonic() - start, 3, "should not wait for the child to exit")
+
+    def test_cancel_kills_pending_logon(self):
+        import threading
+        import time
+
+        child = self._make_child(
+            """
+            import sys, time
+            sys.stdout.write("Connecting...\\n")
+            sys.stdout.flush()
+            time.sleep(30)
+            """
+        )
+        cancel = threading.Event()
+        threading.Timer(0.3, cancel.set).start()
+        start = time.monotonic()
+        ok, msg = launcher._run_logon_pty(
+            f"{sys.executable} {child}", "s3cret", timeout=10, cancel=cancel
+        )
+        self.assertFalse(ok)
+        self.assertEqual(msg, launcher.LOGON_CANCELLED)
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_cancel_event_stops_the_wait_at_once(self):
+        import threading
+        import time
+
+        child = self._make_child(
+            """
+            import time
+            time.sleep(30)
+            """
+        )
+        cancel = launcher.CancelEvent()
+        cancelled_at = []
+
+        def fire():
+            cancelled_at.append(time.monotonic())
+            cancel.set()
+
+        threading.Timer(0.25, fire).start()
+        ok, msg = launcher._run_logon_pty(
+            f"{sys.executable} {child}", "s3cret", timeout=10, cancel=cancel
+        )
+        self.assertEqual((ok, msg), (False, launcher.LOGON_CANCELLED))
+        self.assertLess(time.monotonic() - cancelled_at[0], 0.05)
+
+    def test_cancel_event_is_released_after_the_logon(self):
+        child = self._make_child(
+            """
+            import sys
+            sys.stdout.write("Password: ")
+            sys.stdout.flush()
+            sys.stdin.readline()
+            sys.stdout.write("\\nLogon completed successfully\\n")
+            sys.stdout.flush()
+            """
+        )
+        cancel = launcher.CancelEvent()
+        ok, msg = launcher._run_logon_pty(
+            f"{sys.executable} {child}", "s3cret", timeout=10, cancel=cancel
+        )
+        self.assertTrue(ok, msg)
+        self.assertEqual(cancel._callbacks, [])
+        # Setting it afterwards is harmless.
+        cancel.set()
+
+
+class SingleFlightTests(unittest.TestCase):
+    """Concurrent run_logon calls for the same logon share one child."""
+
+    _make_child = RunLogonPtyTests._make_child
+
+    def _make_counting_child(self, runs_file):
+        return self._make_child(
+            f"""
+            import sys, time
+            with open({runs_file!r}, "a") as f:
+                f.write("run\\n")
+            sys.stdout.write("Password: ")
+            sys.stdout.flush()
+            sys.stdin.readline()
+            time.sleep(0.5)
+            sys.stdout.write("\\nLogon completed successfully\\n")
+            sys.stdout.flush()
+            """,
+        )
+
+    def _run_concurrently(self, cmds_and_passwords):
+        import threading
+
+        results = [None] * len(cmds_and_passwords)
+
+        def worker(i, cmd, pw):
+            results[i] = launcher.run_logon(cmd, password=pw, timeout=10)
+
+        threads = [
+            threading.Thread(target=worker, args=(i, cmd, pw))
+            for i, (cmd, pw) in enumerate(cmds_and_passwords)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results
+
+    def test_same_logon_runs_once(self):
+        import tempfile
+
+        runs = os.path.join(tempfile.mkdtemp(), "runs")
+        cmd = f"{sys.executable} {self._make_counting_child(runs)}"
+        results = self._run_concurrently([(cmd, "s3cret")] * 3)
+        self.assertEqual(results, [(True, "Logon successful")] * 3)
+        with open(runs) as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+    def test_different_passwords_are_not_coalesced(self):
+        import tempfile
+
+        runs = os.path.join(tempfile.mkdtemp(), "runs")
+        cmd = f"{sys.executable} {self._make_counting_child(runs)}"
+        self._run_concurrently([(cmd, "s3cret"), (cmd, "other")])
+        with open(runs) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+
+class LogonEngineTests(unittest.TestCase):
+    """The GLib engine's handling of the child, against a stubbed `gi`
+    (see support.stub_gi): its callbacks are called directly."""
+
+    def setUp(self):
+        # The stub and the engine imported against it are gone afterwards.
+        modules = mock.patch.dict(sys.modules)
+        modules.start()
+        self.addCleanup(modules.stop)
+        support.stub_gi()
+        from acs_launcher import logon_engine
+        self.logon_engine = logon_engine
+
+    def test_output_left_at_exit_decides_the_result(self):
+        import pathlib
+
+        child = pathlib.Path(support.scratch_dir(self)) / "fake_acs.py"
+        _write_fake_acs(child, textwrap.dedent(
+            """\
+            #!/usr/bin/env python3
+            import sys
+            sys.stdout.write("MSG0001 Login failed\\n")
+            sys.stdout.flush()
+            sys.exit(1)
+            """
+        ))
+        results = []
+        self.logon_engine.start(
+            f"{sys.executable} {child}", "s3cret", lambda *result: results.append(result)
+        )
+        (logon,) = self.logon_engine._logons.values()
+        # The child watch fires before the output watch has read anything.
+        pid, status = os.waitpid(logon._proc.pid, 0)
+        logon._on_exit(pid, status)
+        self.assertEqual(len(results), 1)
+        ok, msg = results[0]
+        self.assertFalse(ok)
+        self.assertIn("MSG0001", msg)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,80 @@
+"""Tests for the startup profiler in acs_launcher.profiling.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import profiling  # noqa: E402
+
+
+class RequestedTests(unittest.TestCase):
+    def test_flag_or_environment(self):
+        self.assertTrue(profiling.requested(["main.py", "--profile-startup"], {}))
+        self.assertTrue(profiling.requested(["main.py"], {profiling.ENV_VAR: "1"}))
+        self.assertFalse(profiling.requested(["main.py"], {profiling.ENV_VAR: "0"}))
+        self.assertFalse(profiling.requested(["main.py"], {}))
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        # Two throwaway modules, one importing the other.
+        for name, body in (
+            ("_prof_outer", "import _prof_inner\nimport time\ntime.sleep(0.02)\n"),
+            ("_prof_inner", "import time\ntime.sleep(0.03)\n"),
+        ):
+            with open(os.path.join(self.tmp, name + ".py"), "w") as f:
+                f.write(textwrap.dedent(body))
+        sys.path.insert(0, self.tmp)
+        self.addCleanup(sys.path.remove, self.tmp)
+        for name in ("_prof_outer", "_prof_inner"):
+            self.addCleanup(sys.modules.pop, name, None)
+        # Never leave the import timer installed.
+        self.addCleanup(profiling.finish, os.path.join(self.tmp, "cleanup"))
+
+    def test_report(self):
+        profiling.start()
+        import _prof_outer  # noqa: F401
+        profiling.mark("load_config")
+        profiling.mark("load_config")  # repeated steps keep the first time
+        path = profiling.finish(os.path.join(self.tmp, "state"))
+        self.assertNotIn(profiling._ImportTimer, [type(f) for f in sys.meta_path])
+
+        with open(path) as f:
+            report = json.load(f)
+        names = [m["name"] for m in report["milestones"]]
+        self.assertEqual(names.count("load_config"), 1)
+        times = [m["ms"] for m in report["milestones"]]
+        self.assertEqual(times, sorted(times))
+
+        imports = {i["module"]: i for i in report["imports"]}
+        outer, inner = imports["_prof_outer"], imports["_prof_inner"]
+        self.assertGreaterEqual(inner["self_us"], 30000)
+        # The outer module's own time excludes the import it triggered.
+        self.assertGreaterEqual(outer["cumulative_us"], inner["cumulative_us"] + 20000)
+        self.assertLess(outer["self_us"], outer["cumulative_us"] - 25000)
+
+    def test_disabled_is_a_no_op(self):
+        profiling.mark("gi imports")
+        self.assertIsNone(profiling.finish(self.tmp))
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["_prof_inner.py", "_prof_outer.py"])
+
+    def test_process_age(self):
+        age = profiling._process_age()
+        if age is None:
+            self.skipTest("no /proc")
+        self.assertGreaterEqual(age, 0.0)
+        self.assertLess(age, 24 * 3600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""Tests for the Unix-socket launch service in acs_launcher.service.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import asyncio
+import copy
+import json
+import os
+import stat
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, service  # noqa: E402
+import support  # noqa: E402
+
+
+class ServiceTests(unittest.TestCase):
+    def setUp(self):
+        directory = support.scratch_dir(self)
+        support.patch_config(self, directory)
+        cfg = copy.deepcopy(config.DEFAULT_CONFIG)
+        cfg["systems"] = [{"name": "PROD", "users": ["RICHARD"], "fields": {}}]
+        cfg["functions"].append({
+            "id": "echo",
+            "label": "Echo",
+            "launch_cmd": "/bin/echo {system} {user}",
+            "requires_logon": False,
+            "system_fields": [],
+        })
+        os.makedirs(config.CONFIG_DIR)
+        with open(config.CONFIG_FILE, "w") as f:
+            json.dump(cfg, f)
+        self.path = os.path.join(directory, "run", service.SOCKET_NAME)
+
+    def _session(self, client):
+        """Run `client(reader, writer)` against a fresh service."""
+        async def main():
+            ready = asyncio.Event()
+            server = asyncio.ensure_future(service.serve(self.path, ready))
+            await asyncio.wait_for(ready.wait(), 5)
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                try:
+                    return await asyncio.wait_for(client(reader, writer), 15)
+                finally:
+                    writer.close()
+                    await writer.wait_closed()
+                    # Let the server see EOF and finish with the connection.
+                    while self._connections():
+                        await asyncio.sleep(0.01)
+            finally:
+                server.cancel()
+                await asyncio.gather(server, return_exceptions=True)
+
+        return asyncio.run(main())
+
+    @staticmethod
+    def _connections():
+        return [
+            t for t in asyncio.all_tasks()
+            if t.get_coro().__qualname__ == "Service.serve_client"
+        ]
+
+    def _exchange(self, *lines):
+        """Send `lines` pipelined, then collect one response per line."""
+        async def client(reader, writer):
+            for line in lines:
+                writer.write((line if isinstance(line, str) else json.dumps(line)).encode() + b"\n")
+            await writer.drain()
+            return [json.loads(await reader.readline()) for _ in lines]
+
+        return self._session(client)
+
+    def test_pipelined_requests_are_matched_by_id(self):
+        responses = self._exchange(
+            {"id": 1, "op": "launch", "system": "PROD", "function": "echo"},
+            {"id": 2, "op": "launch", "system": "PROD", "user": "RICHARD", "function": "echo"},
+            {"id": 3, "op": "status"},
+        )
+        by_id = {r["id"]: r for r in responses}
+        self.assertEqual(by_id[1], {"id": 1, "ok": True, "message": "Launched successfully"})
+        self.assertEqual(by_id[2]["message"], "Launched successfully")
+        self.assertTrue(by_id[3]["ok"])
+        self.assertEqual(by_id[3]["pid"], os.getpid())
+
+    def test_errors_keep_the_connection_open(self):
+        responses = self._exchange(
+            "{not json",
+            {"id": "a", "op": "explode"},
+            {"id": "b", "op": "launch", "system": "NOPE", "function": "echo"},
+            {"id": "c", "op": "launch", "function": "echo"},
+            {"id": "d", "op": "status"},
+        )
+        self.assertEqual(responses[0], {"ok": False, "error": "invalid JSON"})
+        by_id = {r["id"]: r for r in responses[1:]}
+        self.assertIn("unknown op", by_id["a"]["error"])
+        self.assertEqual(by_id["b"], {"id": "b", "ok": False, "message": "unknown system 'NOPE'"})
+        self.assertIn("missing 'system'", by_id["c"]["error"])
+        self.assertTrue(by_id["d"]["ok"])
+
+    def test_slow_config_read_does_not_hold_up_other_requests(self):
+        release = threading.Event()
+        released = []
+        load_config = config.load_config
+
+        def slow_load_config():
+            # A config.json on an NFS mount that hangs until the status
+            # request has been answered.
+            released.append(release.wait(5))
+            return load_config()
+
+        async def client(reader, writer):
+            for request in (
+                {"id": 1, "op": "launch", "system": "PROD", "function": "echo"},
+                {"id": 2, "op": "status"},
+            ):
+                writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            first = json.loads(await reader.readline())
+            release.set()
+            return first, json.loads(await reader.readline())
+
+        with mock.patch.object(config, "load_config", slow_load_config):
+            first, second = self._session(client)
+        self.assertEqual(released, [True])
+        self.assertEqual(first["id"], 2)
+        self.assertEqual(second, {"id": 1, "ok": True, "message": "Launched successfully"})
+
+    def test_socket_is_private(self):
+        async def client(reader, writer):
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+
+        self.assertEqual(self._session(client), 0o600)
+        self.assertFalse(os.path.exists(self.path), "socket removed on shutdown")
+
+    def test_stale_socket_is_replaced(self):
+        import socket
+
+        os.makedirs(os.path.dirname(self.path))
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        self.assertEqual(self._exchange({"id": 1, "op": "status"})[0]["ok"], True)
+
+
+if __name__ == "__main__":
+    unittest.main()
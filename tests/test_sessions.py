@@ -0,0 +1,94 @@
+"""Tests for the persistent logon-session cache in acs_launcher.sessions.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import sessions  # noqa: E402
+import support  # noqa: E402
+
+
+class SessionCacheTests(unittest.TestCase):
+    def setUp(self):
+        directory = os.path.join(support.scratch_dir(self), "state")
+        support.patch_paths(
+            self, sessions,
+            SESSIONS_FILE=os.path.join(directory, "sessions.json"),
+            LOCK_FILE=os.path.join(directory, "sessions.lock"),
+        )
+
+    def test_unknown_session_is_not_logged_on(self):
+        self.assertFalse(sessions.is_logged_on("PROD", "RICHARD"))
+
+    def test_marked_session_is_logged_on(self):
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        self.assertTrue(sessions.is_logged_on("PROD", "RICHARD"))
+        self.assertFalse(sessions.is_logged_on("PROD", "OTHER"))
+        self.assertFalse(sessions.is_logged_on("TEST", "RICHARD"))
+
+    def test_entries_are_independent(self):
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        sessions.mark_logged_on("TEST", "RICHARD", ttl=60)
+        sessions.forget("PROD", "RICHARD")
+        self.assertFalse(sessions.is_logged_on("PROD", "RICHARD"))
+        self.assertTrue(sessions.is_logged_on("TEST", "RICHARD"))
+
+    def test_expired_session_is_not_logged_on(self):
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        with mock.patch.object(sessions.time, "time", return_value=time.time() + 61):
+            self.assertFalse(sessions.is_logged_on("PROD", "RICHARD"))
+
+    def test_zero_ttl_disables_caching(self):
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=0)
+        self.assertFalse(sessions.is_logged_on("PROD", "RICHARD"))
+
+    def test_cache_file_is_private(self):
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        mode = os.stat(sessions.SESSIONS_FILE).st_mode & 0o777
+        self.assertEqual(mode, 0o600)
+
+    def test_corrupt_cache_is_ignored(self):
+        os.makedirs(os.path.dirname(sessions.SESSIONS_FILE))
+        with open(sessions.SESSIONS_FILE, "w") as f:
+            f.write("{not json")
+        self.assertFalse(sessions.is_logged_on("PROD", "RICHARD"))
+        sessions.mark_logged_on("PROD", "RICHARD", ttl=60)
+        self.assertTrue(sessions.is_logged_on("PROD", "RICHARD"))
+
+
+class FailureCacheTests(unittest.TestCase):
+    def tearDown(self):
+        sessions.clear_failure("PROD", "RICHARD")
+
+    def test_rejected_password_fails_fast(self):
+        sessions.record_failure("PROD", "RICHARD", "wrong", "Logon failed: CPF22E2")
+        self.assertEqual(
+            sessions.recent_failure("PROD", "RICHARD", "wrong"), "Logon failed: CPF22E2"
+        )
+
+    def test_different_password_is_retried(self):
+        sessions.record_failure("PROD", "RICHARD", "wrong", "Logon failed: CPF22E2")
+        self.assertIsNone(sessions.recent_failure("PROD", "RICHARD", "new"))
+        self.assertIsNone(sessions.recent_failure("TEST", "RICHARD", "wrong"))
+
+    def test_failure_expires(self):
+        sessions.record_failure("PROD", "RICHARD", "wrong", "Logon failed: CPF22E2")
+        later = time.monotonic() + sessions.FAILURE_TTL + 1
+        with mock.patch.object(sessions.time, "monotonic", return_value=later):
+            self.assertIsNone(sessions.recent_failure("PROD", "RICHARD", "wrong"))
+
+    def test_clear_failure(self):
+        sessions.record_failure("PROD", "RICHARD", "wrong", "Logon failed: CPF22E2")
+        sessions.clear_failure("PROD", "RICHARD")
+        self.assertIsNone(sessions.recent_failure("PROD", "RICHARD", "wrong"))
+
+
+if __name__ == "__main__":
+    unittest.main()
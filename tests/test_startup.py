@@ -0,0 +1,63 @@
+"""Tests that starting the GUI imports only what the first frame needs.
+
+The window is built against a stubbed `gi` (see support.stub_gi), in a
+subprocess so the stub and the imports start from a clean slate; neither
+PyGObject nor a display is needed.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import support  # noqa: E402
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(TESTS)
+
+# Builds the application's window the way main() does, including the
+# favourites deferred past the first frame, and prints the modules loaded.
+_START = """
+import json, sys
+sys.path[:0] = [{repo!r}, {tests!r}]
+import support
+support.stub_gi()
+from acs_launcher import config, main
+app = main.ACSLauncherApp(*config.load_cached())
+app._window().prewarm()
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class StartupImportTests(unittest.TestCase):
+    def setUp(self):
+        self.home = support.scratch_dir(self)
+
+    def _modules_after_start(self):
+        result = subprocess.run(
+            [sys.executable, "-c", _START.format(repo=REPO, tests=TESTS)],
+            env={**os.environ, "HOME": self.home},
+            capture_output=True, text=True, timeout=30,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return {
+            m for m in json.loads(result.stdout.splitlines()[-1])
+            if m.startswith("acs_launcher") or m == "urllib.request"
+        }
+
+    def test_window_defers_keyring_and_dialogs(self):
+        modules = self._modules_after_start()
+        self.assertIn("acs_launcher.window", modules)
+        # libsecret is loaded for the first launch, the dialogs when opened.
+        self.assertNotIn("acs_launcher.passwords", modules)
+        self.assertFalse({m for m in modules if m.startswith("acs_launcher.dialogs")})
+        # Only a config_url needs the HTTP client.
+        self.assertNotIn("urllib.request", modules)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Tests for the local UI state file in acs_launcher.state.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, state  # noqa: E402
+import support  # noqa: E402
+
+
+class StateTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = support.scratch_dir(self)
+        support.patch_paths(
+            self, state, STATE_FILE=os.path.join(self.dir, "state", "state.json"), _saved=None
+        )
+        support.patch_config(self, self.dir, CONFIG_FILE=os.path.join(self.dir, "config.json"))
+
+    def test_defaults_without_any_file(self):
+        self.assertEqual(state.load(), state.DEFAULT_STATE)
+        self.assertFalse(os.path.exists(state.STATE_FILE))
+
+    def test_round_trip_keeps_unknown_keys(self):
+        state.update(last_system="PROD", history=["rss@PROD"])
+        loaded = state.load()
+        self.assertEqual(loaded["last_system"], "PROD")
+        self.assertEqual(loaded["last_user"], "")
+        self.assertEqual(loaded["history"], ["rss@PROD"])
+
+    def test_unchanged_state_is_not_rewritten(self):
+        state.update(last_user="RICHARD")
+        inode = os.stat(state.STATE_FILE).st_ino
+        state.update(last_user="RICHARD")
+        self.assertEqual(os.stat(state.STATE_FILE).st_ino, inode)
+
+    def test_selections_migrate_from_the_config_once(self):
+        with open(config.CONFIG_FILE, "w") as f:
+            json.dump({"last_system": "PROD", "last_user": "RICHARD", "last_function": ""}, f)
+        self.assertEqual(state.load()["last_system"], "PROD")
+        self.assertTrue(os.path.exists(state.STATE_FILE))
+        state.update(last_system="TEST")
+        self.assertEqual(state.load()["last_system"], "TEST")
+        self.assertEqual(state.load()["last_user"], "RICHARD")
+
+    def test_corrupt_file_gives_defaults(self):
+        os.makedirs(os.path.dirname(state.STATE_FILE))
+        with open(state.STATE_FILE, "w") as f:
+            f.write("[1, 2")
+        self.assertEqual(state.load(), state.DEFAULT_STATE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+"""Tests for compiled command templates (acs_launcher.templates) and the
+load-time template check in acs_launcher.config.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import copy
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, launcher, templates  # noqa: E402
+
+
+class TemplateTests(unittest.TestCase):
+    def test_values_with_spaces_stay_one_argument(self):
+        argv = templates.compile("{acs_exe} {hod_file}").argv(
+            {"acs_exe": "/opt/acs/acslaunch", "hod_file": "/home/me/My Sessions/it's.hod"}
+        )
+        self.assertEqual(argv, ["/opt/acs/acslaunch", "/home/me/My Sessions/it's.hod"])
+
+    def test_placeholder_inside_token(self):
+        argv = templates.compile("{java} -jar {acs_jar} /plugin=rss /system={system}").argv(
+            {"java": "java", "acs_jar": "/opt/acs.jar", "system": "PROD"}
+        )
+        self.assertEqual(argv, ["java", "-jar", "/opt/acs.jar", "/plugin=rss", "/system=PROD"])
+
+    def test_quoted_template_token(self):
+        argv = templates.compile('{acs_exe} "/opt/my dir/x.hod" {{literal}}').argv(
+            {"acs_exe": "acs"}
+        )
+        self.assertEqual(argv, ["acs", "/opt/my dir/x.hod", "{literal}"])
+
+    def test_empty_bare_placeholder_is_dropped(self):
+        argv = templates.compile("{acs_exe} {extra} /x={extra}").argv(
+            {"acs_exe": "acs", "extra": ""}
+        )
+        self.assertEqual(argv, ["acs", "/x="])
+
+    def test_fields(self):
+        template = templates.compile("{acs_exe} /userid={user} /password={password}")
+        self.assertEqual(template.fields, {"acs_exe", "user", "password"})
+
+    def test_missing_placeholder_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            templates.compile("{acs_exe} {hod_file}").argv({"acs_exe": "acs"})
+
+    def test_compiled_once(self):
+        self.assertIs(templates.compile("{acs_exe} /a"), templates.compile("{acs_exe} /a"))
+
+    def test_unparseable_templates(self):
+        for source in ('{acs_exe} "unterminated', "{acs_exe} {", "{acs_exe} {0}"):
+            with self.subTest(source=source):
+                with self.assertRaises(templates.TemplateError):
+                    templates.compile(source)
+
+    def test_launcher_accepts_argv(self):
+        self.assertEqual(
+            launcher.launch(["/bin/echo", "a b"]), (True, "Launched successfully")
+        )
+
+
+class CheckTemplatesTests(unittest.TestCase):
+    def setUp(self):
+        self.cfg = copy.deepcopy(config.DEFAULT_CONFIG)
+
+    def test_defaults_are_valid(self):
+        self.assertEqual(config.check_templates(self.cfg), {})
+
+    def test_unparseable_launch_cmd(self):
+        fn = self.cfg["functions"][1]
+        fn["launch_cmd"] += " {hod_file"
+        self.assertEqual(list(config.check_templates(self.cfg)), [fn["id"]])
+
+    def test_any_system_field_may_be_used(self):
+        # Whether or not the function declares it in system_fields.
+        fn = self.cfg["functions"][1]
+        fn["launch_cmd"] += " {hod_file}"
+        self.assertEqual(config.check_templates(self.cfg), {})
+        system = {"name": "PROD", "users": [], "fields": {"hod_file": "/x.hod"}}
+        self.assertIsNone(config.template_problem(self.cfg, system, fn))
+        system["fields"] = {}
+        self.assertIn("{hod_file}", config.template_problem(self.cfg, system, fn))
+
+    def test_logon_cmd_is_checked_against_the_system(self):
+        self.cfg["logon_cmd"] = "{acs_exe} /plugin=logon /system={sytem}"
+        self.assertEqual(config.check_templates(self.cfg), {})
+        system = {"name": "PROD", "users": [], "fields": {}}
+        self.assertIn("{sytem}", config.template_problem(self.cfg, system))
+        rss = config.get_function(self.cfg, "rss")
+        self.assertIn("Logon command", config.template_problem(self.cfg, system, rss))
+        ssh = config.get_function(self.cfg, "ssh")  # no logon
+        self.assertIsNone(config.template_problem(self.cfg, system, ssh))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+"""Tests for the launch sequencing in acs_launcher.window.
+
+The window is built against a stubbed `gi` (see support.stub_gi): nothing
+is drawn, and main-loop callbacks are called directly.
+
+Run with:  python3 -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from acs_launcher import config, templates  # noqa: E402
+import support  # noqa: E402
+
+PROD = {"name": "PROD", "users": ["RICHARD"], "fields": {}}
+
+
+class LaunchTests(unittest.TestCase):
+    def setUp(self):
+        support.patch_config(self, support.scratch_dir(self))
+        # The stub and the modules imported against it are gone afterwards.
+        modules = mock.patch.dict(sys.modules)
+        modules.start()
+        self.addCleanup(modules.stop)
+        support.stub_gi()
+        from acs_launcher import main, window
+
+        self.window_module = window
+        self.window = main.ACSLauncherApp(*config.load_cached())._window()
+
+    def test_launch_that_fails_to_start_lets_the_next_one_run(self):
+        window = self.window
+        echo = {"id": "echo", "label": "Echo", "launch_cmd": "/bin/echo {system}"}
+        # A favourite clicked while another launch is running waits for it.
+        window._launching = True
+        window._do_launch("PROD", "RICHARD", PROD, echo)
+        window._launching = False
+
+        with mock.patch.object(templates, "compile", side_effect=ValueError("bad template")), \
+                mock.patch.object(self.window_module.GLib, "idle_add") as idle_add, \
+                self.assertLogs(self.window_module.logging_setup.get_logger(), "ERROR"):
+            window._do_launch("PROD", "RICHARD", PROD, echo)
+        self.assertFalse(window._launching)
+        idle_add.assert_called_once_with(window._do_launch, "PROD", "RICHARD", PROD, echo, None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,6 +29,12 @@ else
     echo "No desktop entry found."
 fi
 
+AUTOSTART_FILE="${XDG_CONFIG_HOME:-$HOME/.config}/autostart/$APP_NAME.desktop"
+if [ -f "$AUTOSTART_FILE" ]; then
+    rm "$AUTOSTART_FILE"
+    echo "Autostart entry removed: $AUTOSTART_FILE"
+fi
+
 echo ""
 echo "Note: Configuration at ~/.config/rm-acs-launcher/ and keyring passwords"
 echo "have been left intact. Remove them manually if desired."